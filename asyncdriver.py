@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### asyncio driver multiplexing many CLI debugger sessions in one process: the ptys are read without blocking from one
+### event loop (running in a thread of its own), and each session runs the command protocols of devil (e.g.
+### devil.SuffixSteppingProtocol) while the others wait for their debuggers. New sessions are admitted while the machine
+### has idle CPUs, up to a maximum number of sessions.
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+import functools
+
+import pexpect
+
+import devil
+
+
+ADMIT_INTERVAL = 0.5  ### seconds between two samples of the CPU load
+TARGET_LOAD = 0.9     ### admit new sessions while the CPUs are less busy than this
+
+
+class AsyncSession:
+    def __init__(self, child):
+        self.child = child
+        self.buffer = ''
+        self.eof = False
+        self.data = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(child.child_fd, self.read)
+
+    def read(self):
+        try:
+            self.buffer += self.child.read_nonblocking(self.child.maxread, timeout=0)
+        except pexpect.TIMEOUT:
+            return
+        except pexpect.EOF:
+            self.eof = True
+            self.loop.remove_reader(self.child.child_fd)
+        self.data.set()
+
+    ### wait for the next prompt; returns the index devil.checkExpect expects (0 prompt, 1 EOF, 2 timeout)
+    async def expect(self, timeout=-1):
+        exp = re.compile(devil.getExp(self.child, lazy=True)[0], re.DOTALL)
+        timeout = self.child.timeout if timeout == -1 else timeout
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            rem = exp.search(self.buffer)
+            if rem:
+                self.child.before, self.child.after = self.buffer[:rem.start()], rem.group()
+                self.buffer = self.buffer[rem.end():]
+                return 0
+            if self.eof:
+                self.child.before, self.child.after = self.buffer, pexpect.EOF
+                self.child.isalive()  ### reap the debugger for its signalstatus
+                return 1
+
+            self.data.clear()
+            try:
+                await asyncio.wait_for(self.data.wait(), None if deadline is None else max(0, deadline - time.time()))
+            except asyncio.TimeoutError:
+                return 2
+
+    async def sendcmd(self, cmd: str, timeout=-1):
+        self.child.sendline(cmd)
+        return devil.checkExpect(self.child, await self.expect(timeout), cmd)
+
+    ### asynchronous counterpart of devil.Drive
+    async def drive(self, protocol):
+        try:
+            cmd = next(protocol)
+            while True:
+                cmd = protocol.send(await self.sendcmd(cmd))
+        except StopIteration as e:
+            return e.value
+
+    async def close(self):
+        if not self.eof:
+            self.loop.remove_reader(self.child.child_fd)
+        ### terminating waits for the debugger to exit
+        await self.loop.run_in_executor(None, functools.partial(self.child.close, force=True))
+
+
+async def InitDebugger(file: str, debugger: str):
+    session = AsyncSession(devil.SpawnDebugger(debugger))
+    try:
+        devil.checkLaunch(session.child, await session.expect())
+        for cmd in devil.GetDebuggerSettings(debugger) + ['file ' + file]:
+            await session.sendcmd(cmd)
+    except BaseException:
+        await session.close()
+        raise
+    return session
+
+
+### devil.CompleteRun of the cli backend
+async def CompleteRun(file_object: str, file_source: str, debugger: str, step: str, timeout: int, trace_file=None, max_steps=0):
+    logging.debug('\n[CompleteRunViaAsync via %s for %s]start\n' % (step, file_object))
+    with devil.Recorder(trace_file) as trace:
+        session = await InitDebugger(file_object, debugger)
+        try:
+            await session.sendcmd('b main')
+            await session.sendcmd('run')
+            for cmd in await session.drive(devil.SkippingCommandsProtocol(session.child, file_object, file_source)):
+                await session.sendcmd(cmd)
+            res = await session.drive(devil.SuffixSteppingProtocol(file_object, file_source, session.child, step, timeout, trace, max_steps))
+        finally:
+            await session.close()
+
+    return res if trace_file is None else devil.TraceFile(trace_file, trace.steps)
+
+
+### fraction of busy CPU time since the previous sample, from /proc/stat (or the load average elsewhere)
+class CpuLoad:
+    def __init__(self):
+        self.cpus = os.cpu_count() or 1
+        self.last = self.sample()
+        self.busy = 0.0
+
+    @staticmethod
+    def sample():
+        try:
+            with open('/proc/stat', 'r') as f:
+                fields = [int(field) for field in f.readline().split()[1:]]
+            return fields[3] + fields[4], sum(fields)  ### idle + iowait, total
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def update(self) -> float:
+        now = self.sample()
+        if now is None or self.last is None:
+            self.busy = min(1.0, os.getloadavg()[0] / self.cpus)
+        elif now[1] > self.last[1]:
+            self.busy = 1 - (now[0] - self.last[0]) / (now[1] - self.last[1])
+        self.last = now
+        return self.busy
+
+
+### runs coroutine functions on its event loop, with the apply_async interface of multiprocessing.Pool
+class AsyncDriver:
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self.active = 0
+        self.load = CpuLoad()
+        self.sampled = 0.0
+        self.admissible = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    ### every sample admits as many new sessions as there were idle CPUs
+    async def admit(self):
+        while self.active:
+            if self.active < self.max_sessions:
+                now = time.time()
+                if now - self.sampled >= ADMIT_INTERVAL:
+                    self.sampled = now
+                    self.admissible = int((TARGET_LOAD - self.load.update()) * self.load.cpus)
+                if self.admissible > 0:
+                    self.admissible -= 1
+                    break
+            await asyncio.sleep(ADMIT_INTERVAL)
+        self.active += 1
+
+    async def run(self, func, args, kwds):
+        await self.admit()
+        try:
+            return await func(*args, **kwds)
+        finally:
+            self.active -= 1
+
+    def apply_async(self, func, args=(), kwds=None, callback=None, error_callback=None):
+        future = asyncio.run_coroutine_threadsafe(self.run(func, args, kwds or {}), self.loop)
+
+        def done(future):
+            error = future.exception()
+            if error is None:
+                if callback is not None:
+                    callback(future.result())
+            elif error_callback is not None:
+                error_callback(error)
+        future.add_done_callback(done)
+        return future
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def join(self):
+        self.thread.join()
+        self.loop.close()
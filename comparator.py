@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Comparison engine of the traces of a file. Every trace is indexed once per point type (order, first-hit order,
+### hit counts and variable snapshots, all hashed), the line tables once per optimization level and point type, and
+### the existence, order, hit-count and variable discrepancies of a pair of traces are found in one pass over the
+### first-hit order of the source-level trace. Findings are handed to report (diffsink.DiffSink.add), and the groups of
+### optimization levels agreeing on a variable to agree (diffsink.DiffSink.agree), both as the line of its diff text
+### file and as structured fields.
+
+import os
+
+import orderdiff
+
+
+POINT_TYPES = ['loc', 'adr', 'pos', 'all']
+
+
+def whichIsL(a1, way1, a2, way2):
+    if 'stepl' in way1:
+        return a1, way1, a2, way2
+    return a2, way2, a1, way1
+
+
+### quadruple (filename, filenumb, offset, address)
+def getProgramPointByType(quadruple, point_type):
+    if 'adr' in point_type:
+        return quadruple[-1]
+    elif 'pos' in point_type:
+        return quadruple[:3]
+    elif 'loc' in point_type:
+        return quadruple[:2]
+    elif 'all' in point_type:
+        return quadruple
+    else:
+        raise Exception('Unimplemented')
+
+
+def isUnavailable(value: str) -> bool:
+    return ('optimized out' in value) or ('variable not available' in value)
+
+
+### the views of one trace for one point type; hittimes keeps the first-hit order, so it doubles as the
+### deduplicated order and as the hashed set of hit points
+class TraceIndex:
+    def __init__(self, trace, point_type: str):
+        self.hittimes = trace[point_type + 'Hittimes']
+        self.varvalue = trace[point_type + 'Varvalue']
+        self.unique = list(self.hittimes)
+
+
+class Comparator:
+    def __init__(self, data, imag, filename: str, text: list, debugger: str, report, agree):
+        self.data = data
+        self.imag = imag
+        self.filename = filename
+        self.basename = os.path.basename(filename)
+        self.text = text
+        self.debugger = debugger
+        self.report = report
+        self.agree = agree
+        self.indexes = {}   ### (way, point_type) -> TraceIndex
+        self.images = {}    ### (opt, point_type) -> set of program points with debug info
+        self.addresses = {} ### way -> address -> first quadruple hit at it
+
+    def pointTypes(self):
+        return [point_type for point_type in POINT_TYPES if not (self.debugger == 'gdb' and point_type == 'pos')]
+
+    def index(self, way: tuple, point_type: str) -> TraceIndex:
+        if (way, point_type) not in self.indexes:
+            self.indexes[(way, point_type)] = TraceIndex(self.data[way], point_type)
+        return self.indexes[(way, point_type)]
+
+    def image(self, opt: str, point_type: str) -> set:
+        if (opt, point_type) not in self.images:
+            self.images[(opt, point_type)] = {getProgramPointByType(item, point_type) for item in self.imag[opt]}
+        return self.images[(opt, point_type)]
+
+    ### the source line of a (file, line, ...) point, or its file when it is in another one
+    def sourceLine(self, point, default=None):
+        if os.path.basename(point[0]) != self.basename:
+            return point[0]
+        if int(point[1]) - 1 < len(self.text):
+            return self.text[int(point[1]) - 1].strip()
+        return default
+
+    ### the source line of a point of the trace of way; addresses are located by the points of the trace
+    def sourceLineOf(self, way: tuple, point, point_type: str):
+        if point_type == 'adr':
+            if way not in self.addresses:
+                self.addresses[way] = {quadruple[-1]: quadruple for quadruple in reversed(self.index(way, 'all').unique)}
+            point = self.addresses[way].get(point)
+            if point is None:
+                return None
+        return self.sourceLine(point)
+
+    ### compare the hit, order, frequency and variable values between the stepl and stepi traces of the same
+    ### compiler, optimization and debugger
+    def compareSteps(self, waya: tuple, wayb: tuple, check=False):
+        cplra, optla, debuggera, stepa, lefta, pointa = waya
+        cplrb, optlb, debuggerb, stepb, leftb, pointb = wayb
+        assert cplra == cplrb and optla == optlb and debuggera == debuggerb and lefta == leftb and pointa == pointb, "compiler, optimization, debugger, staring location should consistent"
+        assert stepa != stepb, "debugging strategies should be inconsistent"
+
+        _, wayl, _, wayi = whichIsL(None, waya, None, wayb)
+        for point_type in self.pointTypes():
+            l, i = self.index(wayl, point_type), self.index(wayi, point_type)
+            image = self.image(optlb, point_type) if check else None
+
+            for point in l.unique:
+                self.checkExist(point, l, i, wayl, wayi, point_type, image, True)
+                self.checkHittimes(point, l, i, wayl, wayi, point_type)
+                self.checkVarvalue(point, l, i, wayl, wayi, point_type, 'step')
+            if point_type != 'adr':
+                for point in i.unique:
+                    self.checkExist(point, l, i, wayl, wayi, point_type, image, False)
+
+            self.compareOrder(l, i, wayl, wayi, point_type, image)
+
+    ### compare the variable values across the optimization levels of the same stepping in one sweep over the union
+    ### of their points: every pair of levels that disagree on a variable is reported as before, and the levels
+    ### are partitioned into the groups that agree with each other
+    def compareOptimizationLevels(self, ways: list):
+        for way in ways[1:]:
+            cplra, optla, debuggera, stepa, lefta, pointa = ways[0]
+            cplrb, optlb, debuggerb, stepb, leftb, pointb = way
+            assert cplra == cplrb and debuggera == debuggerb and stepa == stepb and lefta == leftb and pointa == pointb, "compiler, stepping level, debugger, staring location should be consistent"
+        assert len(set(way[1] for way in ways)) == len(ways), "optimization should be inconsistent"
+
+        ### (wayl, wayi) of every pair of levels, in the order of ways
+        pairs = [whichIsL(None, waya, None, wayb)[1::2] for n, waya in enumerate(ways) for wayb in ways[n + 1:]]
+        for point_type in self.pointTypes():
+            indexes = [(way, self.index(way, point_type)) for way in ways]
+            for point in dict.fromkeys(point for _, index in indexes for point in index.varvalue):
+                snapshots = {way: index.varvalue[point][0] for way, index in indexes if point in index.varvalue}
+                if len(snapshots) < 2:
+                    continue
+
+                sourcecode_line_text = None
+                for variablename in dict.fromkeys(name for snapshot in snapshots.values() for name in snapshot):
+                    values = {way: snapshot[variablename] for way, snapshot in snapshots.items() if variablename in snapshot}
+                    groups = {}
+                    for way, value in values.items():
+                        if not isUnavailable(value):
+                            groups.setdefault(value, []).append(way[1])
+                    if len(groups) < 2:
+                        continue
+
+                    if point_type != 'adr' and sourcecode_line_text is None:
+                        sourcecode_line_text = self.sourceLine(point)
+                    for wayl, wayi in pairs:
+                        if wayl in values and wayi in values and values[wayl] in groups and values[wayi] in groups and values[wayl] != values[wayi]:
+                            self.reportVarvalue(point, variablename, wayl, wayi, values[wayl], values[wayi], point_type, 'optimization', sourcecode_line_text)
+
+                    self.agree("Agreement-" + point_type + "-var-" + self.debugger, 'optimization', "%s, %s, %s, var: %s, agree: %s, values: %s, %s\n" % (
+                               self.filename, ways[0][3], point, variablename, list(groups.values()), list(groups), sourcecode_line_text),
+                               self.filename, point_type, ways, point, variablename, groups, sourcecode_line_text)
+
+    ### point is hit by the stepl trace (in_stepl) or by the stepi trace
+    def checkExist(self, point, l: TraceIndex, i: TraceIndex, wayl, wayi, point_type: str, image, in_stepl: bool):
+        other, direction = (i, '[In stepl not in stepi]') if in_stepl else (l, '[In stepi not in stepl]')
+        if point in other.hittimes or (image is not None and point not in image):
+            return
+        name = "Exist-" + point_type + "-" + self.debugger
+        if point_type == 'adr':
+            self.report(name, 'step', "%s, %s, wayl, %s, wayi, %s, key, %s\n" % (self.filename, direction, wayl, wayi, point),
+                        self.filename, 'Exist', point_type, wayl, wayi, point, valuel=l.hittimes.get(point, 0), valuei=i.hittimes.get(point, 0))
+            return
+
+        sourcecode_line_text = self.sourceLine(point)
+        if sourcecode_line_text == '}' or sourcecode_line_text == '{':
+            return
+        self.report(name, 'step', "%s, %s, wayl, %s, wayi, %s, key, %s, text, %s\n" % (self.filename, direction, wayl, wayi, point, sourcecode_line_text),
+                    self.filename, 'Exist', point_type, wayl, wayi, point, valuel=l.hittimes.get(point, 0), valuei=i.hittimes.get(point, 0), text=sourcecode_line_text)
+
+    ### reports the minimal edit script between the deduplicated orders and where they first diverge, instead of
+    ### both orders
+    def compareOrder(self, l: TraceIndex, i: TraceIndex, wayl, wayi, point_type: str, image):
+        ordl_n, ordi_n = l.unique, i.unique
+        if image is not None:
+            ### ensure every program location in ordl or ordi has debug info
+            ordl_n = [point for point in ordl_n if point in i.hittimes and point in image]
+            ordi_n = [point for point in ordi_n if point in l.hittimes and point in image]
+
+        first = orderdiff.FirstDivergence(ordl_n, ordi_n)
+        if first is None:
+            return
+
+        point_l = ordl_n[first] if first < len(ordl_n) else None
+        point_i = ordi_n[first] if first < len(ordi_n) else None
+        sourcecode_line_text = self.sourceLineOf(wayl if point_l is not None else wayi, point_l if point_l is not None else point_i, point_type)
+        edits = ['-%d:%s +%d:%s' % (li, deleted, lj, inserted) for li, deleted, lj, inserted in orderdiff.EditScript(ordl_n, ordi_n)]
+        self.report("Order-" + point_type + "-" + self.debugger, 'step',
+                    "%s, wayl, %s, wayi, %s, first, %d, stepl, %s, stepi, %s, text, %s, edits, %s\n" % (
+                    self.filename, wayl, wayi, first, point_l, point_i, sourcecode_line_text, edits),
+                    self.filename, 'Order', point_type, wayl, wayi, point_l if point_l is not None else point_i,
+                    valuel=[first, point_l, point_i], valuei=edits, text=sourcecode_line_text)
+
+    def checkHittimes(self, point, l: TraceIndex, i: TraceIndex, wayl, wayi, point_type: str):
+        frequency_i = i.hittimes.get(point)
+        frequency_l = l.hittimes[point]
+        ### when hit frequency in source-level debugging is larger than instruction-level
+        if frequency_i is None or frequency_l <= frequency_i:
+            return
+
+        name = "Frequency-" + point_type + "-" + self.debugger
+        if point_type == 'adr':
+            self.report(name, 'step', "%s, wayl, %s, wyi, %s, %s, freq(stepl):%s, freq(stepi):%s\n\n" % (self.filename, wayl, wayi, point, frequency_l, frequency_i),
+                        self.filename, 'Frequency', point_type, wayl, wayi, point, valuel=frequency_l, valuei=frequency_i)
+        else:
+            sourcecode_line_text = self.text[int(point[1]) - 1].strip() if point[0] == self.filename else ''
+            self.report(name, 'step', "%s, wayl, %s, wyi, %s, %s, %s, freq(stepl):%s, freq(stepi):%s\n\n" % (self.filename, wayl, wayi, point, sourcecode_line_text, frequency_l, frequency_i),
+                        self.filename, 'Frequency', point_type, wayl, wayi, point, valuel=frequency_l, valuei=frequency_i, text=sourcecode_line_text)
+
+    ### compares the first snapshots of point
+    def checkVarvalue(self, point, l: TraceIndex, i: TraceIndex, wayl, wayi, point_type: str, method: str):
+        snapshots_i = i.varvalue.get(point)
+        if snapshots_i is None:
+            return
+        variable_tables_l, variable_tables_i = l.varvalue[point][0], snapshots_i[0]
+
+        sourcecode_line_text = None
+        for variablename, variable_value_l in variable_tables_l.items():
+            variable_value_i = variable_tables_i.get(variablename)
+            if variable_value_i is None or variable_value_l == variable_value_i:
+                continue
+            if isUnavailable(variable_value_l) or isUnavailable(variable_value_i):
+                continue
+            if point_type != 'adr' and sourcecode_line_text is None:
+                sourcecode_line_text = self.sourceLine(point)
+            self.reportVarvalue(point, variablename, wayl, wayi, variable_value_l, variable_value_i, point_type, method, sourcecode_line_text)
+
+    def reportVarvalue(self, point, variablename: str, wayl, wayi, variable_value_l: str, variable_value_i: str, point_type: str, method: str, sourcecode_line_text):
+        self.report(point_type + "-var-" + self.debugger, method, "%s, %s, %s, %s, var: %s, [wayl-value]:%s, [wayi-value]:%s, %s\n" % (
+                    self.filename, wayl, wayi, point, variablename, variable_value_l, variable_value_i, sourcecode_line_text),
+                    self.filename, 'Varvalue', point_type, wayl, wayi, point, variablename, variable_value_l, variable_value_i, sourcecode_line_text)
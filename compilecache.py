@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Compilation cache shared across runs and pool workers. Objects are keyed by the source content, the identity of
+### the compiler binary, the flags and the optimization level; they are published atomically (write to a temporary
+### file, then rename) and evicted least-recently-used first once the cache grows over its size bound.
+### The outcome of main.Check (compile, sanitizer build and sanitizer run) is kept next to the objects.
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+import store
+
+
+class CompileCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def compilerIdentity(self, compiler: str) -> dict:
+        path = shutil.which(compiler) or compiler
+        identity = {'path': os.path.realpath(path), 'version': store.GetToolVersion(compiler)}
+        if os.path.exists(identity['path']):
+            st = os.stat(identity['path'])
+            identity['size'], identity['mtime'] = st.st_size, st.st_mtime_ns
+        return identity
+
+    def key(self, source: str, compiler: str, flags: str, opt: str) -> str:
+        fields = {'source': store.HashFile(source), 'compiler': self.compilerIdentity(compiler), 'flags': flags, 'opt': opt}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def objectFilename(self, key: str) -> str:
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def outcomeFilename(self, key: str) -> str:
+        return os.path.join(self.root, 'outcomes', key[:2], key + '.json')
+
+    ### copy the cached object of key to file_object, returns False on a miss
+    def fetch(self, key: str, file_object: str) -> bool:
+        filename = self.objectFilename(key)
+        try:
+            shutil.copy2(filename, file_object)
+            os.utime(filename)  ### mark as recently used
+            return True
+        except FileNotFoundError:
+            return False
+
+    def publish(self, key: str, file_object: str):
+        filename = self.objectFilename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        shutil.copy2(file_object, tmp_filename)
+        os.replace(tmp_filename, filename)
+        self.evict()
+
+    def outcome(self, key: str):
+        try:
+            with open(self.outcomeFilename(key), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def recordOutcome(self, key: str, flag):
+        filename = self.outcomeFilename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump({'flag': flag}, f)
+        os.replace(tmp_filename, filename)
+
+    def evict(self):
+        entries, total = [], 0
+        for root, _, files in os.walk(os.path.join(self.root, 'objects')):
+            for file in files:
+                if file.endswith('.tmp'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, file))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(root, file)))
+                total += st.st_size
+
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                ### evicted concurrently by another worker
+                pass
+            total -= size
+            logging.debug('[CompileCache]evict %s\n' % filename)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Cost model of the work on a source file, from the history of earlier runs: every unit (or every file, when files
+### run as a whole) appends its duration, trace length (steps), time budget and failure flag to a JSONL file. Files without history are estimated from
+### static features of the source (size and loops), scaled to seconds by the files that have history.
+### Used to schedule the most expensive files first and to give each trace an adaptive time and step budget.
+
+import re
+import os
+import json
+import logging
+
+from collections import defaultdict
+
+import store
+
+
+MIN_TIMEOUT = 30      ### seconds, lower bound of an adaptive time budget
+SLACK = 3             ### budgets are this many times the recorded duration and trace length
+STEP_MARGIN = 1000    ### added to step budgets, for short traces
+PATHOLOGICAL = 4      ### files exhausting the full budget before get timeout / PATHOLOGICAL from then on
+
+FILE_UNIT = ('file', None, None)   ### unit of a file run as a whole (main.task)
+
+re_loop = re.compile(r'\b(for|while|do)\b')
+
+
+def StaticFeatures(source: str) -> dict:
+    with open(source, 'r', errors='replace') as f:
+        text = f.read()
+    return {'size': len(text), 'loops': len(re_loop.findall(text))}
+
+
+def StaticScore(source: str) -> float:
+    features = StaticFeatures(source)
+    return 1 + features['size'] / 1024 + 4 * features['loops']
+
+
+class CostModel:
+    def __init__(self, filename: str):
+        self.filename = filename
+        ### (source hash, compiler, debugger) -> (kind, opt, step) -> latest record
+        self.history = defaultdict(dict)
+        self.rate = None
+
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        ### the last record may be cut off by an interrupted run
+                        continue
+                    self.history[tuple(record['file'])][tuple(record['unit'])] = record
+
+    def fileKey(self, source: str, compiler: str, debugger: str) -> tuple:
+        return (store.HashFile(source), compiler, debugger)
+
+    ### capped: the unit ran under the budget of a pathological file (see budget)
+    def record(self, source: str, compiler: str, debugger: str, unit: tuple, duration: float, steps=None, timeout=None, flag=None, capped=False):
+        record = {'file': self.fileKey(source, compiler, debugger), 'unit': unit, 'duration': duration, 'steps': steps, 'timeout': timeout, 'flag': flag,
+                  'capped': capped, 'score': StaticScore(source)}
+        self.history[record['file']][tuple(unit)] = record
+        self.rate = None
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    ### seconds spent on a file, by its units or as a whole (whichever took longer when both were recorded)
+    @staticmethod
+    def fileDuration(units: dict) -> float:
+        whole = units.get(FILE_UNIT)
+        parts = sum(record['duration'] for unit, record in units.items() if unit != FILE_UNIT)
+        return max(whole['duration'], parts) if whole is not None else parts
+
+    ### seconds per static score unit, over the files with history
+    def getRate(self) -> float:
+        if self.rate is None:
+            seconds, scores = 0.0, 0.0
+            for units in self.history.values():
+                seconds += self.fileDuration(units)
+                scores += next(iter(units.values()))['score']
+            self.rate = seconds / scores if scores else 1.0
+        return self.rate
+
+    def estimate(self, source: str, compiler: str, debugger: str) -> float:
+        units = self.history.get(self.fileKey(source, compiler, debugger))
+        if units:
+            return self.fileDuration(units)
+        try:
+            return StaticScore(source) * self.getRate()
+        except OSError as e:
+            logging.error('[CostModel]Exception %s for %s' % (e, source))
+            return 0.0
+
+    ### (timeout, max steps, capped) of the trace of source at opt by step; max steps 0 for no limit. capped budgets are
+    ### those of pathological files, a failure under them is final, while one under another budget tighter than the full
+    ### one is retried with (timeout, 0)
+    def budget(self, source: str, compiler: str, debugger: str, opt: str, step: str, timeout: int) -> tuple:
+        units = self.history.get(self.fileKey(source, compiler, debugger), {})
+        record = units.get(('trace', opt, step))
+        if record is None:
+            return timeout, 0, False
+
+        if record['flag'] is None:
+            budget_timeout = min(timeout, max(MIN_TIMEOUT, int(SLACK * record['duration'])))
+            max_steps = SLACK * record['steps'] + STEP_MARGIN if record['steps'] is not None else 0
+            return budget_timeout, max_steps, False
+
+        if ('TIMEOUT' in record['flag'] or 'STEPLIMIT' in record['flag']) and ((record['timeout'] or 0) >= timeout or record.get('capped')):
+            ### pathological: it exhausted the full budget, or the capped one since
+            return max(MIN_TIMEOUT, timeout // PATHOLOGICAL), 0, True
+
+        ### failed for other reasons: try again with the full budget
+        return timeout, 0, False
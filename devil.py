@@ -5,12 +5,23 @@
 import re
 import os
 import time
+import atexit
+import array
 import random
 import pexpect
+import contextlib
+import collections
 import signal
+import json
+import hashlib
 import logging
+import tempfile
 import pdb
 
+import gdbmi
+import dwarfline
+import varparser
+
 
 def GetDebugger(debugger):
     assert debugger in ['gdb', 'lldb', 'cjdb'], logging.error('Debugger of %s not supported' % debugger)
@@ -22,7 +33,7 @@ def GetDebugger(debugger):
         return 'cjdb'
 
 
-def getExp(child):
+def getExp(child, lazy=False):
     if 'gdb' in child.command:
         exp = r'(.*)\(gdb\) '
     elif 'lldb' in child.command:
@@ -30,12 +41,14 @@ def getExp(child):
     elif 'cjdb' in child.command:
         exp = r'(.*)\(cjdb\) '
 
+    if lazy:
+        ### several replies may be buffered at once, stop at the first prompt
+        exp = exp.replace('(.*)', '(.*?)', 1)
+
     return [exp, pexpect.EOF, pexpect.TIMEOUT] ### return [exp, r'[#\$] ', pexpect.EOF, pexpect.TIMEOUT]
 
 
-def sendcmd(child, cmd: str):
-    child.sendline(cmd)
-    index = child.expect(getExp(child)) ### https://stackoverflow.com/questions/10920035/python-pexpect-before-output-out-of-sync
+def checkExpect(child, index: int, cmd: str):
     logging.debug('file: %s\ncommand: %s\nbefore: %s\nafter:%s\n' % (child.name, cmd, child.before, child.after))
 
     if index == 0:
@@ -51,23 +64,126 @@ def sendcmd(child, cmd: str):
         raise Exception('TIMEOUTPEX')
 
 
-def SkippingFiles(child):
-    if 'cjdb' in child.command:
-        sendcmd(child, 'image list')
+def sendcmd(child, cmd: str, timeout=-1):
+    child.sendline(cmd)
+    index = child.expect(getExp(child), timeout=timeout) ### https://stackoverflow.com/questions/10920035/python-pexpect-before-output-out-of-sync
+    return checkExpect(child, index, cmd)
+
 
-        filelist = ""
-        # skipping files
-        for line in child.before.splitlines():
-            if '.so' in line:
-                lib_file = line.strip().split(' ')[-1]
-                if os.path.exists(lib_file):
-                    filelist = filelist + " " + lib_file
+### A command protocol is a generator that yields debugger commands and is sent back their outputs, returning its result
+### when done. The same protocol can be driven by a blocking session (Drive) or by the asyncio driver (asyncdriver.Drive).
+def Drive(child, protocol, timeout=-1):
+    try:
+        cmd = next(protocol)
+        while True:
+            cmd = protocol.send(sendcmd(child, cmd, timeout))
+    except StopIteration as e:
+        return e.value
+
+
+### write a batch of commands at once and then read one prompt per command, returning the outputs in order;
+### batches are kept small so that neither side of the pty can fill up while the other one is still writing
+def sendcmds(child, cmds: list, timeout=-1, batch=64, batch_bytes=1024):
+    outs = []
+    exp = getExp(child, lazy=True)
+
+    idx = 0
+    while idx < len(cmds):
+        chunk, size = [], 0
+        while idx < len(cmds) and len(chunk) < batch and (not chunk or size + len(cmds[idx]) + 1 <= batch_bytes):
+            chunk.append(cmds[idx])
+            size += len(cmds[idx]) + 1
+            idx += 1
+
+        child.send(''.join(cmd + os.linesep for cmd in chunk))
+        for cmd in chunk:
+            index = child.expect(exp, timeout=timeout)
+            outs.append(checkExpect(child, index, cmd))
+
+    return outs
+
+
+### Objects other than the user program (libc, ld.so, runtimes) are stepped over by the debugger itself, so that the
+### steppers never stop inside them and need no finish/step round trips to climb back out. Objects without debug info
+### are already stepped over (gdb's step, lldb's step-in-avoid-nodebug); gdb skips match source files and not objects,
+### so the sources of the other objects are skipped, while lldb avoids the other images themselves. Both only apply to
+### line steps: stepi traces leave frames outside the user source with finish (step-out) at their first instruction.
+
+### (object file or None, source files) groups of `info sources`; the sources are grouped by object since gdb 11
+def ParseSourceFiles(out: str) -> list:
+    groups, objfile = [], None
+    for line in out.splitlines():
+        line = line.strip()
+        if not line or line.startswith('('):
+            continue
+        if line.endswith(':') and ', ' not in line:
+            objfile = line[:-1] if line.startswith('/') else None
+            continue
+        groups.append((objfile, [source for source in line.split(', ') if source]))
+    return groups
+
+
+### gdb skips of the sources of every object but file_object; sources not grouped by object (gdb before 11) are only
+### skipped outside the directory of file_source, which holds the user headers as well
+def GetSkipCommands(groups: list, file_object: str, file_source: str) -> list:
+    user = os.path.realpath(file_object)
+    source_dir = os.path.dirname(os.path.realpath(file_source))
+    sources = set()
+    for objfile, files in groups:
+        if objfile is None:
+            files = [source for source in files if os.path.isabs(source) and not os.path.realpath(source).startswith(source_dir + os.sep)]
+        elif os.path.realpath(objfile) == user:
+            continue
+        sources.update(files)
 
-        if filelist != "":
-            sendcmd(child, 'settings set target.process.thread.step-avoid-libraries ' + filelist)
+    ### a directory of the user source is skipped file by file, all the others at once
+    user_dirs = {os.path.dirname(source) for source in sources if os.path.basename(source) == os.path.basename(file_source)}
+    cmds, dirs = [], set()
+    for source in sorted(sources):
+        if os.path.basename(source) == os.path.basename(file_source):
+            continue
+        dirname = os.path.dirname(source)
+        if dirname in user_dirs or not dirname:
+            cmds.append('skip -fi ' + source)
+        elif dirname not in dirs:
+            dirs.add(dirname)
+            cmds.append('skip -gfi ' + os.path.join(dirname, '*'))
+    return cmds
+
+
+### loaded images of `image list` other than file_object
+def ParseImages(out: str, file_object: str) -> list:
+    user = os.path.realpath(file_object)
+    images = []
+    for line in out.splitlines():
+        line = line.strip()
+        if not line.startswith('['):
+            continue
+        paths = [token for token in line.split(' ') if token.startswith('/')]
+        if paths and os.path.exists(paths[-1]) and os.path.realpath(paths[-1]) != user and paths[-1] not in images:
+            images.append(paths[-1])
+    return images
 
 
-def InitDebugger(file: str, debugger: str):
+### commands skipping the other objects, once the inferior runs (i.e. its shared libraries are loaded)
+def SkippingCommandsProtocol(child, file_object: str, file_source: str):
+    if 'gdb' in child.command:
+        out = yield 'info sources'
+        cmds = GetSkipCommands(ParseSourceFiles(out), file_object, file_source)
+    else:
+        out = yield 'image list'
+        images = ParseImages(out, file_object)
+        cmds = ['settings set target.process.thread.step-avoid-libraries ' + ' '.join(images)] if images else []
+
+    logging.debug('[SkippingFiles]%d commands for %s\n' % (len(cmds), file_object))
+    return cmds
+
+
+def SkippingFiles(child, file_object: str, file_source: str):
+    sendcmds(child, Drive(child, SkippingCommandsProtocol(child, file_object, file_source)))
+
+
+def SpawnDebugger(debugger: str):
     assert debugger in ['gdb', 'lldb', 'cjdb'], logging.error('Debugger of %s not supported' % debugger)
     deb = GetDebugger(debugger)
     if debugger == 'gdb':
@@ -78,10 +194,12 @@ def InitDebugger(file: str, debugger: str):
         cmd = deb + ' -X'
 
     child = pexpect.spawn(cmd, maxread=200000, logfile=open('mylog_'+debugger+'.txt', 'w'), encoding='utf-8', echo=False)
-    index = child.expect(getExp(child))
-
     child.delaybeforesend = None  ### this line can fix performance issues
+    return child
 
+
+### index of the first prompt expected after spawning the debugger
+def checkLaunch(child, index: int):
     if index == 1:
         if child.signalstatus == signal.SIGSEGV:
             raise Exception('DEBSIGSEGV')
@@ -90,41 +208,134 @@ def InitDebugger(file: str, debugger: str):
     elif index == 2:
         raise Exception('LAUNCHTIMEOUTPEX')
 
+
+def GetDebuggerSettings(debugger: str) -> list:
     if debugger == 'gdb':
-        sendcmd(child, 'set style enabled off')
-        sendcmd(child, 'set confirm off')
-        sendcmd(child, 'set width 0')
-        sendcmd(child, 'set height 0')
-        sendcmd(child, 'set pagination off')
-        sendcmd(child, 'set print frame-info location-and-address')
+        cmds = ['set style enabled off',
+                'set confirm off',
+                'set width 0',
+                'set height 0',
+                'set pagination off',
+                'set print frame-info location-and-address']
     elif debugger == 'lldb':
-        sendcmd(child, 'settings set use-color false')
-        sendcmd(child, 'settings set highlight-source false')
-        sendcmd(child, 'settings set auto-confirm true')
-        sendcmd(child, 'settings set target.process.thread.step-in-avoid-nodebug true')
-        sendcmd(child, 'settings set target.process.thread.step-out-avoid-nodebug true')
-        sendcmd(child, 'settings set symbols.enable-external-lookup false')
-        # sendcmd(child, 'settings set frame-format \'frame #${frame.index}: ${frame.pc} at ${line.file.basename}:${line.number}:${line.column}\\n\'', file)
+        cmds = ['settings set use-color false',
+                'settings set highlight-source false',
+                'settings set auto-confirm true',
+                'settings set target.process.thread.step-in-avoid-nodebug true',
+                'settings set target.process.thread.step-out-avoid-nodebug true',
+                'settings set symbols.enable-external-lookup false']
+                # 'settings set frame-format \'frame #${frame.index}: ${frame.pc} at ${line.file.basename}:${line.number}:${line.column}\\n\''
     elif debugger == 'cjdb':
-        sendcmd(child, 'settings set use-color false')
-        sendcmd(child, 'settings set highlight-source false')
-        sendcmd(child, 'settings set auto-confirm true')
-        sendcmd(child, 'settings set target.process.thread.step-in-avoid-nodebug true')
-        sendcmd(child, 'settings set target.process.thread.step-out-avoid-nodebug true')
-        sendcmd(child, 'settings set symbols.enable-external-lookup false')
-        sendcmd(child, 'settings set target.max-children-count 3')
-
-    sendcmd(child, 'file ' + file)
+        cmds = ['settings set use-color false',
+                'settings set highlight-source false',
+                'settings set auto-confirm true',
+                'settings set target.process.thread.step-in-avoid-nodebug true',
+                'settings set target.process.thread.step-out-avoid-nodebug true',
+                'settings set symbols.enable-external-lookup false',
+                'settings set target.max-children-count 3']
+    return cmds
+
+
+def InitDebugger(file: str, debugger: str):
+    child = SpawnDebugger(debugger)
+    checkLaunch(child, child.expect(getExp(child)))
+
+    sendcmds(child, GetDebuggerSettings(debugger) + ['file ' + file])
+    return child
+
+
+### swap the target of a warmed debugger session, leaving it as InitDebugger would
+def ResetDebugger(child, file: str):
+    if 'gdb' in child.command:
+        sendcmds(child, ['kill', 'delete', 'skip delete', 'file ' + file])
+    else:
+        sendcmds(child, ['process kill', 'target delete', 'settings clear target.process.thread.step-avoid-libraries', 'file ' + file])
     return child
 
 
+### keeps warmed debugger processes (one per debugger) so that each worker pays the debugger startup once
+class SessionPool:
+    def __init__(self):
+        self.sessions = {}
+
+    def acquire(self, file: str, debugger: str):
+        idle = self.sessions.get(debugger, [])
+        while idle:
+            child = idle.pop()
+            if not child.isalive():
+                continue
+            try:
+                return ResetDebugger(child, file)
+            except Exception as e:
+                logging.debug('[SessionPool]discard session %s: %s\n' % (child.name, e))
+                child.close()
+        return InitDebugger(file, debugger)
+
+    def release(self, child, debugger: str):
+        if child.isalive():
+            self.sessions.setdefault(debugger, []).append(child)
+        else:
+            child.close()
+
+    def close(self):
+        for idle in self.sessions.values():
+            for child in idle:
+                child.close(force=True)
+        self.sessions = {}
+
+
+pool = None
+
+### the variables of a step are fetched on the first hit of its (file, line, offset, address) only, or on every step;
+### the comparisons only read the snapshot of the first hit
+CAPTURE_POLICIES = ['first', 'all']
+capture = 'all'
+
+
+def SetCapturePolicy(policy: str):
+    global capture
+    assert policy in CAPTURE_POLICIES, logging.error('Capture policy of %s not supported' % policy)
+    capture = policy
+
+
+### whether the variables of the step at quadruple are fetched into trace
+def Captures(trace, quadruple) -> bool:
+    return capture == 'all' or not trace.has(quadruple)
+
+
+def EnableSessionPool():
+    global pool
+    if pool is None:
+        pool = SessionPool()
+        atexit.register(pool.close)
+    return pool
+
+
+### debugger session for file, taken from the session pool when it is enabled
+@contextlib.contextmanager
+def Session(file: str, debugger: str):
+    if pool is None:
+        with InitDebugger(file, debugger) as child:
+            yield child
+        return
+
+    child = pool.acquire(file, debugger)
+    try:
+        yield child
+    except BaseException:
+        ### the state of a failed session is unknown, never hand it out again
+        child.close(force=True)
+        raise
+    pool.release(child, debugger)
+
+
 def GetLineTableViaImage(file_obj, file_src, debugger):
     logging.debug('[GetLinetableViaGDBImage:start]%s\n' % file_obj)
     #########################################################
     ### obtain line info via line table information https://sourceware.org/bugzilla/show_bug.cgi?id=27126
     ### $ gdb -q a.out; (gdb) start (gdb) maint info line-table
     adr_set, loc_set, pos_set, all_set = set(), set(), set(), set()
-    with InitDebugger(file_obj, debugger) as child:
+    with Session(file_obj, debugger) as child:
         if debugger == 'gdb':
             sendcmd(child, 'start')
             out = sendcmd(child, 'maint info line-table *.c')
@@ -147,9 +358,9 @@ def GetLineTableViaImage(file_obj, file_src, debugger):
                 ## matching '0x0000000000000630: /pathto/small.c:16' or '0x0000000000000630: /pathto/small.c:15:2'
                 ## or '0x00000000000009de: /root/gcc-12.1.0/gcc/testsuite/gcc.c-torture/execute/pr80421.c:105:2, is_start_of_statement = TRUE'
                 if debugger == 'lldb':
-                    rem = re.match(r'^(0x[0-9a-f]+):\s+(.*\.[c|h]):([0-9]+)(:([0-9]+?))??.*', line)
+                    rem = re.match(r'^(0x[0-9a-f]+):\s+(.*\.[c|h]):([0-9]+)(:([0-9]+))?.*', line)
                 if debugger == 'cjdb':
-                    rem = re.match(r'^(0x[0-9a-f]+):\s+(.*\.cj):([0-9]+)(:([0-9]+?))??.*', line)
+                    rem = re.match(r'^(0x[0-9a-f]+):\s+(.*\.cj):([0-9]+)(:([0-9]+))?.*', line)
                 if rem:
                     adr, src, num, _, offset = rem.groups()
                     src = os.path.basename(src)
@@ -161,6 +372,63 @@ def GetLineTableViaImage(file_obj, file_src, debugger):
     return loc_set
 
 
+### load bias of file_obj run by gdb: the address of its mapping of file offset 0 (`info proc mappings` after `starti`)
+### minus the link-time address of that offset, measured once per machine (address randomization is disabled, so all
+### the executables of a machine get the same one); the usual one of the architecture when the mappings cannot be read
+load_biases = {}
+
+
+def ProbeLoadBias(file_obj: str, e_machine: int) -> int:
+    if e_machine in load_biases:
+        return load_biases[e_machine]
+    bias = dwarfline.PIE_LOAD_BIAS.get(e_machine, 0)
+    try:
+        with Session(file_obj, 'gdb') as child:
+            sendcmd(child, 'starti')
+            out = sendcmd(child, 'info proc mappings')
+        for line in out.splitlines():
+            ### Start Addr, End Addr, Size, Offset, [Perms,] objfile
+            fields = line.split()
+            if len(fields) >= 5 and fields[0].startswith('0x') and int(fields[3], 16) == 0 \
+                    and os.path.realpath(fields[-1]) == os.path.realpath(file_obj):
+                bias = int(fields[0], 16) - dwarfline.GetLinkBase(file_obj)
+                break
+        else:
+            logging.error('[ProbeLoadBias]no mapping of %s in: %s (checking)' % (file_obj, out))
+    except Exception as e:
+        logging.error('[ProbeLoadBias]%s for %s' % (e, file_obj))
+    if bias != dwarfline.PIE_LOAD_BIAS.get(e_machine, 0):
+        logging.warning('[ProbeLoadBias]load bias %s of machine %s differs from the usual one' % (hex(bias), e_machine))
+    load_biases[e_machine] = bias
+    return bias
+
+
+### same (file, line, offset, address) set as GetLineTableViaImage, decoded from .debug_line without launching a debugger
+### (unless probe, which reads the load bias of position independent executables from gdb once per machine)
+def GetLineTableViaDWARF(file_obj, file_src, debugger, cache_dir=None, probe=False):
+    logging.debug('[GetLineTableViaDWARF:start]%s\n' % file_obj)
+    rows, e_type, e_machine = dwarfline.GetLineTable(file_obj, cache_dir)
+
+    bias = 0
+    if debugger == 'gdb' and e_type == dwarfline.ET_DYN:
+        ### gdb dumps the line table after `start`, i.e. with relocated addresses
+        bias = ProbeLoadBias(file_obj, e_machine) if probe else dwarfline.PIE_LOAD_BIAS.get(e_machine, 0)
+
+    suffixes = ('.cj',) if debugger == 'cjdb' else ('.c', '.h')
+    loc_set = set()
+    for filename, line, column, address, is_stmt, end_sequence in rows:
+        if end_sequence or (filename is None) or (not filename.endswith(suffixes)):
+            continue
+        if debugger == 'gdb' and not is_stmt:
+            continue
+        ### gdb shows no columns, neither in the line table nor in the frames; column 0 is none
+        offset = str(column) if column and debugger != 'gdb' else None
+        loc_set.add((os.path.basename(filename), str(line), offset, hex(address + bias)))
+
+    logging.debug('[GetLineTableViaDWARF:end]%s\n' % file_obj)
+    return loc_set
+
+
 def GetFileLines(file):
     count = 0
     for _, _ in enumerate(file):
@@ -171,10 +439,9 @@ def GetFileLines(file):
 def GetLineTableViaBreak(file_object: str, file_source: str, debugger: str):
     logging.debug('[GetLineTableViaBreak:start]\n')
     lwdi = set()
-    with InitDebugger(file_object, debugger) as child: 
+    with Session(file_object, debugger) as child:
         totalLines = GetFileLines(file=file_source)
-        for line in range(1, totalLines + 1, 1):
-            sendcmd(child, 'b ' + str(line))
+        sendcmds(child, ['b ' + str(line) for line in range(1, totalLines + 1, 1)])
 
         if debugger == 'gdb':
             out = sendcmd(child, 'info breakpoints')
@@ -196,18 +463,18 @@ def GetLineTableViaBreak(file_object: str, file_source: str, debugger: str):
     return lwdi
 
 
-def GetFrameInfo(child, file_source):
+def GetFrameInfoProtocol(child, file_source):
     logging.debug('[GetFrameInfo for %s]start\n' % child.command)
     filename, lineno, offset, address, quadruple, fra = None, None, None, None, None, None
     if 'gdb' in child.command:
-        out = sendcmd(child, 'bt -frame-info location-and-address')
+        out = yield 'bt -frame-info location-and-address'
         if '#0' in out:
             fra = '#0' + out.split('#1', 1)[0].split('#0', 1)[1]
             fra = fra.replace('\n', ' ')
             fra = fra.replace('\r', ' ')
             fra = fra.strip()
     elif ('lldb' in child.command) or ('cjdb' in child.command):
-        out = sendcmd(child, 'frame info')
+        out = yield 'frame info'
         for line in out.splitlines():
             if 'frame #0' in line:
                 fra = line.strip()
@@ -246,89 +513,87 @@ def GetFrameInfo(child, file_source):
     return filename, lineno, offset, address, quadruple
 
 
-def GetRawFrameVars(lines: str) -> str:
-    lines = lines.splitlines()
-    for line in lines:
-        yield line
+def GetFrameInfo(child, file_source):
+    return Drive(child, GetFrameInfoProtocol(child, file_source))
 
 
-def DumpFrameVars(raw) -> str:
-    ans = ""
-    isfirst: bool = True
-    for item in raw:
-        s = item.strip()
-        if s.endswith('}'):
-            break
+def GetFrameVarsProtocol(child):
+    if 'gdb' in child.command:
+        items_l = yield 'info locals'
+        items_a = yield 'info args'
 
-        if isfirst:
-            isfirst = False
-        else:
-            ans += ", "
+        items = items_l + '\n' + items_a
+    else:
+        items = yield 'frame var'
 
-        if s.endswith('{'):
-            child = DumpFrameVars(raw)
-            ans += s + child + '}'
+    return varparser.ParseFrameVars(items)
 
-        ans += " " + s + " "
 
-    return ans
+def GetFrameVars(child):
+    return Drive(child, GetFrameVarsProtocol(child))
 
 
-### Recursively traverse the structure layer by layer
-def ParseFrameVars(raw) -> dict:
-    variables = {}
-    for item in raw:
-        if item.strip().endswith('}'):
-            break
+def InferiorExitProtocol(child):
+    if 'gdb' in child.command:
+        out = yield 'info proc'
+        if 'No current process' in out:
+            return True
+    else:
+        out = yield 'process status'
+        if re.search(r'Process [0-9]+ exited with status = [0-9]+', out):
+            return True
 
-        if ' = ' not in item:
-            continue
+    return False
 
-        token_both = item.split(' = ', 1)
-        token1 = token_both[1].strip()
-        token0 = token_both[0].strip()
 
-        if token1.startswith('{'):
-            child = ParseFrameVars(raw)
-            for k, v in child.items():
-                variables[token0 + '.' + k] = v
+def InferiorExit(child):
+    return Drive(child, InferiorExitProtocol(child))
 
-        elif token1.endswith('{'):
-            child = DumpFrameVars(raw)
-            variables[token0] = token1 + child + '}'
 
-        else:
-            variables[token0] = token1
+### stop event parsed from the reply of a step/finish command
+### kind: 'exited', 'signalled', 'stopped' (at a frame) or 'unknown' (reply is ambiguous, query the process status)
+StopEvent = collections.namedtuple('StopEvent', ['kind', 'status'])
 
-    return variables
+re_gdb_exited = re.compile(r'\[Inferior [0-9]+ \(process [0-9]+\) exited (normally|with code ([0-9]+))\]')
+re_gdb_signalled = re.compile(r'Program terminated with signal ([A-Z0-9]+)')
+re_gdb_stopped = re.compile(r'^((0x[0-9a-f]+\t)?[0-9]+\t|0x[0-9a-f]+ in |Program received signal )', re.MULTILINE)
+re_lldb_exited = re.compile(r'Process [0-9]+ exited with status = (-?[0-9]+)')
+re_lldb_stopped = re.compile(r'Process [0-9]+ stopped|stop reason = ')
 
 
-def GetFrameVars(child):
+def ParseStopEvent(child, out: str) -> StopEvent:
     if 'gdb' in child.command:
-        items_l = sendcmd(child, 'info locals')
-        items_a = sendcmd(child, 'info args')
-
-        items = items_l + '\n' + items_a
+        rem = re_gdb_exited.search(out)
+        if rem:
+            return StopEvent('exited', rem.groups()[1] or '0')
+        rem = re_gdb_signalled.search(out)
+        if rem:
+            return StopEvent('signalled', rem.groups()[0])
+        if 'The program is not being run.' in out:
+            return StopEvent('exited', None)
+        if re_gdb_stopped.search(out):
+            return StopEvent('stopped', None)
     else:
-        items = sendcmd(child, 'frame var')
+        rem = re_lldb_exited.search(out)
+        if rem:
+            return StopEvent('exited', rem.groups()[0])
+        if 'invalid process' in out or 'requires a current process' in out:
+            return StopEvent('exited', None)
+        if re_lldb_stopped.search(out):
+            return StopEvent('stopped', None)
 
-    raw = GetRawFrameVars(items)
-    variables = ParseFrameVars(raw)
+    return StopEvent('unknown', None)
 
-    return variables
 
+### only query the process status when the last stop event does not tell whether the inferior exited
+def IsExitedProtocol(child, event: StopEvent):
+    if event is None or event.kind == 'unknown':
+        return (yield from InferiorExitProtocol(child))
+    return event.kind in ['exited', 'signalled']
 
-def InferiorExit(child):
-    if 'gdb' in child.command:
-        out = sendcmd(child, 'info proc')
-        if 'No current process' in out:
-            return True
-    else:
-        out = sendcmd(child, 'process status')
-        if re.search(r'Process [0-9]+ exited with status = [0-9]+', out):
-            return True
 
-    return False
+def IsExited(child, event: StopEvent) -> bool:
+    return Drive(child, IsExitedProtocol(child, event))
 
 
 def ensureInitiated(obj, key1, key2, key3, key4, value):
@@ -347,7 +612,7 @@ def ensureInitiated(obj, key1, key2, key3, key4, value):
     return obj
 
 
-def stepping(child, step):
+def steppingProtocol(child, step):
     if step == 'stepl':
         cmd = 'step'
     elif step == 'stepi':
@@ -357,16 +622,30 @@ def stepping(child, step):
             cmd = 'step'
         else:
             cmd = 'stepi'
-    sendcmd(child, cmd)
+    out = yield cmd
+    return ParseStopEvent(child, out)
 
 
-def DriveToPoint(file_source: str, debugger: str, child, point, way: str, timeout: int):
-    logging.debug('\n[Drive to %s via %s for %s]start\n' % (point, way))
+def stepping(child, step):
+    return Drive(child, steppingProtocol(child, step))
+
+
+def finishProtocol(child):
+    out = yield 'finish'
+    return ParseStopEvent(child, out), out
+
+
+def finish(child):
+    return Drive(child, finishProtocol(child))
+
+
+def DriveToPoint(file_object: str, file_source: str, debugger: str, child, point, way: str, timeout: int):
+    logging.debug('\n[Drive to %s via %s for %s]start\n' % (point, way, file_source))
     ###############################################
     # Prefix: run to a program point
     ###############################################
     if way == 'break':
-        if point.startswith('0x'):
+        if isinstance(point, str): ### address point, otherwise (file, line)
             if 'gdb' in debugger:
                 cmd = 'b *' + point
             else:
@@ -376,9 +655,10 @@ def DriveToPoint(file_source: str, debugger: str, child, point, way: str, timeou
 
         sendcmd(child, cmd)
         sendcmd(child, 'run')
+        SkippingFiles(child, file_object, file_source)
 
         file, line, _, address, _ = GetFrameInfo(child, file_source)
-        if point.startswith('0x'):
+        if isinstance(point, str):
             if address == point:
                 return True
         else:
@@ -387,20 +667,22 @@ def DriveToPoint(file_source: str, debugger: str, child, point, way: str, timeou
     else:
         sendcmd(child, 'b main')
         sendcmd(child, 'run')
+        SkippingFiles(child, file_object, file_source)
 
         time_start = time.time()
         file_prev = None
+        event = None
 
         while True:
             if (time.time() - time_start) >= timeout:
                 raise Exception('TIMEOUTDEB')
 
-            if InferiorExit(child):
+            if IsExited(child, event):
                 break
 
             file, line, _, address, _ = GetFrameInfo(child, file_source)
 
-            if point.startswith('0x'):
+            if isinstance(point, str):
                 if address == point:
                     return True
             else:
@@ -411,15 +693,128 @@ def DriveToPoint(file_source: str, debugger: str, child, point, way: str, timeou
                 file_prev = file
 
             if (file is None) and (file_prev is None):
-                sendcmd(child, 'finish')
+                event, _ = finish(child)
                 continue
             
             file_prev = file
-            stepping(child, way)
+            event = stepping(child, way)
 
     return False
 
 
+re_checkpoint = re.compile(r'checkpoint ([0-9]+): fork returned pid')
+
+
+### Drive to program points from gdb checkpoints (fork-based snapshots, https://sourceware.org/gdb/current/onlinedocs/gdb.html/Checkpoint_002fRestart.html)
+### instead of stepping from main every time: one pass steps from main via `way` and takes a checkpoint every `interval`
+### frames, recording the frames seen and the command issued after each of them. Reaching a point then means restarting
+### the nearest earlier checkpoint and replaying the recorded commands up to the point's first hit.
+class CheckpointDriver:
+    def __init__(self, file_object: str, file_source: str, debugger: str, way: str, interval: int, timeout: int):
+        assert debugger == 'gdb' and way in ['stepl', 'stepi'], logging.error('Checkpoints of %s via %s not supported' % (debugger, way))
+        self.file_object = file_object
+        self.file_source = file_source
+        self.way = way
+        self.interval = interval
+        self.timeout = timeout
+        self.frames, self.actions, self.checkpoints = [], [], {}
+        self.complete = False
+        self.child = InitDebugger(file_object, debugger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.child.close(force=True)
+
+    def checkpoint(self):
+        rem = re_checkpoint.search(sendcmd(self.child, 'checkpoint'))
+        if rem:
+            return rem.groups()[0]
+        return None
+
+    def act(self, action: str):
+        if action == 'finish':
+            event, _ = finish(self.child)
+            return event
+        return stepping(self.child, action)
+
+    def prepare(self):
+        logging.debug('\n[CheckpointDriver via %s for %s]start\n' % (self.way, self.file_object))
+        sendcmd(self.child, 'b main')
+        sendcmd(self.child, 'run')
+        SkippingFiles(self.child, self.file_object, self.file_source)
+
+        time_start = time.time()
+        file_prev = None
+        event = None
+
+        while True:
+            if (time.time() - time_start) >= self.timeout:
+                ### points beyond the recorded prefix fall back to OneRun
+                return self
+
+            if IsExited(self.child, event):
+                break
+
+            if len(self.frames) % self.interval == 0:
+                checkpoint = self.checkpoint()
+                if checkpoint is not None:
+                    self.checkpoints[len(self.frames)] = checkpoint
+
+            file, line, _, address, _ = GetFrameInfo(self.child, self.file_source)
+            self.frames.append((file, line, address))
+
+            if file_prev is None and file:
+                file_prev = file
+
+            if (file is None) and (file_prev is None):
+                action = 'finish'
+            else:
+                file_prev = file
+                action = self.way
+            self.actions.append(action)
+            event = self.act(action)
+
+        self.complete = True
+        return self
+
+    ### returns (handled, result); not handled means the caller should fall back to OneRun
+    def run(self, point, step: str):
+        target = None
+        for index, (file, line, address) in enumerate(self.frames):
+            if (isinstance(point, str) and address == point) or ((not isinstance(point, str)) and (file, line) == tuple(point)):
+                target = index
+                break
+
+        if target is None:
+            ### a complete pass never reached the point, neither would DriveToPoint
+            return self.complete, None
+
+        bases = [index for index in self.checkpoints if index <= target]
+        if not bases:
+            return False, None
+        base = max(bases)
+
+        sendcmd(self.child, 'restart ' + self.checkpoints[base])
+        ### the restarted fork is consumed by stepping it, keep a pristine copy of the snapshot
+        checkpoint = self.checkpoint()
+        if checkpoint is None:
+            del self.checkpoints[base]
+        else:
+            self.checkpoints[base] = checkpoint
+
+        for action in self.actions[base:target]:
+            self.act(action)
+
+        file, line, _, address, _ = GetFrameInfo(self.child, self.file_source)
+        if (file, line, address) != self.frames[target]:
+            logging.error('[CheckpointDriver]replay of %s reached %s instead of %s (checking)' % (point, (file, line, address), self.frames[target]))
+            return False, None
+
+        return True, SuffixStepping(file_object=self.file_object, file_source=self.file_source, child=self.child, step=step, timeout=self.timeout)
+
+
 def Hittimes_table_update(obj, key):
     if key in obj:
         obj[key] += 1
@@ -438,107 +833,547 @@ def Varvalue_table_update(obj, key, var):
     return obj
 
 
-def SuffixStepping(file_object: str, file_source: str, child: pexpect.spawn, step: str, timeout: int):
+POINT_TYPES = ['adr', 'loc', 'pos', 'all']
+TRACE_KEYS = ['order', 'frequency', 'variable'] + [point_type + view for point_type in POINT_TYPES for view in ['Order', 'Hittimes', 'Varvalue']]
+
+
+### quadruple (filename, fileNo, offset, address) projected to a program point of point_type
+def ProjectPoint(quadruple, point_type):
+    file, line, offset, address = quadruple
+    if point_type == 'adr':
+        return address
+    elif point_type == 'loc':
+        return (file, line)
+    elif point_type == 'pos':
+        return (file, line, offset)
+    return quadruple
+
+
+KEYFRAME_INTERVAL = 32  ### longest chain of delta snapshots before a full one
+
+
+def SnapshotDigest(varvalue: dict) -> bytes:
+    return hashlib.blake2b(json.dumps(varvalue, sort_keys=True).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+### (changed values, removed names) turning the snapshot prev into varvalue, None when a full snapshot is as small
+def SnapshotDelta(prev: dict, varvalue: dict):
+    changed = {name: value for name, value in varvalue.items() if prev.get(name) != value}
+    removed = [name for name in prev if name not in varvalue]
+    if 2 * (len(changed) + len(removed)) >= len(varvalue):
+        return None
+    return changed, removed
+
+
+### Lazily reconstructed variable snapshots of the hits of a program point; compares like the list of snapshots
+class Snapshots:
+    def __init__(self, trace, sids):
+        self.trace = trace
+        self.sids = sids
+
+    def __len__(self):
+        return len(self.sids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.trace.snapshot(sid) for sid in self.sids[index]]
+        return self.trace.snapshot(self.sids[index])
+
+    def __iter__(self):
+        return (self.trace.snapshot(sid) for sid in self.sids)
+
+    def __eq__(self, other):
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+
+### A trace recorded by SuffixStepping, stored once as columns of interned point ids and deduplicated
+### variable snapshot ids (-1 for the steps whose variables were not fetched, see Captures). Distinct snapshots are stored as the changes against the snapshot of the previous step
+### (a full keyframe at least every KEYFRAME_INTERVAL deltas) and reconstructed on access. The views read by
+### main.compare* (adrOrder, locHittimes, allVarvalue, ..., plus the nested order/frequency/variable tables)
+### are computed on first access, so it can be used like the result dict.
+class Trace:
+    def __init__(self):
+        self.points, self.point_ids = [], {}
+        self.snapshots, self.snapshot_ids = [], {}  ### full dict, or (base sid, changed values, removed names)
+        self.depths = array.array('i')              ### length of the delta chain of every snapshot
+        self.step_points = array.array('i')
+        self.step_snapshots = array.array('i')
+        self.views = {}
+        self.cached = (None, None)                  ### last reconstructed (sid, snapshot)
+        self.base = None                            ### snapshot of the last step that fetched variables
+
+    def __getstate__(self):
+        return {'points': self.points, 'snapshots': self.snapshots,
+                'step_points': self.step_points, 'step_snapshots': self.step_snapshots}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.point_ids = {point: pid for pid, point in enumerate(self.points)}
+        ### rebuilt when the trace is appended to again
+        self.snapshot_ids, self.depths, self.base = None, None, None
+        self.views = {}
+        self.cached = (None, None)
+
+    def snapshot(self, sid: int) -> dict:
+        if sid == self.cached[0]:
+            return self.cached[1]
+
+        chain, base = [], sid
+        while not isinstance(self.snapshots[base], dict) and base != self.cached[0]:
+            chain.append(base)
+            base = self.snapshots[base][0]
+        if not chain:
+            return self.snapshots[sid]
+
+        varvalue = dict(self.cached[1] if base == self.cached[0] else self.snapshots[base])
+        for delta in reversed(chain):
+            _, changed, removed = self.snapshots[delta]
+            for name in removed:
+                del varvalue[name]
+            varvalue.update(changed)
+        self.cached = (sid, varvalue)
+        return varvalue
+
+    def reindex(self):
+        self.snapshot_ids, self.depths = {}, array.array('i')
+        for sid, snapshot in enumerate(self.snapshots):
+            self.snapshot_ids[SnapshotDigest(self.snapshot(sid))] = sid
+            self.depths.append(0 if isinstance(snapshot, dict) else self.depths[snapshot[0]] + 1)
+        self.base = next((sid for sid in reversed(self.step_snapshots) if sid >= 0), None)
+
+    def intern(self, varvalue: dict) -> int:
+        if self.snapshot_ids is None:
+            self.reindex()
+        digest = SnapshotDigest(varvalue)
+        sid = self.snapshot_ids.get(digest)
+        if sid is not None:
+            return sid
+
+        sid = self.snapshot_ids[digest] = len(self.snapshots)
+        base = self.base
+        delta = None
+        if base is not None and self.depths[base] < KEYFRAME_INTERVAL:
+            delta = SnapshotDelta(self.snapshot(base), varvalue)
+        if delta is None:
+            self.snapshots.append(varvalue)
+            self.depths.append(0)
+        else:
+            self.snapshots.append((base,) + delta)
+            self.depths.append(self.depths[base] + 1)
+        return sid
+
+    def has(self, quadruple) -> bool:
+        return quadruple in self.point_ids
+
+    ### varvalue is None when the variables of the step were not fetched
+    def append(self, quadruple, varvalue):
+        pid = self.point_ids.get(quadruple)
+        if pid is None:
+            pid = self.point_ids[quadruple] = len(self.points)
+            self.points.append(quadruple)
+        sid = -1
+        if varvalue is not None:
+            sid = self.base = self.intern(varvalue)
+            self.cached = (sid, varvalue)
+        self.step_points.append(pid)
+        self.step_snapshots.append(sid)
+        self.views = {}
+        return self
+
+    def __len__(self):
+        return len(self.step_points)
+
+    ### per-step (quadruple, varvalue) records, in the order they were recorded
+    def steps(self):
+        for pid, sid in zip(self.step_points, self.step_snapshots):
+            yield self.points[pid], self.snapshot(sid) if sid >= 0 else None
+
+    def slice(self, start: int):
+        sliced = Trace()
+        sliced.points, sliced.point_ids = list(self.points), dict(self.point_ids)
+        sliced.snapshots, sliced.snapshot_ids = list(self.snapshots), None
+        sliced.step_points = self.step_points[start:]
+        sliced.step_snapshots = self.step_snapshots[start:]
+        return sliced
+
+    def keys(self):
+        return list(TRACE_KEYS)
+
+    def __contains__(self, key):
+        return key in TRACE_KEYS
+
+    def __getitem__(self, key):
+        if key not in self.views:
+            if key not in self:
+                raise KeyError(key)
+            self.views[key] = self.compute(key)
+        return self.views[key]
+
+    def compute(self, key):
+        if key == 'order':
+            return list(self['allHittimes'])
+        elif key == 'frequency':
+            frequency = {}
+            for (file, line, offset, address), count in self['allHittimes'].items():
+                ensureInitiated(frequency, file, line, offset, address, count)
+            return frequency
+        elif key == 'variable':
+            variable = {}
+            for (file, line, offset, address), varvalues in self['allVarvalue'].items():
+                ensureInitiated(variable, file, line, offset, address, varvalues[0])
+            return variable
+
+        point_type, view = key[:3], key[3:]
+        projected = [ProjectPoint(point, point_type) for point in self.points]
+        if view == 'Order':
+            return [projected[pid] for pid in self.step_points]
+        elif view == 'Hittimes':
+            hittimes = {}
+            for pid in self.step_points:
+                Hittimes_table_update(hittimes, projected[pid])
+            return hittimes
+        elif view == 'Varvalue':
+            varvalue = {}
+            for pid, sid in zip(self.step_points, self.step_snapshots):
+                if sid >= 0:
+                    Varvalue_table_update(varvalue, projected[pid], sid)
+            return {point: Snapshots(self, sids) for point, sids in varvalue.items()}
+
+
+### Streams a trace to an append-only JSONL record file while it is recorded, so that memory stays flat and an
+### interrupted run (e.g. TIMEOUTDEB) still leaves the recorded prefix on disk. Points and variable snapshots are
+### written once as {"point"|"snapshot": id, "value": ...} (or snapshots as {"snapshot": id, "base": id, "changed":
+### ..., "removed": ...} against the snapshot of the previous step) and each step as a [point id, snapshot id] pair
+### (snapshot id -1 when its variables were not fetched).
+class TraceWriter:
+    def __init__(self, filename: str, flush_every=1000):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.filename = filename
+        self.f = open(filename, 'w')
+        self.point_ids, self.snapshot_ids = {}, {}
+        self.depths = []
+        self.prev = None    ### (sid, snapshot) of the previous step
+        self.steps = 0
+        self.flush_every = flush_every
+
+    def has(self, quadruple) -> bool:
+        return quadruple in self.point_ids
+
+    def append(self, quadruple, varvalue):
+        pid = self.point_ids.get(quadruple)
+        if pid is None:
+            pid = self.point_ids[quadruple] = len(self.point_ids)
+            self.f.write(json.dumps({'point': pid, 'value': quadruple}) + '\n')
+
+        if varvalue is None:
+            ### variables not fetched (capture policy)
+            sid = -1
+        else:
+            digest = SnapshotDigest(varvalue)
+            sid = self.snapshot_ids.get(digest)
+            if sid is None:
+                sid = self.snapshot_ids[digest] = len(self.snapshot_ids)
+                delta = None
+                if self.prev is not None and self.depths[self.prev[0]] < KEYFRAME_INTERVAL:
+                    delta = SnapshotDelta(self.prev[1], varvalue)
+                if delta is None:
+                    self.f.write(json.dumps({'snapshot': sid, 'value': varvalue}) + '\n')
+                    self.depths.append(0)
+                else:
+                    self.f.write(json.dumps({'snapshot': sid, 'base': self.prev[0], 'changed': delta[0], 'removed': delta[1]}) + '\n')
+                    self.depths.append(self.depths[self.prev[0]] + 1)
+            self.prev = (sid, varvalue)
+
+        self.f.write('[%d, %d]\n' % (pid, sid))
+        self.steps += 1
+        if self.steps % self.flush_every == 0:
+            self.f.flush()
+        return self
+
+    def close(self, complete: bool):
+        if complete:
+            self.f.write(json.dumps({'end': self.steps}) + '\n')
+        self.f.close()
+
+
+### returns the Trace recorded in a TraceWriter file and whether the recording was complete
+def ReadTraceFile(filename: str):
+    trace = Trace()
+    complete = False
+    with open(filename, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                ### the last record of an interrupted recording may be cut off
+                break
+
+            if isinstance(record, list):
+                trace.step_points.append(record[0])
+                trace.step_snapshots.append(record[1])
+            elif 'point' in record:
+                trace.points.append(tuple(record['value']))
+            elif 'snapshot' in record:
+                if 'base' in record:
+                    trace.snapshots.append((record['base'], record['changed'], record['removed']))
+                else:
+                    trace.snapshots.append(record['value'])
+            elif 'end' in record:
+                complete = True
+
+    trace.__setstate__(trace.__getstate__())
+    return trace, complete
+
+
+### a trace recorded on disk by TraceWriter, read back on first access; pickles as its filename (and number of steps,
+### so that its length is known without reading it back)
+class TraceFile:
+    def __init__(self, filename: str, length=None):
+        self.filename = filename
+        self.length = length
+        self.trace = None
+        self.complete = None
+
+    def __getstate__(self):
+        return {'filename': self.filename, 'length': self.length}
+
+    def __setstate__(self, state):
+        self.__init__(state['filename'], state.get('length'))
+
+    def load(self):
+        if self.trace is None:
+            self.trace, self.complete = ReadTraceFile(self.filename)
+        return self.trace
+
+    def release(self):
+        self.trace = None
+
+    def keys(self):
+        return list(TRACE_KEYS)
+
+    def __contains__(self, key):
+        return key in TRACE_KEYS
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __len__(self):
+        if self.trace is None and self.length is not None:
+            return self.length
+        return len(self.load())
+
+    def steps(self):
+        return self.load().steps()
+
+    def slice(self, start: int):
+        return self.load().slice(start)
+
+
+### where a run records its trace: in memory, or streamed to trace_file
+@contextlib.contextmanager
+def Recorder(trace_file=None):
+    if trace_file is None:
+        yield Trace()
+        return
+
+    writer = TraceWriter(trace_file)
+    try:
+        yield writer
+    except BaseException:
+        writer.close(complete=False)
+        raise
+    writer.close(complete=True)
+
+
+def SuffixSteppingProtocol(file_object: str, file_source: str, child: pexpect.spawn, step: str, timeout: int, trace=None, max_steps=0):
     logging.debug('\n[SuffixStep via %s for %s]start\n' % (step, file_object))
     #################################################
     # Suffix: step by step
     #################################################
-    all_set, ord_lst, frq_map, var_tbl = set([]), [], {}, {}
-
-    adr_order_lst, adr_hittimes_tbl, adr_varvalue_tbl = [], {}, {}
-    loc_order_lst, loc_hittimes_tbl, loc_varvalue_tbl = [], {}, {}
-    pos_order_lst, pos_hittimes_tbl, pos_varvalue_tbl = [], {}, {}
-    all_order_lst, all_hittimes_tbl, all_varvalue_tbl = [], {}, {}
+    res = Trace() if trace is None else trace
 
     file_prev = None
+    event = None
+    steps = 0
 
     time_start = time.time()
     while True:
         if (time.time() - time_start) >= timeout:
             raise Exception('TIMEOUTDEB')
 
-        if InferiorExit(child):
+        ### step budget of the run, 0 for no limit
+        if max_steps and steps >= max_steps:
+            raise Exception('STEPLIMITDEB')
+
+        if (yield from IsExitedProtocol(child, event)):
             break
 
-        file, line, offset, address, _ = GetFrameInfo(child, file_source)
+        file, line, offset, address, _ = yield from GetFrameInfoProtocol(child, file_source)
 
         if (file_prev is None) and file:
             file_prev = file
 
-        if (file is None) and (file_prev is None):
-            ### When previous and current stacks are both in library functions, finish to the parent stack
+        if (file is None) and (file_prev is None or step == 'stepi'):
+            ### When previous and current stacks are both in library functions, finish to the parent stack (stepi at once,
+            ### the skips of SkippingFiles do not apply to it)
             if ('lldb' in child.command) or ('cjdb' in child.command):
-                out_b = sendcmd(child, 'bt')
+                out_b = yield 'bt'
                 if 'frame #1' in out_b:
-                    out_f = sendcmd(child, 'finish')
+                    event, out_f = yield from finishProtocol(child)
                     if 'error: Could not create return address breakpoint' in out_f:
-                        stepping(child, step)
+                        event = yield from steppingProtocol(child, step)
                 else:
-                    stepping(child, step)
+                    event = yield from steppingProtocol(child, step)
             else:
-                sendcmd(child, 'finish')
+                event, _ = yield from finishProtocol(child)
             continue
 
         if file is None:
             ### when reach to library functions, step to next statement or instruction
-            stepping(child, step)
+            event = yield from steppingProtocol(child, step)
             file_prev = file
             continue
 
-        adr, loc, pos, all = address, (file, line), (file, line, offset), (file, line, offset, address)
-
-        ### record filename, fileNo, offset, and address
-        adr_order_lst.append(adr)
-        loc_order_lst.append(loc)
-        pos_order_lst.append(pos)
-        all_order_lst.append(all)
-
-        Hittimes_table_update(adr_hittimes_tbl, adr)
-        Hittimes_table_update(loc_hittimes_tbl, loc)
-        Hittimes_table_update(pos_hittimes_tbl, pos)
-        Hittimes_table_update(all_hittimes_tbl, all)
-
-        ### record variable values
-        varvalue = GetFrameVars(child)
-        Varvalue_table_update(adr_varvalue_tbl, adr, varvalue)
-        Varvalue_table_update(loc_varvalue_tbl, loc, varvalue)
-        Varvalue_table_update(pos_varvalue_tbl, pos, varvalue)
-        Varvalue_table_update(all_varvalue_tbl, all, varvalue)
-
-        ensureInitiated(frq_map, file, line, offset, address, 0)
-        frq_map[file][line][offset][address] += 1
-        
-        if all not in all_set:
-            all_set.add(all)
-            ord_lst.append(all)
-            ensureInitiated(var_tbl, file, line, offset, address, [])
-            var_tbl[file][line][offset][address] = varvalue
+        quadruple = (file, line, offset, address)
+        varvalue = (yield from GetFrameVarsProtocol(child)) if Captures(res, quadruple) else None
+        res.append(quadruple, varvalue)
+        steps += 1
 
         file_prev = file
-        stepping(child, step)
+        event = yield from steppingProtocol(child, step)
+
+    return res
+
+
+def SuffixStepping(file_object: str, file_source: str, child: pexpect.spawn, step: str, timeout: int, trace=None, max_steps=0):
+    return Drive(child, SuffixSteppingProtocol(file_object, file_source, child, step, timeout, trace, max_steps))
+
+
+### the suffix of a recorded trace from the first hit of point on, i.e. what SuffixStepping records
+### after DriveToPoint reached the point in a deterministic program; None when the trace never hits it
+### step of the first hit of point in the trace res, None when it is never hit
+def FirstHit(res, point):
+    order = res['adrOrder'] if isinstance(point, str) else res['locOrder']
+    try:
+        return order.index(point)
+    except ValueError:
+        return None
 
-    return {'order': ord_lst, 'frequency': frq_map, 'variable': var_tbl, 
-            'adrOrder': adr_order_lst, 'adrHittimes': adr_hittimes_tbl, 'adrVarvalue': adr_varvalue_tbl, 
-            'locOrder': loc_order_lst, 'locHittimes': loc_hittimes_tbl, 'locVarvalue': loc_varvalue_tbl, 
-            'posOrder': pos_order_lst, 'posHittimes': pos_hittimes_tbl, 'posVarvalue': pos_varvalue_tbl, 
-            'allOrder': all_order_lst, 'allHittimes': all_hittimes_tbl, 'allVarvalue': all_varvalue_tbl}
 
+def SliceTrace(res, point):
+    start = FirstHit(res, point)
+    if start is None:
+        return None
+    return res.slice(start)
 
-def CompleteRun(file_object: str, file_source: str, debugger: str, step: str, timeout: int):
+
+def SameTrace(resa, resb):
+    if (resa is None) or (resb is None):
+        return False
+    return resa['allOrder'] == resb['allOrder'] and resa['allVarvalue'] == resb['allVarvalue']
+
+
+def GetTracerScript(debugger: str):
+    if debugger == 'gdb':
+        script = 'gdbtracer.py'
+    else:
+        script = 'lldbtracer.py'
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+
+
+### load the JSONL records written by the in-debugger tracer into a trace, as SuffixStepping would have recorded them
+def LoadTrace(filename: str, trace=None):
+    res = Trace() if trace is None else trace
+    event = None
+    with open(filename, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if 'event' in record:
+                event = record
+                break
+
+            quadruple = (record['file'], record['line'], record['offset'], hex(int(record['address'], 16)))
+            if record['vars'] is None or isinstance(record['vars'], dict):
+                varvalue = record['vars']
+            else:
+                varvalue = varparser.ParseFrameVars(record['vars'])
+            res.append(quadruple, varvalue)
+
+    if event is None:
+        raise Exception('PEXPECTEOF')
+    elif event['event'] == 'timeout':
+        raise Exception('TIMEOUTDEB')
+    elif event['event'] == 'steplimit':
+        raise Exception('STEPLIMITDEB')
+    elif event['event'] == 'steptimeout':
+        logging.error('[LoadTrace]step timeout for %s' % filename)
+        raise Exception('TIMEOUTPEX')
+    elif event['event'] == 'error':
+        logging.error('[LoadTrace]%s for %s' % (event['message'], filename))
+        raise Exception('ERRORDEB')
+
+    return res
+
+
+def TracerStepping(file_object: str, file_source: str, child: pexpect.spawn, step: str, timeout: int, trace=None, max_steps=0):
+    logging.debug('\n[TracerStepping via %s for %s]start\n' % (step, file_object))
+    fd, output = tempfile.mkstemp(prefix='devil-trace-', suffix='.jsonl')
+    os.close(fd)
+    try:
+        if 'gdb' in child.command:
+            sendcmd(child, 'source ' + GetTracerScript('gdb'))
+        else:
+            sendcmd(child, 'command script import ' + GetTracerScript('lldb'))
+
+        ### the whole suffix runs as a single command: the tracer bounds every step by the timeout of a command (as
+        ### sendcmd does for the cli backend) and the trace by the budget, so wait a bit longer than that for its prompt
+        sendcmd(child, 'devil-trace %s "%s" "%s" %d %d %s %d' % (step, file_source, output, timeout, max_steps, capture, child.timeout), timeout=timeout + 60)
+        return LoadTrace(output, trace)
+    finally:
+        os.remove(output)
+
+
+def GetBackend(debugger: str, backend: str):
+    assert backend in ['cli', 'tracer', 'mi'], logging.error('Backend of %s not supported' % backend)
+    if backend == 'mi':
+        assert debugger in ['gdb'], logging.error('Backend of %s not supported for %s' % (backend, debugger))
+        return gdbmi.SuffixStepping
+    if backend == 'tracer':
+        assert debugger in ['gdb', 'lldb', 'cjdb'], logging.error('Backend of %s not supported for %s' % (backend, debugger))
+        return TracerStepping
+    return SuffixStepping
+
+
+def CompleteRun(file_object: str, file_source: str, debugger: str, step: str, timeout: int, backend='cli', trace_file=None, max_steps=0):
     logging.debug('\n[CompleteRunViaGDB via %s for %s]start\n' % (step, file_object))
-    with InitDebugger(file=file_object, debugger=debugger) as child:
-        sendcmd(child, 'b main')
-        sendcmd(child, 'run')
+    Stepping = GetBackend(debugger, backend)
+    with Recorder(trace_file) as trace:
+        if backend == 'mi':
+            res = gdbmi.CompleteRun(file_object, file_source, debugger, step, timeout, trace, max_steps)
+        else:
+            with Session(file=file_object, debugger=debugger) as child:
+                sendcmd(child, 'b main')
+                sendcmd(child, 'run')
 
-        SkippingFiles(child)
-        res = SuffixStepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout)
-        return res
+                SkippingFiles(child, file_object, file_source)
+                res = Stepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout, trace=trace, max_steps=max_steps)
+
+    return res if trace_file is None else TraceFile(trace_file, trace.steps)
 
 
-def OneRun(file_object: str, file_source: str, debugger: str, point: str, way: str, step: str, timeout: int):
+def OneRun(file_object: str, file_source: str, debugger: str, point: str, way: str, step: str, timeout: int, backend='cli', trace_file=None, max_steps=0):
     logging.debug('\n[OneRunViaGDB %s %s via %s for %s]start\n' % (way, point, step, file_object))
-    with InitDebugger(file=file_object, debugger=debugger) as child:
-        flag = DriveToPoint(file_source=file_source, child=child, point=point, way=way, timeout=timeout)
-        if flag:
-            res = SuffixStepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout)
-            return res
+    Stepping = GetBackend(debugger, backend)
+    with Recorder(trace_file) as trace:
+        res = None
+        if backend == 'mi':
+            res = gdbmi.OneRun(file_object, file_source, debugger, point, way, step, timeout, trace, max_steps)
+        else:
+            with Session(file=file_object, debugger=debugger) as child:
+                flag = DriveToPoint(file_object=file_object, file_source=file_source, debugger=debugger, child=child, point=point, way=way, timeout=timeout)
+                if flag:
+                    res = Stepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout, trace=trace, max_steps=max_steps)
+
+    if res is None or trace_file is None:
+        return res
+    return TraceFile(trace_file, trace.steps)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Buffered sink of the discrepancies found by comparator.Comparator for one source file. Findings are kept in memory
+### and committed together when the comparison of the file completes: as rows of the `diffs` table (and the groups of
+### optimization levels agreeing on a variable as rows of the `agreements` table) of an SQLite database, in one
+### transaction (WAL mode so that pool workers can commit concurrently), and as the lines of the diff text files, one
+### locked write per file so that the lines of parallel workers do not interleave. A comparison that raises commits
+### nothing, so no file is left with part of its findings.
+
+import os
+import json
+import fcntl
+import sqlite3
+import logging
+
+
+COLUMNS = ['file', 'compiler', 'debugger', 'method', 'category', 'point_type', 'optl', 'stepl', 'opti', 'stepi',
+           'point', 'variable', 'valuel', 'valuei', 'text']
+
+### opts: the optimization levels compared; groups: value -> optimization levels that have it
+AGREEMENT_COLUMNS = ['file', 'compiler', 'debugger', 'method', 'point_type', 'step', 'opts', 'point', 'variable',
+                     'groups', 'text']
+
+
+### a value of a column: program points and orders as JSON, the rest as it is
+def encode(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value)
+
+
+class DiffSink:
+    def __init__(self, filename: str, text_dir: str):
+        self.filename = filename
+        self.text_dir = text_dir
+        self.rows = []
+        self.agreements = []
+        self.lines = {}     ### (method, name) -> lines of the text file
+
+        self.conn = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS diffs (id INTEGER PRIMARY KEY AUTOINCREMENT, %s)' % ', '.join(COLUMNS))
+        self.conn.execute('CREATE INDEX IF NOT EXISTS diffs_file ON diffs (file, method, category)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS agreements (id INTEGER PRIMARY KEY AUTOINCREMENT, %s)' % ', '.join(AGREEMENT_COLUMNS))
+        self.conn.execute('CREATE INDEX IF NOT EXISTS agreements_file ON agreements (file, method)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+    ### way: (compiler, opt, debugger, step, left, point) of the stepl (or first) and stepi (or second) trace
+    def add(self, name: str, method: str, line: str, file: str, category: str, point_type: str, wayl: tuple, wayi: tuple,
+            point, variable=None, valuel=None, valuei=None, text=None):
+        self.rows.append((file, wayl[0], wayl[2], method, category, point_type, wayl[1], wayl[3], wayi[1], wayi[3],
+                          encode(point), variable, encode(valuel), encode(valuei), text))
+        self.lines.setdefault((method, name), []).append(line)
+
+    ### ways: the traces compared, of the same compiler, debugger and step
+    def agree(self, name: str, method: str, line: str, file: str, point_type: str, ways: list, point, variable: str,
+              groups: dict, text=None):
+        self.agreements.append((file, ways[0][0], ways[0][2], method, point_type, ways[0][3], encode([way[1] for way in ways]),
+                                encode(point), variable, encode(groups), text))
+        self.lines.setdefault((method, name), []).append(line)
+
+    def commit(self):
+        try:
+            with self.conn:
+                self.conn.execute('BEGIN')
+                self.conn.executemany('INSERT INTO diffs (%s) VALUES (%s)' % (', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))), self.rows)
+                self.conn.executemany('INSERT INTO agreements (%s) VALUES (%s)' % (', '.join(AGREEMENT_COLUMNS), ', '.join('?' * len(AGREEMENT_COLUMNS))),
+                                      self.agreements)
+        except sqlite3.Error as e:
+            logging.error('[DiffSink]Exception %s for %s' % (e, self.filename))
+            raise
+
+        for (method, name), lines in self.lines.items():
+            rpath = os.path.join(self.text_dir, method)
+            os.makedirs(rpath, exist_ok=True)
+            with open(os.path.join(rpath, "diff-" + name + '.txt'), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(''.join(lines))
+                f.flush()
+                fcntl.flock(f, fcntl.LOCK_UN)
+        self.rows, self.agreements, self.lines = [], [], {}
+
+    ### findings not committed yet are dropped
+    def close(self):
+        self.rows, self.agreements, self.lines = [], [], {}
+        self.conn.close()
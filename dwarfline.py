@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Pure-Python decoder of the DWARF (version 2-5) line table in .debug_line of an ELF object,
+### see chapter 6.2 of the DWARF 5 standard https://dwarfstd.org/doc/DWARF5.pdf
+
+import os
+import mmap
+import zlib
+import struct
+import pickle
+import hashlib
+import logging
+import collections
+
+
+SHF_COMPRESSED = 0x800
+ET_DYN = 3
+PT_LOAD = 1
+
+### usual load address of a position independent executable run by gdb (address randomization is disabled by default),
+### unless it is read from the debugger (see devil.ProbeLoadBias)
+PIE_LOAD_BIAS = {62: 0x555555554000,  # EM_X86_64
+                 183: 0x5555550000,   # EM_AARCH64
+                 3: 0x56555000}       # EM_386
+
+DW_FORM_block, DW_FORM_block1, DW_FORM_block2, DW_FORM_block4 = 0x09, 0x0a, 0x03, 0x04
+DW_FORM_data1, DW_FORM_data2, DW_FORM_data4, DW_FORM_data8, DW_FORM_data16 = 0x0b, 0x05, 0x06, 0x07, 0x1e
+DW_FORM_string, DW_FORM_strp, DW_FORM_line_strp, DW_FORM_udata = 0x08, 0x0e, 0x1f, 0x0f
+DW_FORM_strx, DW_FORM_strx1, DW_FORM_strx2, DW_FORM_strx3, DW_FORM_strx4 = 0x1a, 0x25, 0x26, 0x27, 0x28
+DW_LNCT_path, DW_LNCT_directory_index = 0x1, 0x2
+
+DW_LNS_copy, DW_LNS_advance_pc, DW_LNS_advance_line, DW_LNS_set_file, DW_LNS_set_column = 1, 2, 3, 4, 5
+DW_LNS_negate_stmt, DW_LNS_const_add_pc, DW_LNS_fixed_advance_pc = 6, 8, 9
+DW_LNE_end_sequence, DW_LNE_set_address, DW_LNE_define_file = 1, 2, 3
+
+
+class Reader:
+    def __init__(self, data, endian: str, offset=0):
+        self.data = data
+        self.endian = endian
+        self.offset = offset
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(self.endian + fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values[0]
+
+    def uleb(self):
+        result, shift = 0, 0
+        while True:
+            byte = self.data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return result
+
+    def sleb(self):
+        result, shift = 0, 0
+        while True:
+            byte = self.data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                if byte & 0x40:
+                    result -= 1 << shift
+                return result
+
+    def cstring(self):
+        end = self.data.find(b'\0', self.offset)
+        s = bytes(self.data[self.offset:end]).decode('utf-8', 'replace')
+        self.offset = end + 1
+        return s
+
+    def address(self, size: int):
+        return self.unpack({1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[size])
+
+
+def GetSections(data):
+    ### ELF header, see https://refspecs.linuxfoundation.org/elf/gabi4+/ch4.eheader.html
+    if bytes(data[:4]) != b'\x7fELF':
+        raise Exception('Not an ELF file')
+
+    is64 = data[4] == 2
+    endian = '<' if data[5] == 1 else '>'
+    reader = Reader(data, endian, 16)
+    e_type, e_machine = reader.unpack('H'), reader.unpack('H')
+
+    if is64:
+        e_shoff = struct.unpack_from(endian + 'Q', data, 0x28)[0]
+        e_shentsize, e_shnum, e_shstrndx = struct.unpack_from(endian + 'HHH', data, 0x3a)
+        shdr = 'IIQQQQIIQQ'
+    else:
+        e_shoff = struct.unpack_from(endian + 'I', data, 0x20)[0]
+        e_shentsize, e_shnum, e_shstrndx = struct.unpack_from(endian + 'HHH', data, 0x2e)
+        shdr = 'IIIIIIIIII'
+
+    headers = [struct.unpack_from(endian + shdr, data, e_shoff + i * e_shentsize) for i in range(e_shnum)]
+    strtab_offset = headers[e_shstrndx][4]
+
+    sections = {}
+    for sh_name, _, sh_flags, _, sh_offset, sh_size, _, _, _, _ in headers:
+        name = Reader(data, endian, strtab_offset + sh_name).cstring()
+        content = data[sh_offset:sh_offset + sh_size]
+        if sh_flags & SHF_COMPRESSED:
+            ### Elf_Chdr followed by a zlib stream
+            chdr_size = 24 if is64 else 12
+            content = zlib.decompress(bytes(content[chdr_size:]))
+        sections[name] = content
+
+    return sections, endian, is64, e_type, e_machine
+
+
+def ReadForm(reader: Reader, form: int, offset_size: int, sections):
+    if form == DW_FORM_string:
+        return reader.cstring()
+    elif form in [DW_FORM_line_strp, DW_FORM_strp]:
+        offset = reader.unpack('I' if offset_size == 4 else 'Q')
+        section = sections.get('.debug_line_str' if form == DW_FORM_line_strp else '.debug_str', b'')
+        return Reader(section, reader.endian, offset).cstring()
+    elif form == DW_FORM_udata:
+        return reader.uleb()
+    elif form in [DW_FORM_data1, DW_FORM_strx1]:
+        return reader.unpack('B')
+    elif form in [DW_FORM_data2, DW_FORM_strx2]:
+        return reader.unpack('H')
+    elif form == DW_FORM_strx3:
+        reader.offset += 3
+        return None
+    elif form in [DW_FORM_data4, DW_FORM_strx4]:
+        return reader.unpack('I')
+    elif form == DW_FORM_data8:
+        return reader.unpack('Q')
+    elif form == DW_FORM_data16:
+        reader.offset += 16
+        return None
+    elif form == DW_FORM_strx:
+        return reader.uleb()
+    elif form in [DW_FORM_block, DW_FORM_block1, DW_FORM_block2, DW_FORM_block4]:
+        length = {DW_FORM_block: None, DW_FORM_block1: 'B', DW_FORM_block2: 'H', DW_FORM_block4: 'I'}[form]
+        reader.offset += reader.uleb() if length is None else reader.unpack(length)
+        return None
+    raise Exception('Unsupported DWARF form 0x%x' % form)
+
+
+def ReadEntryTable(reader: Reader, offset_size: int, sections):
+    formats = [(reader.uleb(), reader.uleb()) for _ in range(reader.unpack('B'))]
+    entries = []
+    for _ in range(reader.uleb()):
+        entry = {}
+        for content, form in formats:
+            entry[content] = ReadForm(reader, form, offset_size, sections)
+        entries.append(entry)
+    return entries
+
+
+### decode one line number program; yields (filename, line, column, address, is_stmt, end_sequence)
+def DecodeProgram(reader: Reader, sections):
+    unit_length = reader.unpack('I')
+    offset_size = 4
+    if unit_length == 0xffffffff:
+        unit_length = reader.unpack('Q')
+        offset_size = 8
+    end = reader.offset + unit_length
+
+    version = reader.unpack('H')
+    if version >= 5:
+        reader.unpack('B')  # address_size
+        reader.unpack('B')  # segment_selector_size
+    header_length = reader.unpack('I' if offset_size == 4 else 'Q')
+    program = reader.offset + header_length
+
+    min_inst_length = reader.unpack('B')
+    if version >= 4:
+        reader.unpack('B')  # maximum_operations_per_instruction, only meaningful for VLIW
+    default_is_stmt = reader.unpack('B') != 0
+    line_base = reader.unpack('b')
+    line_range = reader.unpack('B')
+    opcode_base = reader.unpack('B')
+    opcode_lengths = [0] + [reader.unpack('B') for _ in range(opcode_base - 1)]
+
+    if version >= 5:
+        ReadEntryTable(reader, offset_size, sections)  # directories
+        files = [(entry.get(DW_LNCT_path), entry.get(DW_LNCT_directory_index, 0)) for entry in ReadEntryTable(reader, offset_size, sections)]
+    else:
+        ### files are numbered from 1 before DWARF 5
+        while reader.data[reader.offset] != 0:
+            reader.cstring()  # include directory
+        reader.offset += 1
+        files = [(None, 0)]
+        while reader.data[reader.offset] != 0:
+            name = reader.cstring()
+            files.append((name, reader.uleb()))
+            reader.uleb()  # modification time
+            reader.uleb()  # file length
+        reader.offset += 1
+
+    def filename(index):
+        if index < len(files) and files[index][0] is not None:
+            return files[index][0]
+        return None
+
+    reader.offset = program
+    address, file, line, column, is_stmt = 0, 1, 1, 0, default_is_stmt
+    while reader.offset < end:
+        opcode = reader.unpack('B')
+        if opcode >= opcode_base:
+            adjusted = opcode - opcode_base
+            address += (adjusted // line_range) * min_inst_length
+            line += line_base + (adjusted % line_range)
+            yield filename(file), line, column, address, is_stmt, False
+        elif opcode == DW_LNS_copy:
+            yield filename(file), line, column, address, is_stmt, False
+        elif opcode == DW_LNS_advance_pc:
+            address += reader.uleb() * min_inst_length
+        elif opcode == DW_LNS_advance_line:
+            line += reader.sleb()
+        elif opcode == DW_LNS_set_file:
+            file = reader.uleb()
+        elif opcode == DW_LNS_set_column:
+            column = reader.uleb()
+        elif opcode == DW_LNS_negate_stmt:
+            is_stmt = not is_stmt
+        elif opcode == DW_LNS_const_add_pc:
+            address += ((255 - opcode_base) // line_range) * min_inst_length
+        elif opcode == DW_LNS_fixed_advance_pc:
+            address += reader.unpack('H')
+        elif opcode == 0:
+            length = reader.uleb()
+            sub_end = reader.offset + length
+            sub_opcode = reader.unpack('B')
+            if sub_opcode == DW_LNE_end_sequence:
+                yield filename(file), line, column, address, is_stmt, True
+                address, file, line, column, is_stmt = 0, 1, 1, 0, default_is_stmt
+            elif sub_opcode == DW_LNE_set_address:
+                address = reader.address(length - 1)
+            elif sub_opcode == DW_LNE_define_file:
+                name = reader.cstring()
+                files.append((name, reader.uleb()))
+            reader.offset = sub_end
+        else:
+            ### DW_LNS_set_basic_block, DW_LNS_set_prologue_end, ... or unknown opcodes: skip the operands
+            for _ in range(opcode_lengths[opcode]):
+                reader.uleb()
+
+    reader.offset = end
+
+
+### link-time address of file offset 0, i.e. of the first loadable segment (the start of its page)
+def GetLinkBase(file_object: str) -> int:
+    with open(file_object, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if bytes(data[:4]) != b'\x7fELF':
+                raise Exception('Not an ELF file')
+
+            is64 = data[4] == 2
+            endian = '<' if data[5] == 1 else '>'
+            if is64:
+                e_phoff = struct.unpack_from(endian + 'Q', data, 0x20)[0]
+                e_phentsize, e_phnum = struct.unpack_from(endian + 'HH', data, 0x36)
+            else:
+                e_phoff = struct.unpack_from(endian + 'I', data, 0x1c)[0]
+                e_phentsize, e_phnum = struct.unpack_from(endian + 'HH', data, 0x2a)
+
+            bases = []
+            for i in range(e_phnum):
+                if is64:
+                    p_type, _, p_offset, p_vaddr = struct.unpack_from(endian + 'IIQQ', data, e_phoff + i * e_phentsize)
+                else:
+                    p_type, p_offset, p_vaddr = struct.unpack_from(endian + 'III', data, e_phoff + i * e_phentsize)
+                if p_type == PT_LOAD:
+                    bases.append(p_vaddr - p_offset)
+    return min(bases) if bases else 0
+
+
+def DecodeLineTable(data):
+    sections, endian, _, e_type, e_machine = GetSections(data)
+    rows = []
+    debug_line = sections.get('.debug_line')
+    if debug_line is not None:
+        reader = Reader(debug_line, endian)
+        while reader.offset < len(debug_line):
+            rows.extend(DecodeProgram(reader, sections))
+    return rows, e_type, e_machine
+
+
+CACHED = 16    ### line tables kept in memory (by digest of the object), besides the ones in cache_dir
+cached = collections.OrderedDict()
+
+
+def remember(digest: str, table: tuple) -> tuple:
+    cached[digest] = table
+    while len(cached) > CACHED:
+        cached.popitem(last=False)
+    return table
+
+
+### all rows of all line number programs in file_object, with the executable's type and machine
+def GetLineTable(file_object: str, cache_dir=None):
+    with open(file_object, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in cached:
+                cached.move_to_end(digest)
+                return cached[digest]
+
+            cache_file = os.path.join(cache_dir, digest + '.pkl') if cache_dir else None
+            if cache_file and os.path.exists(cache_file):
+                try:
+                    with open(cache_file, 'rb') as fc:
+                        return remember(digest, pickle.load(fc))
+                except Exception as e:
+                    logging.error('[GetLineTable]failed to read %s: %s' % (cache_file, e))
+
+            table = remember(digest, DecodeLineTable(data))
+
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = cache_file + '.%d.tmp' % os.getpid()
+        with open(tmp_file, 'wb') as fc:
+            pickle.dump(table, fc)
+        os.replace(tmp_file, cache_file)
+
+    return table
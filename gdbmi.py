@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### GDB/MI transport: drive `gdb --interpreter=mi3` and read locations, stop reasons and variables
+### from MI records instead of scraping the console output (see https://sourceware.org/gdb/current/onlinedocs/gdb.html/GDB_002fMI.html)
+
+import re
+import os
+import time
+import random
+import signal
+import logging
+import pexpect
+
+import devil
+import varparser
+
+
+MI_PROMPT = '(gdb) '
+MI_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v', 'e': '\x1b'}
+
+re_record = re.compile(r'([0-9]*)([\^\*\+=~@&])([^,]*)')
+re_variable = re.compile(r'[a-zA-Z0-9_\-]+')
+
+
+def ParseString(line: str, idx: int):
+    ### c-string starting at line[idx] == '"'
+    chars = []
+    idx += 1
+    while line[idx] != '"':
+        c = line[idx]
+        if c == '\\':
+            idx += 1
+            c = line[idx]
+            if c in '01234567':
+                end = idx
+                while end < idx + 3 and line[end] in '01234567':
+                    end += 1
+                chars.append(chr(int(line[idx:end], 8)))
+                idx = end
+                continue
+            chars.append(MI_ESCAPES.get(c, c))
+        else:
+            chars.append(c)
+        idx += 1
+    return ''.join(chars), idx + 1
+
+
+def ParseValue(line: str, idx: int):
+    c = line[idx]
+    if c == '"':
+        return ParseString(line, idx)
+    elif c == '{':
+        return ParseResults(line, idx + 1, '}')
+    elif c == '[':
+        idx += 1
+        values = []
+        if line[idx] == ']':
+            return values, idx + 1
+        while True:
+            if line[idx] in '"{[':
+                value, idx = ParseValue(line, idx)
+            else:
+                ### list of results, e.g. [frame={...},frame={...}]
+                rem = re_variable.match(line, idx)
+                value, idx = ParseValue(line, rem.end() + 1)
+            values.append(value)
+            if line[idx] == ']':
+                return values, idx + 1
+            idx += 1  # ','
+    raise Exception('MIPARSE')
+
+
+def ParseResults(line: str, idx: int, end: str):
+    results = {}
+    if idx < len(line) and line[idx] == end:
+        return results, idx + 1
+    while idx < len(line):
+        rem = re_variable.match(line, idx)
+        value, idx = ParseValue(line, rem.end() + 1)
+        results[rem.group()] = value
+        if idx >= len(line) or line[idx] == end:
+            return results, idx + 1
+        idx += 1  # ','
+    return results, idx
+
+
+### parse one MI output line to (token, kind, class, results); kind is one of ^*+=~@&
+def ParseRecord(line: str):
+    rem = re_record.match(line)
+    if not rem:
+        return None
+
+    token, kind, klass = rem.groups()
+    if kind in '~@&':
+        value, _ = ParseString(line, rem.start(3))
+        return token, kind, None, value
+
+    results = {}
+    if rem.end() < len(line) and line[rem.end()] == ',':
+        results, _ = ParseResults(line, rem.end() + 1, '')
+    return token, kind, klass, results
+
+
+def readRecord(child, cmd: str, timeout=-1):
+    index = child.expect_exact(['\n', pexpect.EOF, pexpect.TIMEOUT], timeout=timeout)
+    if index == 0:
+        line = child.before.strip()
+        if line == MI_PROMPT.strip():
+            return None
+        try:
+            return ParseRecord(line)
+        except Exception:
+            ### output of the inferior itself, which is not part of the MI stream
+            logging.debug('[ParseRecord]%s for command: %s' % (line, cmd))
+            return None
+    elif index == 1:
+        logging.error('[pexpect.EOF]%s for command: %s' % (child.name, cmd))
+        if child.signalstatus == signal.SIGSEGV:
+            raise Exception('DEBSIGSEGV')
+        else:
+            raise Exception('PEXPECTEOF' + str(child.signalstatus))
+    elif index == 2:
+        logging.error('[pexpect.TIMEOUT]%s for command: %s' % (child.name, cmd))
+        raise Exception('TIMEOUTPEX')
+
+
+### send an MI command and return (result class, results, *stopped results or None);
+### for execution commands, wait for the *stopped record as well
+def micmd(child, cmd: str, timeout=-1):
+    child.token += 1
+    token = str(child.token)
+    child.sendline(token + cmd)
+
+    klass, results, stopped = None, None, None
+    while True:
+        record = readRecord(child, cmd, timeout)
+        if record is None:
+            continue
+
+        rtoken, kind, rklass, rresults = record
+        if kind == '^' and rtoken == token:
+            klass, results = rklass, rresults
+        elif kind == '*' and rklass == 'stopped':
+            stopped = rresults
+
+        if klass is None:
+            continue
+        if klass == 'running' and stopped is None:
+            continue
+        break
+
+    logging.debug('file: %s\ncommand: %s\nclass: %s\nresults: %s\nstopped:%s\n' % (child.name, cmd, klass, results, stopped))
+    return klass, results, stopped
+
+
+def InitDebugger(file: str, debugger: str):
+    assert debugger in ['gdb'], logging.error('Debugger of %s not supported' % debugger)
+    cmd = devil.GetDebugger(debugger) + ' --interpreter=mi3 -q'
+
+    child = pexpect.spawn(cmd, maxread=200000, logfile=open('mylog_'+debugger+'mi.txt', 'w'), encoding='utf-8', echo=False)
+    index = child.expect_exact([MI_PROMPT, pexpect.EOF, pexpect.TIMEOUT])
+
+    child.delaybeforesend = None  ### this line can fix performance issues
+    child.token = 0
+
+    if index == 1:
+        if child.signalstatus == signal.SIGSEGV:
+            raise Exception('DEBSIGSEGV')
+        else:
+            raise Exception('PEXPECTEOF' + str(child.signalstatus))
+    elif index == 2:
+        raise Exception('LAUNCHTIMEOUTPEX')
+
+    micmd(child, '-gdb-set confirm off')
+    micmd(child, '-gdb-set width 0')
+    micmd(child, '-gdb-set height 0')
+    micmd(child, '-gdb-set pagination off')
+    ### keep the output of the inferior out of the MI stream
+    micmd(child, '-inferior-tty-set /dev/null')
+
+    micmd(child, '-file-exec-and-symbols ' + file)
+    return child
+
+
+def InferiorExit(stopped):
+    if stopped is None:
+        return True
+    return stopped.get('reason', '').startswith('exited')
+
+
+def GetFrameInfo(stopped, file_source):
+    filename, lineno, offset, address, quadruple = None, None, None, None, None
+
+    frame = stopped.get('frame', {})
+    if 'addr' in frame:
+        address = hex(int(frame['addr'], 16))
+    if 'file' in frame and 'line' in frame:
+        filename = os.path.basename(frame['file'])
+        lineno = frame['line']
+        quadruple = (filename, lineno, offset, address)
+
+    if filename != os.path.basename(file_source): # ensure current stack frame is in user-defined source file
+        filename = None
+
+    return filename, lineno, offset, address, quadruple
+
+
+def GetFrameVars(child):
+    klass, results, _ = micmd(child, '-stack-list-variables --all-values')
+    variables = {}
+    if klass == 'done':
+        for variable in results['variables']:
+            ### aggregates come as the one-line values of the console
+            variables.update(varparser.ParseValue(variable['name'], variable.get('value', '')))
+    return variables
+
+
+### returns the *stopped results of the step, or None when the inferior is not running any more
+def stepping(child, step):
+    if step == 'stepl':
+        cmd = '-exec-step'
+    elif step == 'stepi':
+        cmd = '-exec-step-instruction'
+    elif step == 'random':
+        if bool(random.getrandbits(1)):
+            cmd = '-exec-step'
+        else:
+            cmd = '-exec-step-instruction'
+    klass, results, stopped = micmd(child, cmd)
+    if klass == 'error':
+        logging.debug('[stepping]%s for %s' % (results.get('msg'), child.name))
+    return stopped
+
+
+def finish(child, step):
+    klass, results, stopped = micmd(child, '-exec-finish')
+    if klass == 'error':
+        ### "finish" not meaningful in the outermost frame
+        return stepping(child, step)
+    return stopped
+
+
+def run(child, location: str):
+    micmd(child, '-break-insert ' + location)
+    _, _, stopped = micmd(child, '-exec-run')
+    return stopped
+
+
+### devil.SkippingFiles: sources grouped by object since gdb 12, a flat list of them before
+def SkippingFiles(child, file_object: str, file_source: str):
+    klass, results, _ = micmd(child, '-file-list-exec-source-files --group-by-objfile')
+    if klass == 'done':
+        groups = [(group.get('filename'), [source.get('fullname', source.get('file')) for source in group.get('sources', [])])
+                  for group in results.get('files', [])]
+    else:
+        _, results, _ = micmd(child, '-file-list-exec-source-files')
+        groups = [(None, [source.get('fullname', source.get('file')) for source in results.get('files', [])])]
+
+    for cmd in devil.GetSkipCommands(groups, file_object, file_source):
+        micmd(child, cmd)
+
+
+def SuffixStepping(file_object: str, file_source: str, child: pexpect.spawn, step: str, timeout: int, stopped: dict, trace=None, max_steps=0):
+    logging.debug('\n[SuffixStep(MI) via %s for %s]start\n' % (step, file_object))
+    res = devil.Trace() if trace is None else trace
+
+    file_prev = None
+    steps = 0
+
+    time_start = time.time()
+    while True:
+        if (time.time() - time_start) >= timeout:
+            raise Exception('TIMEOUTDEB')
+
+        if max_steps and steps >= max_steps:
+            raise Exception('STEPLIMITDEB')
+
+        if InferiorExit(stopped):
+            break
+
+        file, line, offset, address, _ = GetFrameInfo(stopped, file_source)
+
+        if (file_prev is None) and file:
+            file_prev = file
+
+        if (file is None) and (file_prev is None or step == 'stepi'):
+            ### When previous and current stacks are both in library functions, finish to the parent stack
+            ### (stepi at once, the skips of devil.SkippingFiles do not apply to it)
+            stopped = finish(child, step)
+            continue
+
+        if file is None:
+            ### when reach to library functions, step to next statement or instruction
+            stopped = stepping(child, step)
+            file_prev = file
+            continue
+
+        quadruple = (file, line, offset, address)
+        varvalue = GetFrameVars(child) if devil.Captures(res, quadruple) else None
+        res.append(quadruple, varvalue)
+        steps += 1
+
+        file_prev = file
+        stopped = stepping(child, step)
+
+    return res
+
+
+def DriveToPoint(file_object: str, file_source: str, child, point, way: str, timeout: int):
+    if way == 'break':
+        if isinstance(point, str):
+            stopped = run(child, '*' + point)
+        else:
+            stopped = run(child, point[0] + ':' + point[1])
+
+        if InferiorExit(stopped):
+            return False, stopped
+        SkippingFiles(child, file_object, file_source)
+
+        file, line, _, address, _ = GetFrameInfo(stopped, file_source)
+        if isinstance(point, str):
+            return address == point, stopped
+        return (file == point[0]) and (line == point[1]), stopped
+
+    stopped = run(child, 'main')
+    SkippingFiles(child, file_object, file_source)
+
+    time_start = time.time()
+    file_prev = None
+
+    while True:
+        if (time.time() - time_start) >= timeout:
+            raise Exception('TIMEOUTDEB')
+
+        if InferiorExit(stopped):
+            break
+
+        file, line, _, address, _ = GetFrameInfo(stopped, file_source)
+
+        if isinstance(point, str):
+            if address == point:
+                return True, stopped
+        else:
+            if (file == point[0]) and (line == point[1]):
+                return True, stopped
+
+        if file_prev is None and file:
+            file_prev = file
+
+        if (file is None) and (file_prev is None):
+            stopped = finish(child, way)
+            continue
+
+        file_prev = file
+        stopped = stepping(child, way)
+
+    return False, stopped
+
+
+def CompleteRun(file_object: str, file_source: str, debugger: str, step: str, timeout: int, trace=None, max_steps=0):
+    logging.debug('\n[CompleteRunViaMI via %s for %s]start\n' % (step, file_object))
+    with InitDebugger(file=file_object, debugger=debugger) as child:
+        stopped = run(child, 'main')
+        SkippingFiles(child, file_object, file_source)
+        return SuffixStepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout, stopped=stopped, trace=trace, max_steps=max_steps)
+
+
+def OneRun(file_object: str, file_source: str, debugger: str, point, way: str, step: str, timeout: int, trace=None, max_steps=0):
+    logging.debug('\n[OneRunViaMI %s %s via %s for %s]start\n' % (way, point, step, file_object))
+    with InitDebugger(file=file_object, debugger=debugger) as child:
+        flag, stopped = DriveToPoint(file_object=file_object, file_source=file_source, child=child, point=point, way=way, timeout=timeout)
+        if flag:
+            return SuffixStepping(file_object=file_object, file_source=file_source, child=child, step=step, timeout=timeout, stopped=stopped, trace=trace, max_steps=max_steps)
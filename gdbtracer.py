@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+### This script is loaded into gdb via `source gdbtracer.py` and runs the step/record loop of
+### devil.SuffixStepping inside the debugger, writing one JSON record per step (see devil.LoadTrace).
+### usage: (gdb) devil-trace <stepl|stepi|random> <source file> <output file> <timeout> [max steps, 0 for no limit]
+###        [capture policy] [step timeout]
+
+import os
+import json
+import time
+import signal
+import random
+import threading
+
+import gdb
+
+
+def GetFrameInfo(file_source):
+    try:
+        frame = gdb.selected_frame()
+    except gdb.error:
+        return None, None, None, None
+
+    address = hex(frame.pc())
+    sal = frame.find_sal()
+    if sal.symtab is None:
+        return None, None, None, address
+
+    filename = os.path.basename(sal.symtab.filename)
+    if filename != os.path.basename(file_source): # ensure current stack frame is in user-defined source file
+        filename = None
+
+    return filename, str(sal.line), None, address
+
+
+def GetFrameVars():
+    items_l = gdb.execute('info locals', to_string=True)
+    items_a = gdb.execute('info args', to_string=True)
+    return items_l + '\n' + items_a
+
+
+def InferiorExit():
+    return gdb.selected_inferior().pid == 0
+
+
+def stepping(step):
+    if step == 'stepl':
+        cmd = 'step'
+    elif step == 'stepi':
+        cmd = 'stepi'
+    elif step == 'random':
+        if bool(random.getrandbits(1)):
+            cmd = 'step'
+        else:
+            cmd = 'stepi'
+    gdb.execute(cmd, to_string=True)
+
+
+def finish(step):
+    try:
+        gdb.execute('finish', to_string=True)
+    except gdb.error:
+        ### "finish" not meaningful in the outermost frame
+        stepping(step)
+
+
+### per-step bound of the trace, like the timeout of every command of the cli backend: a step (or finish, or variables
+### dump) still running at its deadline gets a SIGINT, as on Ctrl-C, which interrupts the inferior or the command
+class Watchdog(threading.Thread):
+    def __init__(self, step_timeout: int):
+        super(Watchdog, self).__init__(daemon=True)
+        self.step_timeout = step_timeout
+        self.deadline = None
+        self.expired = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def __enter__(self):
+        with self.lock:
+            self.deadline = time.time() + self.step_timeout
+        return self
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.deadline = None
+
+    def run(self):
+        while not self.done.wait(0.1):
+            with self.lock:
+                if self.deadline is not None and time.time() >= self.deadline:
+                    ### interrupt again every second until the trace gives up, e.g. after the fallback step of finish
+                    self.expired = True
+                    self.deadline = time.time() + 1
+                    os.kill(os.getpid(), signal.SIGINT)
+
+
+class DevilTrace(gdb.Command):
+    def __init__(self):
+        super(DevilTrace, self).__init__('devil-trace', gdb.COMMAND_USER)
+
+    def invoke(self, arg, from_tty):
+        argv = gdb.string_to_argv(arg)
+        step, file_source, output, timeout = argv[:4]
+        timeout = int(timeout)
+        max_steps = int(argv[4]) if len(argv) > 4 else 0
+        capture = argv[5] if len(argv) > 5 else 'all'
+        watchdog = Watchdog(int(argv[6]) if len(argv) > 6 else 30)
+        watchdog.start()
+
+        try:
+            self.trace(step, file_source, output, timeout, max_steps, capture, watchdog)
+        finally:
+            watchdog.done.set()
+
+    def trace(self, step, file_source, output, timeout, max_steps, capture, watchdog):
+        with open(output, 'w') as f:
+            file_prev = None
+            steps = 0
+            seen = set()
+
+            time_start = time.time()
+            while True:
+                if (time.time() - time_start) >= timeout:
+                    f.write(json.dumps({'event': 'timeout'}) + '\n')
+                    return
+
+                if max_steps and steps >= max_steps:
+                    f.write(json.dumps({'event': 'steplimit'}) + '\n')
+                    return
+
+                ### an interrupted step may return as a stop by SIGINT instead of an error
+                if watchdog.expired:
+                    f.write(json.dumps({'event': 'steptimeout'}) + '\n')
+                    return
+
+                try:
+                    with watchdog:
+                        if InferiorExit():
+                            break
+
+                        file, line, offset, address = GetFrameInfo(file_source)
+
+                        if (file_prev is None) and file:
+                            file_prev = file
+
+                        if (file is None) and (file_prev is None or step == 'stepi'):
+                            ### When previous and current stacks are both in library functions, finish to the parent stack
+                            ### (stepi at once, the skips of devil.SkippingFiles do not apply to it)
+                            finish(step)
+                            continue
+
+                        if file is None:
+                            ### when reach to library functions, step to next statement or instruction
+                            stepping(step)
+                            file_prev = file
+                            continue
+
+                        ### variables of the first hit only, see devil.Captures
+                        varvalue = None
+                        if capture == 'all' or (file, line, offset, address) not in seen:
+                            seen.add((file, line, offset, address))
+                            varvalue = GetFrameVars()
+                        f.write(json.dumps({'file': file, 'line': line, 'offset': offset, 'address': address, 'vars': varvalue}) + '\n')
+                        steps += 1
+
+                        file_prev = file
+                        stepping(step)
+                except (gdb.error, KeyboardInterrupt) as e:
+                    if watchdog.expired:
+                        f.write(json.dumps({'event': 'steptimeout'}) + '\n')
+                        return
+                    if InferiorExit():
+                        break
+                    f.write(json.dumps({'event': 'error', 'message': str(e)}) + '\n')
+                    return
+
+            f.write(json.dumps({'event': 'exit'}) + '\n')
+
+
+DevilTrace()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Crash-safe journal of a run: an append-only table (SQLite in WAL mode) of the state transitions of every unit,
+### queued -> running -> done | failed (with its flag), with timings. The latest event of a unit is its state, so a
+### restarted run skips the units and files that are done or failed, and retries the interrupted ones as well as the
+### traces that ran out of an adaptive budget (recorded with the failure) and whose retry with the full budget was cut off.
+
+import time
+import json
+import sqlite3
+
+from scheduler import Unit
+
+
+class Journal:
+    def __init__(self, filename: str, compiler: str, debugger: str):
+        self.compiler = compiler
+        self.debugger = debugger
+
+        ### autocommit: every event is its own transaction
+        self.conn = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, file TEXT, compiler TEXT, debugger TEXT, '
+                          'kind TEXT, opt TEXT, step TEXT, state TEXT, flag TEXT, time REAL, duration REAL, budget TEXT)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS events_run ON events (compiler, debugger)')
+
+    def close(self):
+        self.conn.close()
+
+    def append(self, unit: Unit, state: str, flag=None, duration=None, budget=None):
+        self.conn.execute('INSERT INTO events (file, compiler, debugger, kind, opt, step, state, flag, time, duration, budget) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                          (unit.filename, self.compiler, self.debugger, unit.kind, unit.opt or '', unit.step or '', state, flag, time.time(), duration,
+                           json.dumps(budget) if budget is not None else None))
+
+    def queue(self, units: list):
+        now = time.time()
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT INTO events (file, compiler, debugger, kind, opt, step, state, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  [(unit.filename, self.compiler, self.debugger, unit.kind, unit.opt or '', unit.step or '', 'queued', now) for unit in units])
+
+    def start(self, unit: Unit):
+        self.append(unit, 'running')
+
+    def done(self, unit: Unit, duration: float):
+        self.append(unit, 'done', duration=duration)
+
+    ### budget: (timeout, max steps, capped) when the unit ran out of an adaptive budget, i.e. is to be retried
+    def fail(self, unit: Unit, flag: str, duration: float, budget=None):
+        self.append(unit, 'failed', flag, duration, budget)
+
+    ### latest (state, flag, budget) of every unit of this compiler and debugger
+    def states(self) -> dict:
+        rows = self.conn.execute('SELECT e.file, e.kind, e.opt, e.step, e.state, e.flag, e.budget FROM events e JOIN '
+                                 '(SELECT MAX(id) AS id FROM events WHERE compiler = ? AND debugger = ? GROUP BY file, kind, opt, step) l ON e.id = l.id',
+                                 (self.compiler, self.debugger))
+        return {Unit(kind, file, opt or None, step or None): (state, flag, json.loads(budget) if budget else None)
+                for file, kind, opt, step, state, flag, budget in rows}
+
+    ### files that were compared (or handled as a whole) or failed, but for a budget that was too tight
+    @staticmethod
+    def finishedFiles(states: dict) -> set:
+        files = set()
+        for unit, (state, _, budget) in states.items():
+            if (state == 'done' and unit.kind in ['compare', 'file']) or (state == 'failed' and budget is None):
+                files.add(unit.filename)
+        return files
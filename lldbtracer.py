@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+### This script is loaded into lldb via `command script import lldbtracer.py` and runs the step/record loop of
+### devil.SuffixStepping in-process on lldb's SB API, writing one JSON record per step (see devil.LoadTrace).
+### usage: (lldb) devil-trace <stepl|stepi|random> <source file> <output file> <timeout> [max steps, 0 for no limit]
+###        [capture policy] [step timeout]
+
+import os
+import json
+import time
+import shlex
+import random
+import threading
+
+import lldb
+
+
+def GetFrameInfo(frame, file_source):
+    if not frame.IsValid():
+        return None, None, None, None
+
+    address = hex(frame.GetPC())
+    line_entry = frame.GetLineEntry()
+    if not line_entry.IsValid() or line_entry.GetFileSpec().GetFilename() is None:
+        return None, None, None, address
+
+    filename = os.path.basename(line_entry.GetFileSpec().GetFilename())
+    if filename != os.path.basename(file_source): # ensure current stack frame is in user-defined source file
+        filename = None
+
+    ### `frame info` only prints the column when it is known
+    offset = str(line_entry.GetColumn()) if line_entry.GetColumn() else None
+    return filename, str(line_entry.GetLine()), offset, address
+
+
+### flatten a value the same way varparser.ParseFrameVars flattens the output of `frame var`
+def DumpValue(value, name, variables, max_children):
+    error = value.GetError()
+    if not error.Success():
+        variables[name] = '<' + (error.GetCString() or 'variable not available') + '>'
+        return
+
+    val, summary = value.GetValue(), value.GetSummary()
+    if val is not None or summary is not None or value.GetNumChildren() == 0:
+        variables[name] = ' '.join(item for item in [val, summary] if item is not None)
+        return
+
+    for index in range(min(value.GetNumChildren(), max_children)):
+        child = value.GetChildAtIndex(index)
+        DumpValue(child, name + '.' + (child.GetName() or ''), variables, max_children)
+
+
+def GetFrameVars(frame, max_children):
+    variables = {}
+    for value in frame.GetVariables(True, True, False, True):
+        DumpValue(value, '(%s) %s' % (value.GetTypeName(), value.GetName()), variables, max_children)
+    return variables
+
+
+def InferiorExit(process):
+    return (not process.IsValid()) or process.GetState() in [lldb.eStateExited, lldb.eStateDetached, lldb.eStateInvalid]
+
+
+def stepping(thread, step):
+    if step == 'random':
+        step = 'stepl' if bool(random.getrandbits(1)) else 'stepi'
+
+    if step == 'stepl':
+        thread.StepInto()
+    elif step == 'stepi':
+        thread.StepInstruction(False)
+
+
+### per-step bound of the trace, like the timeout of every command of the cli backend: a step still running at its
+### deadline is interrupted (see gdbtracer.Watchdog)
+class Watchdog(threading.Thread):
+    def __init__(self, process, step_timeout: int):
+        super(Watchdog, self).__init__(daemon=True)
+        self.process = process
+        self.step_timeout = step_timeout
+        self.deadline = None
+        self.expired = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def __enter__(self):
+        with self.lock:
+            self.deadline = time.time() + self.step_timeout
+        return self
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.deadline = None
+
+    def run(self):
+        while not self.done.wait(0.1):
+            with self.lock:
+                if self.deadline is not None and time.time() >= self.deadline:
+                    self.expired = True
+                    self.deadline = time.time() + 1
+                    self.process.SendAsyncInterrupt()
+
+
+def DevilTrace(debugger, command, result, internal_dict):
+    argv = shlex.split(command)
+    step, file_source, output, timeout = argv[:4]
+    timeout = int(timeout)
+    max_steps = int(argv[4]) if len(argv) > 4 else 0
+    capture = argv[5] if len(argv) > 5 else 'all'
+
+    debugger.SetAsync(False)
+    process = debugger.GetSelectedTarget().GetProcess()
+    max_children = int(lldb.SBDebugger.GetInternalVariableValue('target.max-children-count', debugger.GetInstanceName()).GetStringAtIndex(0) or 256)
+
+    watchdog = Watchdog(process, int(argv[6]) if len(argv) > 6 else 30)
+    watchdog.start()
+    try:
+        TraceSteps(process, step, file_source, output, timeout, max_steps, capture, max_children, watchdog)
+    finally:
+        watchdog.done.set()
+
+
+def TraceSteps(process, step, file_source, output, timeout, max_steps, capture, max_children, watchdog):
+    with open(output, 'w') as f:
+        file_prev = None
+        steps = 0
+        seen = set()
+
+        time_start = time.time()
+        while True:
+            if (time.time() - time_start) >= timeout:
+                f.write(json.dumps({'event': 'timeout'}) + '\n')
+                return
+
+            if max_steps and steps >= max_steps:
+                f.write(json.dumps({'event': 'steplimit'}) + '\n')
+                return
+
+            ### an interrupted step returns as a stop
+            if watchdog.expired:
+                f.write(json.dumps({'event': 'steptimeout'}) + '\n')
+                return
+
+            with watchdog:
+                if InferiorExit(process):
+                    break
+
+                thread = process.GetSelectedThread()
+                frame = thread.GetFrameAtIndex(0)
+                file, line, offset, address = GetFrameInfo(frame, file_source)
+
+                if (file_prev is None) and file:
+                    file_prev = file
+
+                if (file is None) and (file_prev is None or step == 'stepi'):
+                    ### When previous and current stacks are both in library functions, finish to the parent stack
+                    ### (stepi at once, the skips of devil.SkippingFiles do not apply to it)
+                    if thread.GetNumFrames() > 1:
+                        thread.StepOut()
+                    else:
+                        stepping(thread, step)
+                    continue
+
+                if file is None:
+                    ### when reach to library functions, step to next statement or instruction
+                    stepping(thread, step)
+                    file_prev = file
+                    continue
+
+                ### variables of the first hit only, see devil.Captures
+                varvalue = None
+                if capture == 'all' or (file, line, offset, address) not in seen:
+                    seen.add((file, line, offset, address))
+                    varvalue = GetFrameVars(frame, max_children)
+                f.write(json.dumps({'file': file, 'line': line, 'offset': offset, 'address': address, 'vars': varvalue}) + '\n')
+                steps += 1
+
+                file_prev = file
+                stepping(thread, step)
+
+        f.write(json.dumps({'event': 'exit'}) + '\n')
+
+
+def __lldb_init_module(debugger, internal_dict):
+    debugger.HandleCommand('command script add -f %s.DevilTrace devil-trace' % __name__)
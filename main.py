@@ -5,16 +5,28 @@
 import re
 import os
 import pdb
-import pickle
+import time
+import asyncio
+import datetime
+import shutil
+import hashlib
 import logging
 import tempfile
+import contextlib
 import subprocess
 import multiprocessing
 
-from collections import OrderedDict
 from optparse import OptionParser
 
 import devil
+import store
+import compilecache
+import scheduler
+import costmodel
+import journal
+import comparator
+import diffsink
+import asyncdriver
 
 
 def GetCompiler(compiler):
@@ -32,11 +44,9 @@ def getExperimentDir():
     return expr_dir
 
 
-def openDiffFile(name: str, type: str):
+def getDiffSink():
     expr_dir = getExperimentDir()
-    rpath = os.path.join(expr_dir, type)
-    os.makedirs(rpath, exist_ok=True)
-    return open(os.path.join(rpath, "diff-" + name + '.txt'), 'a')
+    return diffsink.DiffSink(os.path.join(expr_dir, 'diffs.sqlite'), expr_dir)
 
 
 def RecordFile(file: str, flag: str, compiler: str, debugger: str):
@@ -49,7 +59,7 @@ def RecordFile(file: str, flag: str, compiler: str, debugger: str):
         for itemb in ['CPL', 'CPLDEB', 'SANCPL', 'SANEXE', 'EXE', 'DEB']:
             flag_list.append(itema + itemb)
 
-    if flag in flag_list + ['TIMEOUTPEX', 'PEXPECTEOF']:
+    if flag in flag_list + ['TIMEOUTPEX', 'PEXPECTEOF', 'STEPLIMITDEB']:
         rfile = os.path.join(rpath, "files-" + flag + ".txt")
         with open(rfile, "a") as f:
             f.write("%s,%s,%s\n" % (file, compiler, debugger))
@@ -87,138 +97,92 @@ def GetHandledFiles(path):
                 if os.path.isabs(line):
                     files_hdl.add(line)
                 else:
-                    files_hdl.add(os.path.join(os.gecwd(), line))
+                    files_hdl.add(os.path.join(os.getcwd(), line))
 
     return files_hdl
 
 
 ### get the recorded data
-def getPickleFilename(filename: str, compiler: str, debugger: str):
-    pickle_path = os.path.join(getExperimentDir(), 'pickle')
-    os.makedirs(pickle_path, exist_ok=True)
-    return os.path.join(pickle_path, os.path.relpath(filename).replace(os.sep, '__').replace('..', '') + '__' + compiler + '__' + debugger + '.pkl')
+def getResultStore():
+    return store.ResultStore(os.path.join(getExperimentDir(), 'store'))
 
 
-### get line table via readelf
-def GetLinetableViaRELF(file_object):
-    loc_set = set() ### (file, line, address) triple with debug information
+def getCompileCache(size: int):
+    return compilecache.CompileCache(os.path.join(getExperimentDir(), 'compile'), size * 1024 * 1024)
 
-    out = os.popen("readelf --debug-dump=decodedline " + file_object + " | grep '0x'").read()
 
-    for txt in out.splitlines():
-        rem = re.match('^([/|\w]+.c)\s+([0-9]+)\s+(0x[0-9a-f]+)[0-9]+?\s+x$', txt.strip())
-        if rem:
-            file, line, address = rem.groups()
-            loc = (os.path.basename(file), line, None, hex(int(address, 16)))
-            loc_set.add(loc)
+### shard key of a trace, named (compiler, opt, debugger, step, way, point) as in all_data
+def getShardKey(filename: str, name: tuple):
+    compiler, opt, debugger, step, way, point = name
+    key = store.ShardKey(filename, compiler, getCompileFlags(compiler), opt, debugger, step, way, point)
+    ### traces of every step stay valid for both policies
+    if devil.capture != 'all':
+        key['capture'] = devil.capture
+    return key
 
-    return loc_set
 
+### shard keys of the complete-run traces and line tables (by opt) of a source file
+def getShardKeys(filename: str, compiler: str, debugger: str):
+    data_keys, imag_keys = {}, {}
+    for opt in getOptimizationLevelsList(compiler):
+        imag_keys[opt] = store.ShardKey(filename, compiler, getCompileFlags(compiler), opt, debugger, 'image')
+        for step in ['stepl', 'stepi']:
+            name = (compiler, opt, debugger, step, 'break', 'main')
+            data_keys[name] = getShardKey(filename, name)
+    return data_keys, imag_keys
 
-def whichIsL(a1, way1: str, a2, way2: str):
-    if 'stepl' in way1:
-        return a1, way1, a2, way2
-    return a2, way2, a1, way1
 
+START_WAYS = ['stepl', 'stepi', 'break']
 
-### quadruple (filename, filenumb, offset, address)
-def getProgramPointByType(quadruple, point_type):
-    if 'adr' in point_type:
-        return quadruple[-1]
-    elif 'pos' in point_type:
-        return quadruple[:3]
-    elif 'loc' in point_type:
-        return quadruple[:2]
-    elif 'all' in point_type:
-        return quadruple
-    else:
-        raise Exception('Unimplemented')
 
+### program points a start-location run begins at, from the line table of an object
+def getStartPoints(imag) -> list:
+    return [comparator.getProgramPointByType(item, 'loc') for item in imag] + [comparator.getProgramPointByType(item, 'adr') for item in imag]
 
-def getObjectByType(full, point_type, var_type):
-    key = point_type + var_type
-    return full[key]
 
+### shard keys of the start-location traces of a source file, named from its stored line tables; None while one is missing
+def getStartLocationKeys(filename: str, compiler: str, debugger: str):
+    results = getResultStore()
+    _, imag_keys = getShardKeys(filename, compiler, debugger)
+    keys = []
+    for opt, imag_key in imag_keys.items():
+        if not results.has(imag_key):
+            return None
+        for way in START_WAYS:
+            for point in getStartPoints(results.get(imag_key)):
+                for step in ['stepl', 'stepi']:
+                    keys.append(getShardKey(filename, (compiler, opt, debugger, step, way, point)))
+    return keys
 
-def compareExist(hita, hitb, waya, wayb, image, file, point_type: str, text, debugger: str, method: str, check=False):
-    orderl, wayl, orderi, wayi= whichIsL(hita[point_type + 'Order'], waya, hitb[point_type + 'Order'], wayb)
 
-    aimg = [getProgramPointByType(item, point_type) for item in image]
+### whether every shard the comparison of a source file needs was recorded for it
+def hasResults(filename: str, compiler: str, debugger: str, startlocation=False) -> bool:
+    data_keys, imag_keys = getShardKeys(filename, compiler, debugger)
+    keys = list(data_keys.values()) + list(imag_keys.values())
+    if startlocation:
+        start_keys = getStartLocationKeys(filename, compiler, debugger)
+        if start_keys is None:
+            return False
+        keys += start_keys
+    return getResultStore().hasAll(keys)
 
-    for program_point in orderl:
-        if check:
-            if program_point not in aimg:
-                continue
-        if program_point not in orderi:
-            if point_type is 'adr':
-                with openDiffFile("Exist-" + point_type + "-" + debugger, method) as f:
-                    f.write("%s, [In stepl not in stepi], wayl, %s, wayi, %s, key, %s\n" % (file, wayl, wayi, program_point))
-            else:
-                unpathed_filename = os.path.split(file)[1]
-                if int(program_point[1]) - 1 < len(text):
-                    sourcecode_line_text = text[int(program_point[1]) - 1].strip() if program_point[0] == unpathed_filename else program_point[0]
-                
-                if sourcecode_line_text == '}' or sourcecode_line_text == '{': continue
-                with openDiffFile("Exist-" + point_type + "-" + debugger, method) as f:
-                    f.write("%s, [In stepl not in stepi], wayl, %s, wayi, %s, key, %s, text, %s\n" % (file, wayl, wayi, program_point, sourcecode_line_text))
-    
-    if point_type is not 'adr':
-        for program_point in orderi:
-            if check:
-                if program_point not in aimg:
-                    continue
-            if program_point not in orderl:
-                unpathed_filename = os.path.split(file)[1]
-                if int(program_point[1]) - 1 < len(text):
-                    sourcecode_line_text = text[int(program_point[1]) - 1].strip() if program_point[0] == unpathed_filename else program_point[0]
-                
-                if sourcecode_line_text:
-                    if sourcecode_line_text == '}' or sourcecode_line_text == '{': continue
-                with openDiffFile("Exist-" + point_type + "-" + debugger, method) as f:
-                    f.write("%s, [In stepi not in stepl], wayl, %s, wayi, %s, key, %s, text, %s\n" % (file, wayl, wayi, program_point, sourcecode_line_text))
-
-
-def compareOrder(hita, hitb, waya, wayb, image, file, point_type: str, text, debugger: str, method: str, check=False):
-    orderl, wayl, orderi, wayi= whichIsL(hita[point_type + 'Order'], waya, hitb[point_type + 'Order'], wayb)
-
-    aimg = [getProgramPointByType(item, point_type) for item in image]
-
-    orderl_unique = list(OrderedDict.fromkeys(orderl))
-    orderi_unique = list(OrderedDict.fromkeys(orderi))
-
-    if check:
-        orderg_unique = list(OrderedDict.fromkeys(aimg))
-
-        ### ensure every program location in ordl or ordi has debug info
-        common = set(orderl_unique) & set(orderi_unique) & set(orderg_unique)
-
-        ordl_n = [item for item in orderl_unique if item in common]
-        ordi_n = [item for item in orderi_unique if item in common]
-    else:
-        ordl_n = orderl_unique
-        ordi_n = orderi_unique
 
-    if ordl_n != ordi_n:
-        with openDiffFile("Order-" + point_type + "-" + debugger, method) as f:
-            f.write("%s, wayl, %s, wayi, %s, stepl, %s, stepi, %s\n" % (file, wayl, wayi, ordl_n, ordi_n))
+### get line table via the DWARF line program (as `readelf --debug-dump=decodedline` prints it)
+def GetLinetableViaRELF(file_object):
+    loc_set = set() ### (file, line, address) triple with debug information
+
+    rows, _, _ = devil.dwarfline.GetLineTable(file_object)
+    for file, line, _, address, is_stmt, end_sequence in rows:
+        if is_stmt and (not end_sequence) and file and file.endswith('.c'):
+            loc = (os.path.basename(file), str(line), None, hex(address))
+            loc_set.add(loc)
 
+    return loc_set
 
-def compareHittimes(hita, hitb, waya, wayb, image, file, point_type, text, debugger: str, method: str):
-    frql, wayl, frqi, wayi = whichIsL(hita[point_type + 'Hittimes'], waya, hitb[point_type + 'Hittimes'], wayb)
 
-    for key in frql:
-        if key in frqi:
-            frequency_l, frequency_i = frql[key], frqi[key]
-            if frequency_l > frequency_i:  ### when hit frequency in source-level debugging is larger than instruction-level
-                with openDiffFile("Frequency-" + point_type + "-" + debugger, method) as f:
-                    if point_type is 'adr':
-                        f.write("%s, wayl, %s, wyi, %s, %s, freq(stepl):%s, freq(stepi):%s\n\n" % (file, wayl, wayi, key, frequency_l, frequency_i))
-                    else:
-                        if key[0] == file:
-                            sourcecode_line_text = text[int(key[1]) - 1].strip()
-                        else:
-                            sourcecode_line_text = ''
-                        f.write("%s, wayl, %s, wyi, %s, %s, %s, freq(stepl):%s, freq(stepi):%s\n\n" % (file, wayl, wayi, key, sourcecode_line_text, frequency_l, frequency_i))
+def getObjectByType(full, point_type, var_type):
+    key = point_type + var_type
+    return full[key]
 
 
 def isInvalid(s: str) -> bool:
@@ -287,74 +251,6 @@ def iterateCommonByType(obja, objb, point_type):
         raise Exception('Unimplemented')
 
 
-def compareVarvalue(hita: dict, hitb: dict, waya: str, wayb: str, image: dict, file: str, point_type: str, text: list, debugger: str, method: str, check=False):
-    sourcecode_lines = text
-    varl, wayl, vari, wayi= whichIsL(hita[point_type + 'Varvalue'], waya, hitb[point_type + 'Varvalue'], wayb)
-
-    aimg = [getProgramPointByType(item, point_type) for item in image]
-
-    for key in varl:
-        if key in vari:
-            variable_tables_l = varl[key][0]
-            variable_tables_i = vari[key][0]
-            for variablename in set(variable_tables_l.keys()) & set(variable_tables_i.keys()):
-                variable_value_l = variable_tables_l[variablename]
-                variable_value_i = variable_tables_i[variablename]
-                if (variable_value_l != variable_value_i):
-                    sourcecode_line_text = None
-                    if 'adr' not in point_type:
-                        unpathed_filename = os.path.basename(file) ### split(file)[1]
-                        sourcecode_line_text = sourcecode_lines[int(key[1]) - 1].strip() if os.path.basename(key[0]) == unpathed_filename else key[0]
-                    with openDiffFile(point_type + "-var-" + debugger, method) as f:
-                        if ('optimized out' in variable_value_l) or ('optimized out' in variable_value_i) or ('variable not available' in variable_value_i) or ('variable not available' in variable_value_l):
-                            continue
-                        f.write("%s, %s, %s, %s, var: %s, [wayl-value]:%s, [wayi-value]:%s, %s\n" % (
-                                file, wayl, wayi, key, variablename,
-                                variable_value_l, variable_value_i, sourcecode_line_text))
-
-
-def compareBetweenStep(hit: dict, image: dict, waya: tuple, wayb: tuple, filename: str, text: list, debugger: str):
-    cplra, optla, debuggera, stepa, lefta, pointa = waya
-    cplrb, optlb, debuggerb, stepb, leftb, pointb = wayb
-
-    ### compare the hit, oder, frequency, variable values between two different debugging strategies with same compiler, same optimizations after the execution reaches to the same point location
-    assert cplra == cplrb and optla == optlb and debuggera == debuggerb and lefta == leftb and pointa == pointb, "compiler, optimization, debugger, staring location should consistent"
-    assert stepa != stepb, "debugging strategies should be inconsistent"
-
-    hita = hit[waya]
-    hitb = hit[wayb]
-
-    # compareVariable takes image of multiple opt level
-    image = image[optlb]
-
-    # Filter decides whether to distinguish (file, line, offset, address)
-    for point_type in ["loc","adr","pos","all"]:
-        if debugger == 'gdb' and point_type == 'pos': continue
-        ### compare hit
-        compareExist(hita=hita, hitb=hitb, waya=waya, wayb=wayb, image=image, file=filename, point_type=point_type, text=text, debugger=debugger, method="step")
-        ### compare hit order
-        compareOrder(hita=hita, hitb=hitb, waya=waya, wayb=wayb, image=image, file=filename, point_type=point_type, text=text, debugger=debugger, method="step")
-        ### compare hit frequency
-        compareHittimes(hita=hita, hitb=hitb, waya=waya, wayb=wayb, image=image, file=filename, point_type=point_type, text=text, debugger=debugger, method="step")
-        ### compare variable values
-        compareVarvalue(hita=hita, hitb=hitb, file=filename, waya=waya, wayb=wayb, image=image, point_type=point_type, text=text, debugger=debugger, method="step")
-
-
-def compareBetweenOptimizationLevel(hit: dict, image: dict, waya: tuple, wayb: tuple, filename: str, text: list, debugger: str):
-    cplra, optla, debuggera, stepa, lefta, pointa = waya
-    cplrb, optlb, debuggerb, stepb, leftb, pointb = wayb
-
-    assert cplra == cplrb and debuggera == debuggerb and stepa == stepb and lefta == leftb and pointa == pointb, "compiler, stepping level, debugger, staring location should be consistent"
-    assert optla != optlb, "optimization should be inconsistent"
-    hita = hit[waya]
-    hitb = hit[wayb]
-
-    ### compare variable values
-    for point_type in ["loc","adr","pos","all"]:
-        if debugger == 'gdb' and point_type == 'pos': continue
-        compareVarvalue(hita=hita, hitb=hitb, file=filename, waya=waya, wayb=wayb, image=image, point_type=point_type, text=text, debugger=debugger, method="optimization")
-
-
 def getOptimizationLevelsList(compiler) -> list:
     if compiler == 'gcc':
         return ['-O0', '-Og', '-O1', '-O2', '-O3']
@@ -387,16 +283,36 @@ def subprocessRunCmd(cmd: str , cwd: str, timeout: int, obj: str):
         raise e
 
 
-def Check(file: str, compiler: str, debugger: str, cwd: str, timeout: int):
+SANITIZER_FLAGS = '-w -fsanitize=address,undefined,leak'
+
+
+def Check(file: str, compiler: str, debugger: str, cwd: str, timeout: int, cache=None):
     assert debugger in ['gdb', 'lldb'], logging.error('Debugger of %s not supported' % debugger)
 
+    if cache is not None:
+        key = cache.key(file, compiler, SANITIZER_FLAGS, 'check')
+        outcome = cache.outcome(key)
+        if outcome is not None:
+            if outcome['flag'] is not None:
+                raise Exception(outcome['flag'])
+            return
+        try:
+            Check(file, compiler, debugger, cwd, timeout)
+        except Exception as e:
+            ### timeouts depend on the load of the machine, so they are not kept
+            if 'TIMEOUT' not in str(e):
+                cache.recordOutcome(key, str(e))
+            raise
+        cache.recordOutcome(key, None)
+        return
+
     cpl = GetCompiler(compiler)
     cmd = cpl + " -w -g " + file + ' -o ' + os.path.join(cwd, 'a.out')
     cmd = "(cd " + cwd + "; ulimit -t " + str(timeout + 2) + "; " + cmd + ")"
     subprocessRunCmd(cmd, cwd, timeout, 'CPL')
 
     file_san = os.path.join(cwd, "san.out")
-    cmd = cpl + " -w -fsanitize=address,undefined,leak " + file + " -o " + file_san
+    cmd = cpl + " " + SANITIZER_FLAGS + " " + file + " -o " + file_san
     cmd = "(cd " + cwd + "; ulimit -t " + str(timeout + 2) + "; " + cmd + ")"
     subprocessRunCmd(cmd, cwd, timeout, 'SANCPL')
 
@@ -414,135 +330,472 @@ def CompileCJCStaticLib(filename, cwd, timeout):
         subprocess.run(cmd, shell=True, timeout=timeout, check=True, cwd=cwd)
 
 
-def Compile(file_source: str, file_object: str, compiler: str, opt: str, cwd: str, timeout: int):
+def getCompileFlags(compiler) -> str:
+    if compiler == 'cjc':
+        return '-g'
+    return '-w -g'
+
+
+def Compile(file_source: str, file_object: str, compiler: str, opt: str, cwd: str, timeout: int, cache=None):
     assert opt in getOptimizationLevelsList(compiler), logging.error('Optimizations of %s not supported' % opt)
 
+    ### cjc links the static libraries of the working directory, which are not part of the key
+    if cache is not None and compiler != 'cjc':
+        key = cache.key(file_source, compiler, getCompileFlags(compiler), opt)
+        if cache.fetch(key, file_object):
+            return
+        Compile(file_source, file_object, compiler, opt, cwd, timeout)
+        cache.publish(key, file_object)
+        return
+
     if compiler == 'cjc':
         for staticLibName in ['pkg_class', 'pkg_struct', 'pkg_enum', 'pkg_func', 'pkg_composite']:
             CompileCJCStaticLib(staticLibName, cwd, timeout)
 
         # compile cjtect CJDBMIMain拆分后的仓颉代码文件
         print("Compiling file_src...")
-        cmd = "cjc -g " + opt + " " + file_source + " pkg_class.a pkg_struct.a pkg_enum.a pkg_func.a pkg_composite.a -o " + file_object
+        cmd = "cjc " + getCompileFlags(compiler) + " " + opt + " " + file_source + " pkg_class.a pkg_struct.a pkg_enum.a pkg_func.a pkg_composite.a -o " + file_object
     else:
         cpl = GetCompiler(compiler)
-        cmd = cpl + " -w -g " + opt + " " + file_source + " -o " + file_object
+        cmd = cpl + " " + getCompileFlags(compiler) + " " + opt + " " + file_source + " -o " + file_object
 
     cmd = "(cd " + cwd + "; ulimit -t " + str(timeout + 2) + "; " + cmd + ")"
     subprocessRunCmd(cmd, cwd, timeout, 'CPL'+opt)
 
 
 def comparison(filename, compiler, debugger):
-    pickle_filename = getPickleFilename(filename, compiler, debugger)
-    if os.path.exists(pickle_filename):
-        try:
-            print("Reading Cache...")
-            with open(pickle_filename, 'rb') as f:
-                all_data, all_imag = pickle.load(f)
-                print("Reading Cache complete")
-        except Exception as e:
-            print('Failed to read stored debugger execution data. Rerunning...')
-            print('Exception: %s' % e)
-            raise e
+    ### shards are only loaded when a comparison reads them
+    data_keys, imag_keys = getShardKeys(filename, compiler, debugger)
+    results = getResultStore()
+    all_data = store.ShardMap(results, data_keys)
+    all_imag = store.ShardMap(results, imag_keys)
 
     with open(filename, 'r') as f:
         text = f.readlines()
 
-    for opt in getOptimizationLevelsList(compiler):
-        compareBetweenStep(all_data, all_imag,
-                           (compiler, opt, debugger, 'stepl', 'break', 'main'),
-                           (compiler, opt, debugger, 'stepi', 'break', 'main'),
-                           filename, text, debugger)
-
-    has_compared = []
-    for opta in getOptimizationLevelsList(compiler):
-        for optb in getOptimizationLevelsList(compiler):
-            if opta == optb or (opta + optb in has_compared):
-                continue
-            has_compared.append(opta + optb)
-            has_compared.append(optb + opta)
-            for step in ['stepl', 'stepi']:
-                compareBetweenOptimizationLevel(all_data, all_imag,
-                                                (compiler, opta, debugger, step, 'break', 'main'),
-                                                (compiler, optb, debugger, step, 'break', 'main'),
-                                                filename, text, debugger)
-
-
-def getDataFromDebugger(filename: str, compiler: str, debugger: str, cwd: str, timeout: int, startlocation=False) -> tuple:
+    ### every trace and line table is indexed once, and reused by all the comparisons it takes part in;
+    ### the findings of the file are committed together once all of them are done
+    with getDiffSink() as sink:
+        engine = comparator.Comparator(all_data, all_imag, filename, text, debugger, sink.add, sink.agree)
+        for opt in getOptimizationLevelsList(compiler):
+            engine.compareSteps((compiler, opt, debugger, 'stepl', 'break', 'main'),
+                                (compiler, opt, debugger, 'stepi', 'break', 'main'))
+
+        for step in ['stepl', 'stepi']:
+            engine.compareOptimizationLevels([(compiler, opt, debugger, step, 'break', 'main') for opt in getOptimizationLevelsList(compiler)])
+
+
+### linetable: dwarf, dwarf-probe (dwarf, with the load bias read from gdb) or debugger
+def GetLineTable(file_object: str, file_source: str, debugger: str, linetable='debugger'):
+    if linetable in ['dwarf', 'dwarf-probe']:
+        try:
+            imag = devil.GetLineTableViaDWARF(file_object, file_source, debugger, os.path.join(getExperimentDir(), 'linetable'), linetable == 'dwarf-probe')
+            if imag:
+                return imag
+        except Exception as e:
+            logging.error('[GetLineTable]Exception %s for %s, falling back to the debugger' % (e, file_object))
+
+    return devil.GetLineTableViaImage(file_object, file_source, debugger)
+
+
+DETERMINISM_CHECKS = 3  ### derived suffixes of a way checked against a real run, spread over its points
+
+
+### slicing the complete `step` trace at a program point is only valid for deterministic programs, and only when driving
+### to the point stops at its first hit in that trace, i.e. when the point is reached by the same stepping (way == step).
+### Replays a spread of the sliceable points for real; returns whether the other ones can be sliced, and the real
+### traces of the replayed points by point
+def CheckDeterminism(file_object: str, file_source: str, debugger: str, points: list, way: str, step: str, trace: devil.Trace, timeout: int, backend: str) -> tuple:
+    replayed = {}
+    if way != step:
+        return False, replayed
+
+    sliceable = [point for point in points if devil.FirstHit(trace, point) is not None]
+    if len(sliceable) > DETERMINISM_CHECKS:
+        sliceable = [sliceable[k * (len(sliceable) - 1) // (DETERMINISM_CHECKS - 1)] for k in range(DETERMINISM_CHECKS)]
+
+    for point in sliceable:
+        replayed[point] = devil.OneRun(file_object, file_source, debugger, point, way, step, timeout, backend)
+        if not devil.SameTrace(devil.SliceTrace(trace, point), replayed[point]):
+            logging.info('[CheckDeterminism]%s, point, %s, way, %s, step, %s: suffix differs from the complete run, re-executing\n' % (file_object, point, way, step))
+            return False, replayed
+
+    return bool(sliceable), replayed
+
+
+def OpenCheckpointDriver(file_object: str, file_source: str, debugger: str, way: str, timeout: int, backend: str, checkpoint_interval: int):
+    if checkpoint_interval and debugger == 'gdb' and backend == 'cli' and way in ['stepl', 'stepi']:
+        return devil.CheckpointDriver(file_object, file_source, debugger, way, checkpoint_interval, timeout)
+    ### lldb (and driving via breakpoints) replays the prefix from main as before
+    return contextlib.nullcontext()
+
+
+def DriveAndRun(driver, file_object: str, file_source: str, debugger: str, point, way: str, step: str, timeout: int, backend: str):
+    if driver is not None:
+        handled, res = driver.run(point, step)
+        if handled:
+            return res
+    return devil.OneRun(file_object, file_source, debugger, point, way, step, timeout, backend)
+
+
+### append-only record file a complete run streams its trace into, named after the shard (key) referencing it
+def getTraceFilename(key: dict):
+    trace_path = os.path.join(getExperimentDir(), 'traces')
+    os.makedirs(trace_path, exist_ok=True)
+    return os.path.join(trace_path, store.ResultStore.digest(key) + '.jsonl')
+
+
+def getObjectFilename(filename: str, compiler: str, opt: str, cwd: str):
+    fname = os.path.relpath(filename).replace('..', '').replace(os.sep, '_') ### fname = os.path.relpath(filename).split('testsuite/')[1].replace(os.sep, '_')
+    return os.path.join(cwd, os.path.splitext(fname)[0] + '__' + compiler + opt)
+
+
+### traces from every program point of the line table to the end, keyed as in getDataFromDebugger
+def getStartLocationData(file_object: str, file_source: str, compiler: str, opt: str, debugger: str, imag, complete: dict, timeout: int, backend='cli', derive_suffix=False, checkpoint_interval=0) -> dict:
+    all_data = {}
+    points = getStartPoints(imag)
+    for way in START_WAYS:
+        derive = {'stepl': False, 'stepi': False}
+        replayed = {'stepl': {}, 'stepi': {}}
+        if derive_suffix:
+            for step in derive:
+                derive[step], replayed[step] = CheckDeterminism(file_object, file_source, debugger, points, way, step, complete[step], timeout, backend)
+
+        with OpenCheckpointDriver(file_object, file_source, debugger, way, timeout, backend, checkpoint_interval) as driver:
+            if driver is not None:
+                driver.prepare()
+
+            for point in points:
+                logging.debug("%s\nOneRun at %s, point, %s, by, %s\n" % (file_object, opt, point, way))
+
+                ahitl = replayed['stepl'].get(point)
+                ahiti = replayed['stepi'].get(point)
+                if ahitl is None and derive['stepl']:
+                    ahitl = devil.SliceTrace(complete['stepl'], point)
+                if ahiti is None and derive['stepi']:
+                    ahiti = devil.SliceTrace(complete['stepi'], point)
+
+                ### points the complete runs never reached still need a real execution
+                if ahitl is None:
+                    ahitl = DriveAndRun(driver, file_object, file_source, debugger, point, way, "stepl", timeout, backend)
+                if ahiti is None:
+                    ahiti = DriveAndRun(driver, file_object, file_source, debugger, point, way, "stepi", timeout, backend)
+
+                all_data[(compiler, opt, debugger, 'stepl', way, point)] = ahitl
+                all_data[(compiler, opt, debugger, 'stepi', way, point)] = ahiti
+
+                if (ahitl is None) or (ahiti is None):
+                    rpath = os.path.join(getExperimentDir(), compiler, debugger)
+                    os.makedirs(rpath, exist_ok=True)
+                    rfile = os.path.join(rpath, "files-FailDrive-"+ debugger + ".txt")
+                    with open(rfile, "a") as f:
+                        f.write("%s, opt, %s, point, %s, way, %s\n" % (file_object, opt, point, way))
+
+    return all_data
+
+
+def getDataFromDebugger(filename: str, compiler: str, debugger: str, cwd: str, timeout: int, startlocation=False, backend='cli', linetable='debugger', derive_suffix=False, checkpoint_interval=0, stream_traces=False, compile_cache=None) -> tuple:
     all_data, all_imag = {}, {}
     opts = getOptimizationLevelsList(compiler)
-    ways = ['stepl', 'stepi', 'break']
 
     file_source = filename
     for opt in opts:
         print("Process %s, %s\n" % (filename, opt))
-        fname = os.path.relpath(filename).replace('..', '').replace(os.sep, '_') ### fname = os.path.relpath(filename).split('testsuite/')[1].replace(os.sep, '_')
-        file_object = os.path.join(cwd, os.path.splitext(fname)[0] + '__' + compiler + opt)
-        Compile(file_source=file_source, file_object=file_object, compiler=compiler, opt=opt, cwd=cwd, timeout=timeout)
+        file_object = getObjectFilename(filename, compiler, opt, cwd)
+        Compile(file_source=file_source, file_object=file_object, compiler=compiler, opt=opt, cwd=cwd, timeout=timeout, cache=compile_cache)
 
         ### imag = GetLinetableViaRELF(file_object=file_object) ### alternative approach for obtaining line table
-        imag = devil.GetLineTableViaImage(file_object, file_source, debugger)
-        hitl = devil.CompleteRun(file_object, file_source, debugger, "stepl", timeout)
-        hiti = devil.CompleteRun(file_object, file_source, debugger, "stepi", timeout)
+        imag = GetLineTable(file_object, file_source, debugger, linetable)
+        trace_filel, trace_filei = None, None
+        if stream_traces:
+            trace_filel = getTraceFilename(getShardKey(file_source, (compiler, opt, debugger, 'stepl', 'break', 'main')))
+            trace_filei = getTraceFilename(getShardKey(file_source, (compiler, opt, debugger, 'stepi', 'break', 'main')))
+
+        hitl = devil.CompleteRun(file_object, file_source, debugger, "stepl", timeout, backend, trace_filel)
+        hiti = devil.CompleteRun(file_object, file_source, debugger, "stepi", timeout, backend, trace_filei)
 
         all_imag[opt] = imag
         all_data[(compiler, opt, debugger, 'stepl', 'break', 'main')] = hitl
         all_data[(compiler, opt, debugger, 'stepi', 'break', 'main')] = hiti
 
         if startlocation:
-            for way in ways:
-                for point in [getProgramPointByType(item, 'loc') for item in imag] + [getProgramPointByType(item, 'adr') for item in imag]:
-                    logging.debug("%s\nOneRun at %s, point, %s, by, %s\n" % (file_object, opt, point, way))
+            all_data.update(getStartLocationData(file_object, file_source, compiler, opt, debugger, imag, {'stepl': hitl, 'stepi': hiti}, timeout, backend, derive_suffix, checkpoint_interval))
 
-                    ahitl = devil.OneRun(file_object, file_source, debugger, point, way, "stepl", timeout)
-                    ahiti = devil.OneRun(file_object, file_source, debugger, point, way, "stepi", timeout)
+    return all_data, all_imag
 
-                    all_data[(compiler, opt, debugger, 'stepl', way, point)] = ahitl
-                    all_data[(compiler, opt, debugger, 'stepi', way, point)] = ahiti
 
-                    if (ahitl is None) or (ahiti is None):
-                        rfile = os.path.join(os.path.join(getExperimentDir(), compiler, debugger), "files-FailDrive-"+ debugger + ".txt")
-                        with open(rfile, "a") as f:
-                            f.write("%s, opt, %s, point, %s, way, %s\n" % (file_object, opt, point, way))
+### returns the failure flag of the file, None on success
+def task(filename: str, compiler: str, debugger: str, timeout: int, backend='cli', reuse_sessions=False, linetable='debugger', startlocation=False, derive_suffix=False, checkpoint_interval=0, stream_traces=False, compile_cache_size=0, capture='all'):
+    print("Process: %s (compiler: %s, debugger: %s)\n" % (filename, compiler, debugger))
 
-    return all_data, all_imag
+    if reuse_sessions:
+        devil.EnableSessionPool()
+    devil.SetCapturePolicy(capture)
 
+    compile_cache = getCompileCache(compile_cache_size) if compile_cache_size else None
 
-def task(filename: str, compiler: str, debugger: str, timeout: int):
-    print("Process: %s (compiler: %s, debugger: %s)\n" % (filename, compiler, debugger))
+    unit = scheduler.Unit('file', filename, None, None)
+    run_journal = getJournal(compiler, debugger)
+    run_journal.start(unit)
+    time_start = time.time()
 
-    pickle_filename = getPickleFilename(filename, compiler, debugger)
-    if not os.path.exists(pickle_filename):
+    results = getResultStore()
+    _, imag_keys = getShardKeys(filename, compiler, debugger)
+    recorded = False
+    if not hasResults(filename, compiler, debugger, startlocation):
         with tempfile.TemporaryDirectory() as cwd:
             try:
                 if debugger == 'cjdb':
                     cwd = '/root/cjtest/baseFunction/'
                 else:
-                    Check(file=filename, compiler=compiler, debugger=debugger, cwd=cwd, timeout=timeout)
-
-                all_data, all_imag = getDataFromDebugger(filename, compiler, debugger, cwd, timeout)
-                print("Dump pickle file...")
-                with open(pickle_filename, 'wb') as f:
-                    pickle.dump((all_data, all_imag), f)
-                    print("Dump pickle file complete")
+                    Check(file=filename, compiler=compiler, debugger=debugger, cwd=cwd, timeout=timeout, cache=compile_cache)
+
+                all_data, all_imag = getDataFromDebugger(filename, compiler, debugger, cwd, timeout, startlocation=startlocation, backend=backend, linetable=linetable, derive_suffix=derive_suffix, checkpoint_interval=checkpoint_interval, stream_traces=stream_traces, compile_cache=compile_cache)
+                print("Dump result shards...")
+                keys = []
+                for name, hit in all_data.items():
+                    keys.append(getShardKey(filename, name))
+                    results.put(keys[-1], hit)
+                for opt, imag in all_imag.items():
+                    keys.append(imag_keys[opt])
+                    results.put(keys[-1], imag)
+                results.record(filename, keys)
+                print("Dump result shards complete")
             except Exception as e:
                 print("Process %s with %s" % (filename, e))
                 RecordFile(file=filename, flag=str(e), compiler=compiler, debugger=debugger)
-                return
-
-    if os.path.exists(pickle_filename):
+                getCostModel().record(filename, compiler, debugger, costmodel.FILE_UNIT, time.time() - time_start, None, timeout, str(e))
+                run_journal.fail(unit, str(e), time.time() - time_start)
+                run_journal.close()
+                return str(e)
+        recorded = True
+
+    comparison(filename, compiler, debugger)
+    ### history of the files run as a whole (serial runs and --schedule=file), when their traces were recorded
+    if recorded:
+        getCostModel().record(filename, compiler, debugger, costmodel.FILE_UNIT, time.time() - time_start, None, timeout)
+    run_journal.done(unit, time.time() - time_start)
+    run_journal.close()
+
+
+### working directory of a source file, shared by its units across pool workers
+def getWorkDir(filename: str, debugger: str):
+    if debugger == 'cjdb':
+        return '/root/cjtest/baseFunction/'
+    work_dir = os.path.join(getExperimentDir(), 'work', hashlib.sha256(os.path.abspath(filename).encode()).hexdigest()[:16])
+    os.makedirs(work_dir, exist_ok=True)
+    return work_dir
+
+
+def getCostModel():
+    return costmodel.CostModel(os.path.join(getExperimentDir(), 'costs.jsonl'))
+
+
+def getJournal(compiler: str, debugger: str):
+    return journal.Journal(os.path.join(getExperimentDir(), 'journal.sqlite'), compiler, debugger)
+
+
+def printProgress(finished: int, failed: int, total: int, time_start: float):
+    elapsed = time.time() - time_start
+    eta = str(datetime.timedelta(seconds=int(elapsed / finished * (total - finished)))) if finished else '-'
+    print("[Progress] %d/%d files (%d failed), elapsed %s, ETA %s" % (finished, total, failed, datetime.timedelta(seconds=int(elapsed)), eta))
+
+
+### run one unit of a source file in a pool worker; returns the keys of the shards it stored and the length of its trace.
+### budget is the (timeout, max steps, capped) of a trace unit
+def RunUnit(unit: scheduler.Unit, compiler: str, debugger: str, timeout: int, options: dict, budget=None) -> tuple:
+    if options['reuse_sessions']:
+        devil.EnableSessionPool()
+    devil.SetCapturePolicy(options['capture'])
+    compile_cache = getCompileCache(options['compile_cache_size']) if options['compile_cache_size'] else None
+
+    results = getResultStore()
+    filename, opt = unit.filename, unit.opt
+    cwd = getWorkDir(filename, debugger)
+    file_object = getObjectFilename(filename, compiler, opt, cwd) if opt else None
+    data_keys, imag_keys = getShardKeys(filename, compiler, debugger)
+
+    if unit.kind == 'check':
+        if debugger != 'cjdb':
+            Check(file=filename, compiler=compiler, debugger=debugger, cwd=cwd, timeout=timeout, cache=compile_cache)
+    elif unit.kind == 'compile':
+        Compile(file_source=filename, file_object=file_object, compiler=compiler, opt=opt, cwd=cwd, timeout=timeout, cache=compile_cache)
+    elif unit.kind == 'linetable':
+        results.put(imag_keys[opt], GetLineTable(file_object, filename, debugger, options['linetable']))
+        return [imag_keys[opt]], None
+    elif unit.kind == 'trace':
+        key = data_keys[(compiler, opt, debugger, unit.step, 'break', 'main')]
+        trace_file = getTraceFilename(key) if options['stream_traces'] else None
+        trace_timeout, max_steps, _ = budget or (timeout, 0, False)
+        hit = devil.CompleteRun(file_object, filename, debugger, unit.step, trace_timeout, options['backend'], trace_file, max_steps)
+        results.put(key, hit)
+        return [key], len(hit)
+    elif unit.kind == 'startlocation':
+        complete = {step: results.get(data_keys[(compiler, opt, debugger, step, 'break', 'main')]) for step in ['stepl', 'stepi']}
+        all_data = getStartLocationData(file_object, filename, compiler, opt, debugger, results.get(imag_keys[opt]), complete, timeout,
+                                        options['backend'], options['derive_suffix'], options['checkpoint_interval'])
+        keys = []
+        for name, hit in all_data.items():
+            keys.append(getShardKey(filename, name))
+            results.put(keys[-1], hit)
+        return keys, None
+    elif unit.kind == 'compare':
         comparison(filename, compiler, debugger)
+    return [], None
+
+
+### RunUnit of a trace unit on the asyncio driver (cli backend), in the driver's thread of the main process
+async def ARunUnit(unit: scheduler.Unit, compiler: str, debugger: str, timeout: int, options: dict, budget=None) -> tuple:
+    results = getResultStore()
+    file_object = getObjectFilename(unit.filename, compiler, unit.opt, getWorkDir(unit.filename, debugger))
+    data_keys, _ = getShardKeys(unit.filename, compiler, debugger)
+
+    key = data_keys[(compiler, unit.opt, debugger, unit.step, 'break', 'main')]
+    trace_file = getTraceFilename(key) if options['stream_traces'] else None
+    trace_timeout, max_steps, _ = budget or (timeout, 0, False)
+    hit = await asyncdriver.CompleteRun(file_object, unit.filename, debugger, unit.step, trace_timeout, trace_file, max_steps)
+    ### keep the event loop serving the other sessions while the shard is written
+    await asyncio.get_running_loop().run_in_executor(None, results.put, key, hit)
+    return [key], len(hit)
+
+
+### check -> compile(opt) -> line table(opt), trace(opt, stepl/stepi)[ -> start locations(opt)] -> compare
+### fills budgets with the (timeout, max steps, capped) of the trace units when a cost model is given. Units done according to the
+### journal states are left out as long as their outputs are still around; returns the units added
+def addFileUnits(dag: scheduler.Scheduler, filename: str, compiler: str, debugger: str, startlocation: bool, priority: int, timeout: int, cost=None, budgets=None, states=None):
+    Unit = scheduler.Unit
+    results = getResultStore()
+    data_keys, imag_keys = getShardKeys(filename, compiler, debugger)
+
+    def isDone(unit):
+        if states is None or states.get(unit, (None, None, None))[0] != 'done':
+            return False
+        if unit.kind == 'compile':
+            return os.path.exists(getObjectFilename(filename, compiler, unit.opt, getWorkDir(filename, debugger)))
+        elif unit.kind == 'linetable':
+            return results.has(imag_keys[unit.opt])
+        elif unit.kind == 'trace':
+            return results.has(data_keys[(compiler, unit.opt, debugger, unit.step, 'break', 'main')])
+        return True
 
+    added = []
+    def add(unit, deps=(), kwargs=None):
+        if isDone(unit):
+            return
+        dag.add(unit, [dep for dep in deps if dep in added], priority, kwargs)
+        added.append(unit)
+
+    compare = Unit('compare', filename, None, None)
+    if hasResults(filename, compiler, debugger, startlocation):
+        add(compare)
+        return added
 
-def main(source, compiler, debugger, timeout, parallel):
+    check = Unit('check', filename, None, None)
+    add(check)
+    deps = []
+    for opt in getOptimizationLevelsList(compiler):
+        compile = Unit('compile', filename, opt, None)
+        add(compile, [check])
+        units = [Unit('linetable', filename, opt, None)] + [Unit('trace', filename, opt, step) for step in ['stepl', 'stepi']]
+        for unit in units:
+            if cost is not None and unit.kind == 'trace':
+                budgets[unit] = cost.budget(filename, compiler, debugger, opt, unit.step, timeout)
+            add(unit, [compile], {'budget': budgets.get(unit)} if budgets is not None else None)
+        if startlocation:
+            units.append(Unit('startlocation', filename, opt, None))
+            add(units[-1], units[:-1])
+        deps.extend(units)
+    add(compare, deps)
+    return added
+
+
+def scheduleFiles(files: list, processes: int, compiler: str, debugger: str, timeout: int, options: dict, run_journal: journal.Journal, states: dict):
+    results = getResultStore()
+    cost = getCostModel()
+    budgets = {}
+    progress = {'finished': 0, 'failed': 0}
+    time_start = time.time()
+
+    def finish(filename, failed=False):
+        if debugger != 'cjdb':
+            shutil.rmtree(getWorkDir(filename, debugger), ignore_errors=True)
+        progress['finished'] += 1
+        progress['failed'] += int(failed)
+        printProgress(progress['finished'], progress['failed'], len(files), time_start)
+
+    def on_done(unit, result, elapsed):
+        keys, steps = result
+        if keys:
+            results.record(unit.filename, keys)
+        cost.record(unit.filename, compiler, debugger, unit[0:1] + unit[2:], elapsed, steps, budgets.get(unit, (timeout, 0, False))[0])
+        run_journal.done(unit, elapsed)
+        if unit.kind == 'compare':
+            finish(unit.filename)
+
+    def on_failure(unit, error, elapsed):
+        print("Process %s with %s" % (unit.filename, error))
+        budget = budgets.get(unit, (timeout, 0, False))
+        cost.record(unit.filename, compiler, debugger, unit[0:1] + unit[2:], elapsed, None, budget[0], str(error), budget[2])
+        ### a trace that ran out of an adaptive budget tighter than the full one (but not of the capped budget of a
+        ### pathological file, see costmodel.CostModel.budget) is retried right away with the full budget
+        if (not budget[2]) and (budget[0] < timeout or budget[1] > 0) and str(error) in ['TIMEOUTDEB', 'STEPLIMITDEB']:
+            ### the journal keeps the budget, so that the trace is retried by the next run if this one is interrupted
+            run_journal.fail(unit, str(error), elapsed, budget)
+            budgets[unit] = (timeout, 0, False)
+            return {'budget': budgets[unit]}
+        RecordFile(file=unit.filename, flag=str(error), compiler=compiler, debugger=debugger)
+        run_journal.fail(unit, str(error), elapsed)
+
+    ### sibling units of a failed one may still be running in other lanes, their files go once they are all back
+    def on_dropped(filename):
+        finish(filename, failed=True)
+
+    if options['cost_model']:
+        ### longest first, so that the expensive files do not end up as stragglers
+        files = sorted(files, key=lambda file: -cost.estimate(file, compiler, debugger))
+
+    pool = multiprocessing.Pool(processes)
+    dag = scheduler.Scheduler(pool, processes, RunUnit, (compiler, debugger, timeout, options), on_done, on_failure, run_journal.start, on_dropped)
+    driver = None
+    if options['async_sessions'] and options['backend'] == 'cli' and debugger in ['gdb', 'lldb']:
+        ### traces are recorded by many debugger sessions multiplexed in this process instead of one per worker
+        driver = asyncdriver.AsyncDriver(options['async_sessions'])
+        dag.addLane('async', ['trace'], driver, options['async_sessions'], ARunUnit)
+    ### units of earlier files go first, so only a few working directories are alive at a time
+    units = []
+    for priority, file in enumerate(files):
+        units.extend(addFileUnits(dag, file, compiler, debugger, options['startlocation'], priority, timeout, cost if options['cost_model'] else None, budgets, states))
+    run_journal.queue(units)
+    dag.wait()
+
+    pool.close()
+    pool.join()
+    if driver is not None:
+        driver.close()
+        driver.join()
+
+
+def main(source, compiler, debugger, timeout, parallel, backend='cli', reuse_sessions=False, linetable='debugger', startlocation=False, derive_suffix=False, checkpoint_interval=0, stream_traces=False, compile_cache_size=0, schedule='file', cost_model=False, async_sessions=0, capture='all'):
     rpath = os.path.join(getExperimentDir(), debugger)
     os.makedirs(rpath, exist_ok=True)
 
+    if derive_suffix and capture != 'all':
+        ### a slice of a complete run misses the variables of the points it hits again after the slice start
+        logging.warning('[main]--derive-suffix records the variables of every step (--capture=all)')
+        capture = 'all'
+    ### shard keys (and the asyncio lane) of the main process
+    devil.SetCapturePolicy(capture)
+
+    ### files compared or failed in earlier runs are skipped, interrupted ones are retried
+    run_journal = getJournal(compiler, debugger)
+    states = run_journal.states()
+    files_fin = journal.Journal.finishedFiles(states)
+
     if debugger == 'cjdb':
         with open('/root/cjtest/files-all.txt') as f:
             lines = f.readlines()
             files_all = [line.strip() for line in lines]
-            files = files_all
+            files = [file for file in files_all if file not in files_fin]
     else:
         if source is None:
             source = "/root/gcc-12.1.0/gcc/testsuite"
@@ -553,13 +806,13 @@ def main(source, compiler, debugger, timeout, parallel):
 
             files_all = WalkSourceFiles(source, ".c")
             files_hdl = GetHandledFiles(path=rpath)
-            files = files_all - files_hdl
+            files = files_all - files_hdl - files_fin
         else:
             file = source
             if not os.path.isabs(source):
                 file = os.path.join(os.getcwd(), source)
 
-            task(file, compiler, debugger, timeout)
+            task(file, compiler, debugger, timeout, backend, reuse_sessions, linetable, startlocation, derive_suffix, checkpoint_interval, stream_traces, compile_cache_size, capture)
             return
 
     rfile = os.path.join(rpath, "files-ALL.txt")
@@ -568,17 +821,39 @@ def main(source, compiler, debugger, timeout, parallel):
             for file in files_all:
                 f.write("%s\n" % file)
 
+    time_start = time.time()
+    progress = {'finished': 0, 'failed': 0}
+
+    def on_task(flag):
+        progress['finished'] += 1
+        progress['failed'] += int(flag is not None)
+        printProgress(progress['finished'], progress['failed'], len(files), time_start)
+
     if not parallel:
         for file in files:
-            task(file, compiler, debugger, timeout)
+            on_task(task(file, compiler, debugger, timeout, backend, reuse_sessions, linetable, startlocation, derive_suffix, checkpoint_interval, stream_traces, compile_cache_size, capture))
     else:
         cpu_count = multiprocessing.cpu_count()
+        processes = cpu_count
         if cpu_count >= 3:
             processes = int(cpu_count * 3 / 4)
 
+        if schedule == 'unit':
+            options = {'backend': backend, 'reuse_sessions': reuse_sessions, 'linetable': linetable, 'startlocation': startlocation, 'derive_suffix': derive_suffix,
+                       'checkpoint_interval': checkpoint_interval, 'stream_traces': stream_traces, 'compile_cache_size': compile_cache_size, 'cost_model': cost_model,
+                       'async_sessions': async_sessions, 'capture': capture}
+            scheduleFiles(sorted(files), processes, compiler, debugger, timeout, options, run_journal, states)
+            return
+
+        files = sorted(files)
+        if cost_model:
+            cost = getCostModel()
+            files = sorted(files, key=lambda file: -cost.estimate(file, compiler, debugger))
+
+        run_journal.queue([scheduler.Unit('file', file, None, None) for file in files])
         pool = multiprocessing.Pool(processes)
-        for file in sorted(files):
-            pool.apply_async(task, args=(file, compiler, debugger, timeout,))
+        for file in files:
+            pool.apply_async(task, args=(file, compiler, debugger, timeout, backend, reuse_sessions, linetable, startlocation, derive_suffix, checkpoint_interval, stream_traces, compile_cache_size, capture,), callback=on_task)
 
         pool.close()
         pool.join()
@@ -598,6 +873,30 @@ if __name__ == "__main__":
                       help="logging verbose: 0 for Debug, 1 for info, 2 for warning, 3 for error, default: 3")
     parser.add_option("-p", "--parallel", default=False, action="store_true", dest="parallel",
                       help="enable running in parallel(will be work for directory), default: disable")
+    parser.add_option("--backend", type=str, default="cli", dest="backend",
+                      help="stepping backend: cli for command-line scraping, tracer for running the step loop inside the debugger(gdb python or lldb SB API), mi for the GDB/MI interface(gdb), default: cli")
+    parser.add_option("--reuse-sessions", default=False, action="store_true", dest="reuse_sessions",
+                      help="keep debugger processes alive and reuse them across optimization levels and runs, default: disable")
+    parser.add_option("--linetable", type=str, default="debugger", dest="linetable",
+                      help="line table source: dwarf for decoding .debug_line directly, dwarf-probe for dwarf with the load address of position independent executables read from gdb(once per machine), debugger for dumping it via the debugger, default: debugger")
+    parser.add_option("--startlocation", default=False, action="store_true", dest="startlocation",
+                      help="also trace from every program point of the line table to the end, default: disable")
+    parser.add_option("--derive-suffix", default=False, action="store_true", dest="derive_suffix",
+                      help="derive the start-location traces of a stepping reached by the same stepping by slicing its complete run, once a few of them match real runs(deterministic programs), default: disable")
+    parser.add_option("--checkpoint-interval", type=int, default=0, dest="checkpoint_interval",
+                      help="reach start locations from gdb checkpoints taken every N steps; smaller N uses more memory and less time, default: 0 (disable)")
+    parser.add_option("--stream-traces", default=False, action="store_true", dest="stream_traces",
+                      help="stream complete-run traces to Expr/traces while recording and read them back lazily for comparison, default: disable")
+    parser.add_option("--compile-cache", type=int, default=0, dest="compile_cache_size",
+                      help="reuse compiled objects and sanitizer outcomes from Expr/compile across runs and workers, bounded to the given size(MB), default: 0 (disable)")
+    parser.add_option("--cost-model", default=False, action="store_true", dest="cost_model",
+                      help="schedule the most expensive files first in parallel runs, estimated from Expr/costs.jsonl of earlier runs (or source size and loops), and (with --schedule=unit) give every trace a time and step budget adapted to its earlier runs, default: disable")
+    parser.add_option("--async-sessions", type=int, default=0, dest="async_sessions",
+                      help="record traces(cli backend, gdb or lldb) with up to N debugger sessions multiplexed by asyncio in the main process, started while CPUs are idle(works with --schedule=unit), default: 0 (disable)")
+    parser.add_option("--capture", type=str, default="all", dest="capture",
+                      help="variable capture: first for fetching the variables on the first hit of every program point only(what the comparisons read), all for every step(required by --derive-suffix), default: all")
+    parser.add_option("--schedule", type=str, default="file", dest="schedule",
+                      help="parallel work granularity: unit for dispatching check/compile/line table/trace/compare of every file and opt level as separate jobs, file for one job per file, default: file")
 
     (options, args) = parser.parse_args()
 
@@ -633,4 +932,4 @@ if __name__ == "__main__":
 
     logging.basicConfig(filename="devil_" + options.compiler + "_" + options.debugger + ".log", level=level)
 
-    main(source=options.source, compiler=options.compiler, debugger=options.debugger, timeout=options.timeout, parallel=options.parallel)
\ No newline at end of file
+    main(source=options.source, compiler=options.compiler, debugger=options.debugger, timeout=options.timeout, parallel=options.parallel, backend=options.backend, reuse_sessions=options.reuse_sessions, linetable=options.linetable, startlocation=options.startlocation, derive_suffix=options.derive_suffix, checkpoint_interval=options.checkpoint_interval, stream_traces=options.stream_traces, compile_cache_size=options.compile_cache_size, schedule=options.schedule, cost_model=options.cost_model, async_sessions=options.async_sessions, capture=options.capture)
\ No newline at end of file
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Order diff of two deduplicated hit orders (every program point occurs at most once in each). With distinct
+### elements the longest common subsequence is the longest increasing run of the positions in the second order of
+### the elements of the first one (Hunt-Szymanski), found by patience sorting in O(n log n) time and O(n) space, so
+### the minimal insert/delete edit script scales to stepi traces with 10^5+ unique points.
+
+import bisect
+
+
+### (i, j) index pairs of a longest common subsequence of a and b
+def UniqueLCS(a: list, b: list) -> list:
+    positions = {point: j for j, point in enumerate(b)}
+    pairs, prev = [], []
+    tails, tails_j = [], []     ### pair ending the longest run of each length, and its position in b
+
+    for i, point in enumerate(a):
+        j = positions.get(point)
+        if j is None:
+            continue
+        k = bisect.bisect_left(tails_j, j)
+        pairs.append((i, j))
+        prev.append(tails[k - 1] if k else -1)
+        if k == len(tails):
+            tails.append(len(pairs) - 1)
+            tails_j.append(j)
+        else:
+            tails[k] = len(pairs) - 1
+            tails_j[k] = j
+
+    lcs = []
+    idx = tails[-1] if tails else -1
+    while idx != -1:
+        lcs.append(pairs[idx])
+        idx = prev[idx]
+    return lcs[::-1]
+
+
+### minimal edit script turning a into b, as hunks (i, deleted points of a from i, j, inserted points of b from j)
+def EditScript(a: list, b: list) -> list:
+    hunks = []
+    i = j = 0
+    for li, lj in UniqueLCS(a, b) + [(len(a), len(b))]:
+        if li > i or lj > j:
+            hunks.append((i, a[i:li], j, b[j:lj]))
+        i, j = li + 1, lj + 1
+    return hunks
+
+
+### index of the first point where a and b differ, None when they are equal
+def FirstDivergence(a: list, b: list):
+    for k, (pa, pb) in enumerate(zip(a, b)):
+        if pa != pb:
+            return k
+    return None if len(a) == len(b) else min(len(a), len(b))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### DAG scheduler over a multiprocessing.Pool: units are dispatched to the pool as soon as all their dependencies
+### completed, at most `slots` at a time and lowest priority first. Units of the same group (source file) share fate:
+### when one fails, the pending units of its group are dropped, and on_dropped is called once its running units are
+### back, unless on_failure returns the keyword arguments of another run of the failed unit (e.g. with a larger budget). Units of some kinds can be routed to another lane, i.e. another executor with the apply_async interface
+### (e.g. asyncdriver.AsyncDriver) and slots of its own.
+
+import time
+import heapq
+import queue
+import logging
+
+from collections import namedtuple, defaultdict
+
+
+### kind: check, compile, linetable, trace, startlocation or compare; opt and step are None when not applicable
+Unit = namedtuple('Unit', ['kind', 'filename', 'opt', 'step'])
+
+
+class Scheduler:
+    def __init__(self, pool, slots: int, run, args=(), on_done=None, on_failure=None, on_start=None, on_dropped=None):
+        self.lanes = {None: {'pool': pool, 'slots': slots, 'run': run, 'ready': [], 'running': 0}}
+        self.routes = {}                    ### unit kind -> lane
+        self.args = args
+        self.on_done = on_done
+        self.on_failure = on_failure
+        self.on_start = on_start
+        self.on_dropped = on_dropped
+
+        self.waiting = {}                   ### unit -> set of units it still waits for
+        self.dependents = defaultdict(list) ### unit -> units waiting for it
+        self.priority = {}
+        self.kwargs = {}                    ### unit -> keyword arguments of its run
+        self.started = {}
+        self.running = 0
+        self.active = defaultdict(int)      ### group -> units of it running
+        self.failed = set()                 ### groups with a failed unit
+        self.finished = queue.Queue()
+        self.sequence = 0
+
+    def addLane(self, name: str, kinds: list, pool, slots: int, run):
+        self.lanes[name] = {'pool': pool, 'slots': slots, 'run': run, 'ready': [], 'running': 0}
+        for kind in kinds:
+            self.routes[kind] = name
+
+    def add(self, unit: Unit, deps=(), priority=0, kwargs=None):
+        self.priority[unit] = priority
+        self.kwargs[unit] = kwargs or {}
+        self.waiting[unit] = set(deps)
+        for dep in deps:
+            self.dependents[dep].append(unit)
+        if not deps:
+            self.push(unit)
+
+    def push(self, unit: Unit):
+        del self.waiting[unit]
+        self.sequence += 1
+        heapq.heappush(self.lanes[self.routes.get(unit.kind)]['ready'], (self.priority[unit], self.sequence, unit))
+
+    def dispatch(self):
+        for lane in self.lanes.values():
+            while lane['ready'] and lane['running'] < lane['slots']:
+                _, _, unit = heapq.heappop(lane['ready'])
+                if unit.filename in self.failed:
+                    self.kwargs.pop(unit, None)
+                    continue
+                lane['running'] += 1
+                self.running += 1
+                self.active[unit.filename] += 1
+                self.started[unit] = time.time()
+                if self.on_start is not None:
+                    self.on_start(unit)
+                ### callbacks run in the pool's result thread, hand the outcome over to the thread in wait()
+                lane['pool'].apply_async(lane['run'], args=(unit,) + tuple(self.args), kwds=self.kwargs.pop(unit),
+                                         callback=lambda result, unit=unit: self.finished.put((unit, result, None)),
+                                         error_callback=lambda error, unit=unit: self.finished.put((unit, None, error)))
+
+    def drop(self, group: str):
+        self.failed.add(group)
+        for unit in [unit for unit in self.waiting if unit.filename == group]:
+            del self.waiting[unit]
+            self.kwargs.pop(unit, None)
+
+    def wait(self):
+        self.dispatch()
+        while self.running:
+            unit, result, error = self.finished.get()
+            self.running -= 1
+            self.lanes[self.routes.get(unit.kind)]['running'] -= 1
+            self.active[unit.filename] -= 1
+            elapsed = time.time() - self.started.pop(unit)
+
+            if unit.filename in self.failed:
+                ### a unit of the group failed while this one was running
+                pass
+            elif error is not None:
+                logging.error('[Scheduler]%s failed with %s' % (unit, error))
+                retry = self.on_failure(unit, error, elapsed) if self.on_failure is not None else None
+                if retry is not None:
+                    ### its dependents keep waiting for it
+                    self.kwargs[unit] = retry
+                    self.waiting[unit] = set()
+                    self.push(unit)
+                else:
+                    self.drop(unit.filename)
+            else:
+                if self.on_done is not None:
+                    self.on_done(unit, result, elapsed)
+                for dependent in self.dependents.pop(unit, []):
+                    if dependent not in self.waiting:
+                        continue
+                    self.waiting[dependent].discard(unit)
+                    if not self.waiting[dependent]:
+                        self.push(dependent)
+
+            if not self.active[unit.filename]:
+                del self.active[unit.filename]
+                ### the last running unit of a failed group is back, e.g. its working directory is no longer used
+                if unit.filename in self.failed and self.on_dropped is not None:
+                    self.on_dropped(unit.filename)
+
+            self.dispatch()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Result store sharded per (source hash, compiler+version, flags, opt, debugger+version, step mode[, start location]).
+### Shards are content-addressed pickles under <root>/shards, so any run whose key matches reuses them, and
+### a per-source index under <root>/index lists the shards recorded for that source file.
+
+import os
+import json
+import pickle
+import hashlib
+import logging
+import subprocess
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def GetToolVersion(tool: str) -> str:
+    try:
+        proc = subprocess.run([tool, '--version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60)
+        lines = proc.stdout.decode(errors='replace').strip().splitlines()
+        if lines:
+            return lines[0].strip()
+    except Exception as e:
+        logging.error('[GetToolVersion]Exception %s for %s' % (e, tool))
+    return 'unknown'
+
+
+@functools.lru_cache(maxsize=1024)
+def hashFileCached(path: str, mtime: float, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def HashFile(path: str) -> str:
+    st = os.stat(path)
+    return hashFileCached(os.path.abspath(path), st.st_mtime, st.st_size)
+
+
+def ShardKey(source: str, compiler: str, flags: str, opt: str, debugger: str, step: str, way='break', point='main') -> dict:
+    return {'source': HashFile(source), 'compiler': compiler, 'compiler_version': GetToolVersion(compiler), 'flags': flags,
+            'opt': opt, 'debugger': debugger, 'debugger_version': GetToolVersion(debugger),
+            'step': step, 'way': way, 'point': repr(point)}
+
+
+def atomicDump(obj, filename: str, dump):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp_filename, 'wb' if dump is pickle.dump else 'w') as f:
+        dump(obj, f)
+    os.replace(tmp_filename, filename)
+
+
+class ResultStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def digest(key: dict) -> str:
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def shardFilename(self, key: dict) -> str:
+        digest = self.digest(key)
+        return os.path.join(self.root, 'shards', digest[:2], digest + '.pkl')
+
+    def indexFilename(self, source: str) -> str:
+        return os.path.join(self.root, 'index', hashlib.sha256(os.path.abspath(source).encode()).hexdigest() + '.json')
+
+    def has(self, key: dict) -> bool:
+        return os.path.exists(self.shardFilename(key))
+
+    def get(self, key: dict):
+        with open(self.shardFilename(key), 'rb') as f:
+            return pickle.load(f)
+
+    def put(self, key: dict, obj):
+        atomicDump(obj, self.shardFilename(key), pickle.dump)
+
+    def index(self, source: str) -> dict:
+        filename = self.indexFilename(source)
+        if not os.path.exists(filename):
+            return {'source': os.path.abspath(source), 'shards': {}}
+        with open(filename, 'r') as f:
+            return json.load(f)
+
+    ### whether the shards of all keys are around. Keys are content-addressed, so the shards of the same source at
+    ### another path (a moved or copied tree) count too, whether the index of that path lists them or not
+    def hasAll(self, keys: list) -> bool:
+        return all(self.has(key) for key in keys)
+
+    ### only the worker handling a source file writes its index, so no locking is needed
+    def record(self, source: str, keys: list):
+        index = self.index(source)
+        for key in keys:
+            index['shards'][self.digest(key)] = key
+        atomicDump(index, self.indexFilename(source), json.dump)
+
+
+### dict of shards, each loaded from the store on first access
+class ShardMap(dict):
+    def __init__(self, store: ResultStore, keys: dict):
+        super(ShardMap, self).__init__()
+        self.store = store
+        self.shard_keys = keys
+
+    def __missing__(self, name):
+        value = self.store.get(self.shard_keys[name])
+        self[name] = value
+        return value
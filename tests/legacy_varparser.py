@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### The line-based parser of frame variables that varparser.py replaced (devil.py before the single-pass parser),
+### kept as the reference of test_varparser.py. It reads lldb's multi-line blocks, but not one-line aggregates.
+
+
+def GetRawFrameVars(lines: str) -> str:
+    lines = lines.splitlines()
+    for line in lines:
+        yield line
+
+
+def DumpFrameVars(raw) -> str:
+    ans = ""
+    isfirst: bool = True
+    for item in raw:
+        s = item.strip()
+        if s.endswith('}'):
+            break
+
+        if isfirst:
+            isfirst = False
+        else:
+            ans += ", "
+
+        if s.endswith('{'):
+            child = DumpFrameVars(raw)
+            ans += s + child + '}'
+
+        ans += " " + s + " "
+
+    return ans
+
+
+### Recursively traverse the structure layer by layer
+def ParseFrameVars(raw) -> dict:
+    variables = {}
+    for item in raw:
+        if item.strip().endswith('}'):
+            break
+
+        if ' = ' not in item:
+            continue
+
+        token_both = item.split(' = ', 1)
+        token1 = token_both[1].strip()
+        token0 = token_both[0].strip()
+
+        if token1.startswith('{'):
+            child = ParseFrameVars(raw)
+            for k, v in child.items():
+                variables[token0 + '.' + k] = v
+
+        elif token1.endswith('{'):
+            child = DumpFrameVars(raw)
+            variables[token0] = token1 + child + '}'
+
+        else:
+            variables[token0] = token1
+
+    return variables
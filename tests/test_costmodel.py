@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### costmodel.CostModel: trace budgets over successive runs of a file, and the estimates of files with and without history.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import costmodel
+
+
+TIMEOUT = 300
+UNIT = ('trace', '-O2', 'stepl')
+
+
+class TestCostModel(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'a.c')
+        with open(self.source, 'w') as f:
+            f.write('int main() { for (int i = 0; i < 10; i++); return 0; }\n')
+        self.filename = os.path.join(self.dir, 'costs.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def model(self):
+        return costmodel.CostModel(self.filename)
+
+    def budget(self, model=None):
+        return (model or self.model()).budget(self.source, 'gcc', 'gdb', '-O2', 'stepl', TIMEOUT)
+
+    ### a run of the trace under budget, as main.scheduleFiles records it
+    def attempt(self, budget, duration, steps=None, flag=None):
+        self.model().record(self.source, 'gcc', 'gdb', UNIT, duration, steps, budget[0], flag, budget[2] if flag else False)
+
+    def test_no_history(self):
+        self.assertEqual(self.budget(), (TIMEOUT, 0, False))
+
+    def test_adaptive_after_success(self):
+        self.attempt(self.budget(), 20, 500)
+        self.assertEqual(self.budget(), (costmodel.SLACK * 20, costmodel.SLACK * 500 + costmodel.STEP_MARGIN, False))
+
+        ### short runs still get the minimum time budget
+        self.attempt(self.budget(), 1, 10)
+        self.assertEqual(self.budget()[0], costmodel.MIN_TIMEOUT)
+
+    def test_adaptive_failure_gets_the_full_budget(self):
+        self.attempt(self.budget(), 20, 500)
+        budget = self.budget()
+        self.attempt(budget, budget[0], None, 'TIMEOUTDEB')
+        self.assertEqual(self.budget(), (TIMEOUT, 0, False))
+
+    def test_pathological_stays_capped(self):
+        capped = (max(costmodel.MIN_TIMEOUT, TIMEOUT // costmodel.PATHOLOGICAL), 0, True)
+        self.attempt(self.budget(), TIMEOUT, None, 'TIMEOUTDEB')
+        self.assertEqual(self.budget(), capped)
+
+        ### a failure under the cap is no adaptive failure: the file is not given the full budget again
+        for _ in range(3):
+            self.attempt(self.budget(), capped[0], None, 'TIMEOUTDEB')
+            self.assertEqual(self.budget(), capped)
+
+        ### nor after a restart, which reads the history back
+        self.assertEqual(self.budget(costmodel.CostModel(self.filename)), capped)
+
+        ### until it completes under the cap
+        self.attempt(self.budget(), 10, 100)
+        self.assertFalse(self.budget()[2])
+
+    def test_step_limit_is_pathological(self):
+        self.attempt((TIMEOUT, 0, False), 100, None, 'STEPLIMITDEB')
+        self.assertTrue(self.budget()[2])
+
+    def test_other_failure_gets_the_full_budget(self):
+        self.attempt(self.budget(), 5, None, 'SEGFAULTDEB')
+        self.assertEqual(self.budget(), (TIMEOUT, 0, False))
+
+    def test_estimate(self):
+        model = self.model()
+        model.record(self.source, 'gcc', 'gdb', UNIT, 10, 100, TIMEOUT)
+        model.record(self.source, 'gcc', 'gdb', ('trace', '-O2', 'stepi'), 30, 100, TIMEOUT)
+        self.assertEqual(model.estimate(self.source, 'gcc', 'gdb'), 40)
+
+        ### a file run as a whole counts when it took longer than its units
+        model.record(self.source, 'gcc', 'gdb', costmodel.FILE_UNIT, 50)
+        self.assertEqual(model.estimate(self.source, 'gcc', 'gdb'), 50)
+
+        ### files without history are scaled by the rate of the ones with history
+        other = os.path.join(self.dir, 'b.c')
+        with open(other, 'w') as f:
+            f.write('int main() { return 0; }\n')
+        self.assertAlmostEqual(model.estimate(other, 'gcc', 'gdb'), costmodel.StaticScore(other) * 50 / costmodel.StaticScore(self.source))
+
+
+if __name__ == '__main__':
+    unittest.main()
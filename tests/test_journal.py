@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### journal.Journal: the latest state of every unit, and the files a restarted run skips.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+from scheduler import Unit
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.journal = journal.Journal(os.path.join(self.dir, 'journal.sqlite'), 'gcc', 'gdb')
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.dir)
+
+    def finished(self):
+        return journal.Journal.finishedFiles(self.journal.states())
+
+    def test_latest_state(self):
+        unit = Unit('trace', 'a.c', '-O2', 'stepl')
+        self.journal.queue([unit])
+        self.journal.start(unit)
+        self.assertEqual(self.journal.states()[unit], ('running', None, None))
+
+        self.journal.fail(unit, 'TIMEOUTDEB', 10, (30, 1000, False))
+        self.assertEqual(self.journal.states()[unit], ('failed', 'TIMEOUTDEB', [30, 1000, False]))
+
+        self.journal.start(unit)
+        self.journal.done(unit, 20)
+        self.assertEqual(self.journal.states()[unit], ('done', None, None))
+
+    def test_finished_files(self):
+        ### compared
+        self.journal.done(Unit('compare', 'a.c', None, None), 1)
+        ### run as a whole
+        self.journal.done(Unit('file', 'b.c', None, None), 1)
+        ### failed for good
+        self.journal.fail(Unit('compile', 'c.c', '-O2', None), 'ERRORCPL', 1)
+        ### interrupted
+        self.journal.done(Unit('trace', 'd.c', '-O2', 'stepl'), 1)
+        self.journal.start(Unit('trace', 'd.c', '-O2', 'stepi'))
+        self.assertEqual(self.finished(), {'a.c', 'b.c', 'c.c'})
+
+    def test_deferred_failure(self):
+        ### ran out of an adaptive budget, and the run ended before its retry with the full one completed
+        unit = Unit('trace', 'a.c', '-O2', 'stepl')
+        self.journal.fail(unit, 'TIMEOUTDEB', 10, (30, 0, False))
+        self.assertEqual(self.finished(), set())
+
+        self.journal.start(unit)
+        self.assertEqual(self.finished(), set())
+
+        ### the retry failed as well, under the full budget
+        self.journal.fail(unit, 'TIMEOUTDEB', 300)
+        self.assertEqual(self.finished(), {'a.c'})
+
+    def test_runs_are_separate(self):
+        self.journal.done(Unit('compare', 'a.c', None, None), 1)
+        other = journal.Journal(os.path.join(self.dir, 'journal.sqlite'), 'clang', 'lldb')
+        try:
+            self.assertEqual(journal.Journal.finishedFiles(other.states()), set())
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
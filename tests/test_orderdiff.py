@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### orderdiff: the Hunt-Szymanski LCS against a brute-force one, the edit script turning the first order into the
+### second, and the first divergence.
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orderdiff
+
+
+SEED = 20261018
+
+
+### length of a longest common subsequence, by dynamic programming
+def LCSLength(a: list, b: list) -> int:
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a)):
+        for j in range(len(b)):
+            lengths[i + 1][j + 1] = lengths[i][j] + 1 if a[i] == b[j] else max(lengths[i][j + 1], lengths[i + 1][j])
+    return lengths[len(a)][len(b)]
+
+
+def Apply(a: list, hunks: list) -> list:
+    out, i = [], 0
+    for start, deleted, _, inserted in hunks:
+        out.extend(a[i:start])
+        out.extend(inserted)
+        i = start + len(deleted)
+    return out + a[i:]
+
+
+### two orders of distinct points, sharing some of them
+def RandomOrders(rng: random.Random) -> tuple:
+    points = list(range(rng.randint(0, 30)))
+    a = rng.sample(points, rng.randint(0, len(points)))
+    b = rng.sample(points, rng.randint(0, len(points)))
+    return a, b
+
+
+class TestOrderDiff(unittest.TestCase):
+    def test_lcs(self):
+        rng = random.Random(SEED)
+        for _ in range(500):
+            a, b = RandomOrders(rng)
+            lcs = orderdiff.UniqueLCS(a, b)
+            with self.subTest(a=a, b=b):
+                self.assertEqual(len(lcs), LCSLength(a, b))
+                for (i, j), (ni, nj) in zip(lcs, lcs[1:]):
+                    self.assertLess(i, ni)
+                    self.assertLess(j, nj)
+                for i, j in lcs:
+                    self.assertEqual(a[i], b[j])
+
+    def test_edit_script(self):
+        rng = random.Random(SEED)
+        for _ in range(500):
+            a, b = RandomOrders(rng)
+            hunks = orderdiff.EditScript(a, b)
+            with self.subTest(a=a, b=b):
+                self.assertEqual(Apply(a, hunks), b)
+                ### minimal: everything but the LCS is deleted or inserted once
+                self.assertEqual(sum(len(deleted) + len(inserted) for _, deleted, _, inserted in hunks), len(a) + len(b) - 2 * LCSLength(a, b))
+                for start, deleted, pos, inserted in hunks:
+                    self.assertEqual(a[start:start + len(deleted)], deleted)
+                    self.assertEqual(b[pos:pos + len(inserted)], inserted)
+
+    def test_edit_script_examples(self):
+        self.assertEqual(orderdiff.EditScript([1, 2, 3], [1, 2, 3]), [])
+        self.assertEqual(orderdiff.EditScript([], [1]), [(0, [], 0, [1])])
+        self.assertEqual(orderdiff.EditScript([1, 2, 3, 4], [1, 3, 2, 4]), [(1, [2], 1, []), (3, [], 2, [2])])
+
+    def test_first_divergence(self):
+        self.assertIsNone(orderdiff.FirstDivergence([1, 2, 3], [1, 2, 3]))
+        self.assertIsNone(orderdiff.FirstDivergence([], []))
+        self.assertEqual(orderdiff.FirstDivergence([1, 2, 3], [1, 3, 2]), 1)
+        self.assertEqual(orderdiff.FirstDivergence([4, 2], [1, 2]), 0)
+        ### one order is a prefix of the other
+        self.assertEqual(orderdiff.FirstDivergence([1, 2], [1, 2, 3]), 2)
+        self.assertEqual(orderdiff.FirstDivergence([1, 2, 3], [1]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
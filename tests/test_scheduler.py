@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### scheduler.Scheduler on a thread pool: dependency order, priorities and lanes, and the fate of the units of a
+### group after one of them fails.
+
+import os
+import sys
+import threading
+import unittest
+
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler
+from scheduler import Unit
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.done = []
+        self.failed = []
+        self.dropped = []
+        self.released = {}  ### unit -> event it waits for before it returns
+        self.errors = {}    ### unit -> number of runs that fail
+
+    def run(self, unit, budget=None):
+        with self.lock:
+            self.started.append((unit, budget))
+        if unit in self.released:
+            self.released[unit].wait(10)
+        with self.lock:
+            if self.errors.get(unit):
+                self.errors[unit] -= 1
+                raise Exception('TIMEOUTDEB')
+        return unit.kind
+
+    def on_done(self, unit, result, elapsed):
+        self.done.append(unit)
+
+    def on_failure(self, unit, error, elapsed):
+        self.failed.append(unit)
+
+    def on_dropped(self, filename):
+        self.dropped.append(filename)
+
+
+def FileUnits(filename: str) -> list:
+    check = Unit('check', filename, None, None)
+    compile = Unit('compile', filename, '-O2', None)
+    traces = [Unit('trace', filename, '-O2', step) for step in ['stepl', 'stepi']]
+    compare = Unit('compare', filename, None, None)
+    return [(check, []), (compile, [check])] + [(trace, [compile]) for trace in traces] + [(compare, traces)]
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.pool = ThreadPool(4)
+        self.recorder = Recorder()
+
+    def tearDown(self):
+        self.pool.close()
+        self.pool.join()
+
+    def scheduler(self, slots=4, on_failure=None):
+        recorder = self.recorder
+        return scheduler.Scheduler(self.pool, slots, recorder.run, (), recorder.on_done, on_failure or recorder.on_failure,
+                                   None, recorder.on_dropped)
+
+    def test_dependency_order(self):
+        dag = self.scheduler()
+        for priority, filename in enumerate(['a.c', 'b.c']):
+            for unit, deps in FileUnits(filename):
+                dag.add(unit, deps, priority)
+        dag.wait()
+
+        self.assertEqual(len(self.recorder.done), 10)
+        started = [unit for unit, _ in self.recorder.started]
+        for filename in ['a.c', 'b.c']:
+            for unit, deps in FileUnits(filename):
+                for dep in deps:
+                    self.assertLess(self.recorder.done.index(dep), started.index(unit))
+        self.assertEqual(dag.kwargs, {})
+        self.assertEqual(self.recorder.dropped, [])
+
+    def test_priority(self):
+        ### one slot: ready units run lowest priority first
+        dag = self.scheduler(slots=1)
+        units = [Unit('check', filename, None, None) for filename in ['a.c', 'b.c', 'c.c']]
+        for priority, unit in zip([2, 0, 1], units):
+            dag.add(unit, [], priority)
+        dag.wait()
+        self.assertEqual([unit for unit, _ in self.recorder.started], [units[1], units[2], units[0]])
+
+    def test_lane(self):
+        lane = Recorder()
+        dag = self.scheduler()
+        dag.addLane('traces', ['trace'], self.pool, 1, lane.run)
+        for unit, deps in FileUnits('a.c'):
+            dag.add(unit, deps)
+        dag.wait()
+        self.assertEqual(sorted(unit.step for unit, _ in lane.started), ['stepi', 'stepl'])
+        self.assertNotIn('trace', [unit.kind for unit, _ in self.recorder.started])
+        self.assertEqual(len(self.recorder.done), 5)
+
+    def test_dropped_siblings(self):
+        units = dict(FileUnits('a.c'))
+        stepl, stepi = [unit for unit in units if unit.kind == 'trace']
+        compare = Unit('compare', 'a.c', None, None)
+        ### stepl fails while stepi is still running
+        self.recorder.errors[stepl] = 1
+        self.recorder.released[stepi] = threading.Event()
+
+        def on_failure(unit, error, elapsed):
+            self.recorder.on_failure(unit, error, elapsed)
+            self.assertEqual(self.recorder.dropped, [])
+            self.recorder.released[stepi].set()
+
+        dag = self.scheduler(on_failure=on_failure)
+        for unit, deps in units.items():
+            dag.add(unit, deps)
+        for unit, deps in FileUnits('b.c'):
+            dag.add(unit, deps, 1)
+        dag.wait()
+
+        self.assertEqual(self.recorder.failed, [stepl])
+        ### the pending unit of the group never runs, the running one is let finish but not reported
+        self.assertNotIn(compare, [unit for unit, _ in self.recorder.started])
+        self.assertIn(stepi, [unit for unit, _ in self.recorder.started])
+        self.assertNotIn(stepi, self.recorder.done)
+        ### the group goes once its last running unit is back, the other group is not affected
+        self.assertEqual(self.recorder.dropped, ['a.c'])
+        self.assertEqual([unit.filename for unit in self.recorder.done].count('b.c'), 5)
+        self.assertEqual(dag.kwargs, {})
+        self.assertEqual(dict(dag.active), {})
+
+    def test_retry(self):
+        units = dict(FileUnits('a.c'))
+        stepl = [unit for unit in units if unit.kind == 'trace'][0]
+        self.recorder.errors[stepl] = 1
+
+        ### on_failure asks for another run with the full budget
+        def on_failure(unit, error, elapsed):
+            self.recorder.on_failure(unit, error, elapsed)
+            return {'budget': (300, 0, False)}
+
+        dag = self.scheduler(on_failure=on_failure)
+        for unit, deps in units.items():
+            dag.add(unit, deps, kwargs={'budget': (30, 0, False)} if unit == stepl else None)
+        dag.wait()
+
+        self.assertEqual([budget for unit, budget in self.recorder.started if unit == stepl], [(30, 0, False), (300, 0, False)])
+        self.assertIn(Unit('compare', 'a.c', None, None), self.recorder.done)
+        self.assertEqual(self.recorder.dropped, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### varparser against captured `info locals`/`info args` (gdb) and `frame variable` (lldb) output: the single-pass
+### parser must read what the old line-based parser (legacy_varparser.py) read. The old one only understands lldb's
+### multi-line blocks, so one-line aggregates are checked against the same values laid out as such a block.
+### A seeded fuzz case checks that mutated output never makes the parser raise or hang.
+
+import os
+import sys
+import random
+import signal
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import varparser
+import legacy_varparser
+
+
+def LegacyParse(text: str) -> dict:
+    return legacy_varparser.ParseFrameVars(legacy_varparser.GetRawFrameVars(text))
+
+
+### output the old parser reads correctly, compared as it is
+GDB_SCALARS = '''count = 3
+ratio = 0.5
+c = 123 '{'
+q = 39 '\\''
+name = "a \\"quoted\\" {brace}, = sign"
+msg = 0x555555556004 "hello, {world}"
+text = "ab", '\\000' <repeats 14 times>
+fp = 0x555555555139 <add>
+i = <optimized out>
+'''
+
+GDB_ARGS = '''No locals.
+
+argc = 1
+argv = 0x7fffffffe3b8
+'''
+
+LLDB_STRUCTS = '''(int) count = 3
+(Point) p = {
+  x = 1
+  y = -2
+}
+(Line) line = {
+  start = {
+    x = 0
+    y = 0
+  }
+  end = {
+    x = 10
+    y = 20
+  }
+}
+'''
+
+LLDB_ARRAYS = '''(int[4]) buf = {
+  [0] = 1
+  [1] = 2
+  [2] = 3
+  [3] = 4
+}
+(int[2][2]) grid = {
+  [0] = {
+    [0] = 1
+    [1] = 2
+  }
+  [1] = {
+    [0] = 3
+    [1] = 4
+  }
+}
+'''
+
+LLDB_UNION = '''(Value) u = {
+  i = 1078530011
+  f = 3.14159274
+}
+'''
+
+LLDB_STRINGS = '''(char[12]) name = "hi {x} = y"
+(const char *) msg = 0x0000000100003f9e "hello, \\"world\\""
+(char) c = '{'
+(char) q = '\\''
+'''
+
+LLDB_UNAVAILABLE = '''(int) i = <variable not available>
+
+(int) j = <optimized out>
+(Point) p = <no value available>
+'''
+
+LLDB_TRUNCATED = '''(int[300]) big = {
+  [0] = 0
+  [1] = 1
+  [2] = 2
+  ...
+}
+(const char *) s = 0x0000000100003f80 "abcdefghijklmnopqrstuvwxyz"...
+'''
+
+LLDB_ANONYMOUS = '''(Variant) v = {
+  kind = 1
+   = {
+    i = 5
+    f = 7.00649232E-45
+  }
+  tail = {
+    [0] = {
+      a = 1
+    }
+    [1] = {
+      a = 2
+    }
+  }
+}
+'''
+
+SAME = {'gdb scalars': GDB_SCALARS, 'gdb args': GDB_ARGS, 'lldb structs': LLDB_STRUCTS, 'lldb arrays': LLDB_ARRAYS,
+        'lldb union': LLDB_UNION, 'lldb strings': LLDB_STRINGS, 'lldb unavailable': LLDB_UNAVAILABLE,
+        'lldb truncated': LLDB_TRUNCATED, 'lldb anonymous': LLDB_ANONYMOUS}
+
+### one-line aggregates, and the same values as a block
+PAIRED = {
+    'gdb structs': ('''p = {x = 1, y = -2}
+line = {start = {x = 0, y = 0}, end = {x = 10, y = 20}}
+count = 3
+''', '''p = {
+  x = 1
+  y = -2
+}
+line = {
+  start = {
+    x = 0
+    y = 0
+  }
+  end = {
+    x = 10
+    y = 20
+  }
+}
+count = 3
+'''),
+    'gdb arrays': ('''buf = {1, 2, 3, 4}
+grid = {{1, 2}, {3, 4}}
+mixed = {7, 0 <repeats 3 times>, 9}
+''', '''buf = {
+  [0] = 1
+  [1] = 2
+  [2] = 3
+  [3] = 4
+}
+grid = {
+  [0] = {
+    [0] = 1
+    [1] = 2
+  }
+  [1] = {
+    [0] = 3
+    [1] = 4
+  }
+}
+mixed = {
+  [0] = 7
+  [1] = 0
+  [2] = 0
+  [3] = 0
+  [4] = 9
+}
+'''),
+    'gdb repeats': ('zeros = {0 <repeats 16 times>}\n',
+                    'zeros = {\n' + ''.join('  [%d] = 0\n' % index for index in range(16)) + '}\n'),
+    'gdb union': ('u = {i = 1078530011, f = 3.14159274}\n', 'u = {\n  i = 1078530011\n  f = 3.14159274\n}\n'),
+    'gdb strings': ('''rec = {name = "x, {y} = z", tag = "ab\\000\\000", c = 125 '}', id = 7}
+ops = {cb = 0x555555555139 <add>, n = 2}
+''', '''rec = {
+  name = "x, {y} = z"
+  tag = "ab\\000\\000"
+  c = 125 '}'
+  id = 7
+}
+ops = {
+  cb = 0x555555555139 <add>
+  n = 2
+}
+'''),
+    'gdb optimized out': ('s = {a = <optimized out>, b = 2}\nt = <optimized out>\n',
+                          's = {\n  a = <optimized out>\n  b = 2\n}\nt = <optimized out>\n'),
+    'gdb truncated': ('big = {0, 1, 2, 3...}\nstr = 0x4006f4 "abcd"...\n',
+                      'big = {\n  [0] = 0\n  [1] = 1\n  [2] = 2\n  [3] = 3...\n}\nstr = 0x4006f4 "abcd"...\n'),
+    'gdb anonymous': ('v = {kind = 1, {i = 5, f = 7.00649232e-45}, tail = {{a = 1}, {a = 2}}}\n', '''v = {
+  kind = 1
+   = {
+    i = 5
+    f = 7.00649232e-45
+  }
+  tail = {
+    [0] = {
+      a = 1
+    }
+    [1] = {
+      a = 2
+    }
+  }
+}
+'''),
+    'lldb one-liners': ('''(Point) p = (x = 1, y = -2)
+(int[3]) buf = ([0] = 1, [1] = 2, [2] = 3)
+''', '''(Point) p = {
+  x = 1
+  y = -2
+}
+(int[3]) buf = {
+  [0] = 1
+  [1] = 2
+  [2] = 3
+}
+'''),
+}
+
+### output the old parser read wrongly (children of a pointer as one blob, everything after a gdb one-liner)
+EXPECTED = {
+    'lldb pointer children': ('''(Node *) head = 0x00007ffeefbff5a0 {
+  value = 1
+  next = 0x0000000000000000
+}
+(int) n = 1
+''', {'(Node *) head': '0x00007ffeefbff5a0', '(Node *) head.value': '1', '(Node *) head.next': '0x0000000000000000',
+      '(int) n': '1'}),
+    'gdb long repeats': ('zeros = {0 <repeats 1000 times>}\nn = 1\n', {'zeros.[0..999]': '0', 'n': '1'}),
+    'gdb char array in struct': ('rec = {tag = "ab", \'\\000\' <repeats 14 times>, id = 7}\n',
+                                 {'rec.tag': '"ab", \'\\000\' <repeats 14 times>', 'rec.id': '7'}),
+}
+
+
+### fails the test instead of hanging it
+@contextlib.contextmanager
+def Deadline(seconds: float):
+    def expire(signum, frame):
+        raise AssertionError('parser did not finish within %s seconds' % seconds)
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+FUZZ_SEED = 20261018
+FUZZ_CASES = 2000
+FUZZ_TOKENS = ['{', '}', '(', ')', '[', ']', '<', '>', '"', "'", '\\', ',', ' = ', '= ', '\n', '  ', '...',
+               '<repeats 3 times>', '<repeats 99999999 times>', '[0] = ', 'a = ', '0x4005d0 ']
+
+
+def Mutate(rng: random.Random, text: str) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        pos = rng.randint(0, len(chars))
+        action = rng.random()
+        if action < 0.4:
+            chars[pos:pos] = list(rng.choice(FUZZ_TOKENS))
+        elif action < 0.7:
+            del chars[pos:pos + rng.randint(1, 4)]
+        elif chars:
+            ### cut and splice a chunk elsewhere, e.g. unbalancing the braces
+            start = rng.randrange(len(chars))
+            chunk = chars[start:start + rng.randint(1, 16)]
+            chars[pos:pos] = chunk
+    return ''.join(chars)
+
+
+class TestVarParser(unittest.TestCase):
+    def test_same_as_legacy(self):
+        for name, text in SAME.items():
+            with self.subTest(name):
+                self.assertEqual(varparser.ParseFrameVars(text), LegacyParse(text))
+
+    def test_one_liners_as_blocks(self):
+        for name, (text, block) in PAIRED.items():
+            with self.subTest(name):
+                self.assertEqual(varparser.ParseFrameVars(text), LegacyParse(block))
+
+    def test_expected(self):
+        for name, (text, variables) in EXPECTED.items():
+            with self.subTest(name):
+                self.assertEqual(varparser.ParseFrameVars(text), variables)
+
+    def test_value(self):
+        ### gdb/MI values come one at a time
+        self.assertEqual(varparser.ParseValue('s', '{a = 1, b = {c = "}"}}'), {'s.a': '1', 's.b.c': '"}"'})
+        self.assertEqual(varparser.ParseValue('i', '3'), {'i': '3'})
+
+    def test_fuzz(self):
+        rng = random.Random(FUZZ_SEED)
+        corpus = list(SAME.values()) + [text for text, _ in PAIRED.values()] + [text for text, _ in EXPECTED.values()]
+        for case in range(FUZZ_CASES):
+            text = Mutate(rng, rng.choice(corpus))
+            with self.subTest(case=case, text=text), Deadline(5):
+                variables = varparser.ParseFrameVars(text)
+                self.assertIsInstance(variables, dict)
+                for key, value in variables.items():
+                    self.assertIsInstance(key, str)
+                    self.assertIsInstance(value, str)
+                varparser.ParseValue('v', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
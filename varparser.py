@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# !/usr/bin/env python3
+
+### Single-pass parser of the variables printed by `info locals`/`info args` (gdb, also the values of gdb/MI) and
+### `frame var` (lldb, cjdb), flattened to {name.field: value}. Aggregates are gdb one-liners ({a = 1, b = {c = 2}}),
+### lldb multi-line blocks (`s = {` ... `}`) or lldb one-liners ((x = 1, y = 2)); positional elements are named
+### [index], `X <repeats N times>` stands for N elements, and strings, chars and <...> annotations are kept whole.
+### Anonymous struct/union members (`{a = 1, {b = 2}}` in gdb, ` = {` in lldb) are named '' (s..b), elided elements
+### (`...` in lldb) are left out.
+
+import re
+
+
+MAX_REPEATS = 256   ### longer repeats are kept as one [first..last] element, like lldb's max-children-count
+
+re_name = re.compile(r'[ \t]*(?:(\[\d+\]|<[^<>=\n]*>|[A-Za-z_$][\w$]*) )?= ')
+re_paren_aggregate = re.compile(r'\(\s*(\[\d+\]|[A-Za-z_$][\w$]*) = ')
+re_repeats = re.compile(r'(.*?)\s*<repeats (\d+) times>', re.DOTALL)
+re_special = re.compile(r'["\'{}()\[\]<>,\n]')
+re_quoted = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+
+OPENING = {'{': '}', '(': ')', '[': ']', '<': '>'}
+CLOSING = {'}', ')', ']', '>'}
+
+
+class Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def skipSpaces(self):
+        while self.pos < len(self.text) and self.text[self.pos] in ' \t\r':
+            self.pos += 1
+
+    def skipBlank(self):
+        while self.pos < len(self.text) and self.text[self.pos] in ' \t\r\n,':
+            self.pos += 1
+
+    ### one `name = value` per line; lines without a value (e.g. "No locals.") are skipped
+    def parseFrame(self) -> dict:
+        variables = {}
+        while self.pos < len(self.text):
+            end = self.text.find('\n', self.pos)
+            end = len(self.text) if end == -1 else end
+            sep = self.text.find(' = ', self.pos, end)
+            if sep == -1:
+                self.pos = end + 1
+                continue
+
+            name = self.text[self.pos:sep].strip()
+            self.pos = sep + 3
+            Flatten(name, self.parseValue('\n'), variables)
+
+            end = self.text.find('\n', self.pos)
+            self.pos = len(self.text) if end == -1 else end + 1
+        return variables
+
+    ### a scalar (str), an aggregate (list of (name or None, value)) or a scalar with an lldb child block (tuple)
+    def parseValue(self, stops: str):
+        self.skipSpaces()
+        start = self.pos
+        c = self.text[self.pos] if self.pos < len(self.text) else ''
+        if c == '{' or (c == '(' and re_paren_aggregate.match(self.text, self.pos)):
+            entries = self.parseAggregate(OPENING[c])
+            self.skipSpaces()
+            if self.pos >= len(self.text) or self.text[self.pos] in stops:
+                return entries
+            ### the braces were a prefix of a scalar, e.g. the type of a function pointer: {int (int)} 0x401136 <f>
+            self.pos = start
+        return self.parseScalar(stops)
+
+    def parseAggregate(self, close: str) -> list:
+        self.pos += 1
+        entries = []
+        while True:
+            self.skipBlank()
+            if self.pos >= len(self.text):
+                break
+            if self.text[self.pos] == close:
+                self.pos += 1
+                break
+
+            rem = re_name.match(self.text, self.pos)
+            if rem:
+                self.pos = rem.end()
+            value = self.parseValue(',\n' + close)
+            if rem is None and entries and isinstance(value, str) and value.startswith(('"', "'")) \
+                    and isinstance(entries[-1][1], str) and entries[-1][1].startswith(('"', "'")):
+                ### gdb splits char arrays into pieces: "abc", '\000' <repeats 96 times>
+                entries[-1] = (entries[-1][0], entries[-1][1] + ', ' + value)
+            else:
+                entries.append(((rem.group(1) or '') if rem else None, value))
+
+        if any(key is not None for key, _ in entries):
+            ### unnamed aggregates among named members are anonymous members, not elements
+            entries = [('' if key is None and isinstance(value, list) else key, value) for key, value in entries]
+        return entries
+
+    def parseScalar(self, stops: str):
+        text, start, depth = self.text, self.pos, 0
+        while True:
+            rem = re_special.search(text, self.pos)
+            if rem is None:
+                self.pos = len(text)
+                break
+            self.pos = rem.start()
+            c = text[self.pos]
+
+            ### scalars never span lines, even with unbalanced brackets
+            if (depth == 0 and c in stops) or c == '\n':
+                break
+            if c in '"\'':
+                self.skipQuoted(c)
+                continue
+            if c == '{' and depth == 0 and self.endsLine(self.pos + 1):
+                ### lldb prints the children of e.g. a pointer on the following lines: 0x00007ffc {
+                scalar = text[start:self.pos].strip()
+                return scalar, self.parseAggregate('}')
+            if c in OPENING:
+                depth += 1
+            elif c in CLOSING and depth:
+                depth -= 1
+            self.pos += 1
+        return text[start:self.pos].strip()
+
+    def endsLine(self, pos: int) -> bool:
+        end = self.text.find('\n', pos)
+        return not self.text[pos:len(self.text) if end == -1 else end].strip()
+
+    def skipQuoted(self, quote: str):
+        self.pos += 1
+        while True:
+            rem = re_quoted[quote].search(self.text, self.pos)
+            if rem is None:
+                self.pos = len(self.text)
+                return
+            if self.text[rem.start()] == '\\':
+                self.pos = rem.start() + 2
+                continue
+            self.pos = rem.start() + 1
+            return
+
+
+def Flatten(name: str, value, variables: dict):
+    if isinstance(value, str):
+        variables[name] = value
+        return
+    if isinstance(value, tuple):
+        variables[name], value = value
+        if not value:
+            return
+    if not value:
+        variables[name] = '{}'
+        return
+
+    index = 0
+    for key, child in value:
+        if key is not None:
+            Flatten(name + '.' + key, child, variables)
+            continue
+
+        if child == '...':
+            continue
+        rem = re_repeats.fullmatch(child) if isinstance(child, str) else None
+        if rem is None:
+            Flatten('%s.[%d]' % (name, index), child, variables)
+            index += 1
+            continue
+
+        element, count = rem.group(1), int(rem.group(2))
+        if count > MAX_REPEATS:
+            variables['%s.[%d..%d]' % (name, index, index + count - 1)] = element
+        else:
+            for offset in range(count):
+                variables['%s.[%d]' % (name, index + offset)] = element
+        index += count
+
+
+### output of `info locals` + `info args` or `frame var` -> {name.field: value}
+def ParseFrameVars(text: str) -> dict:
+    return Parser(text).parseFrame()
+
+
+### a single (e.g. gdb/MI) value of name -> {name.field: value}
+def ParseValue(name: str, value: str) -> dict:
+    variables = {}
+    Flatten(name, Parser(value).parseValue('\n'), variables)
+    return variables